@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+服务器端到端基准测试
+启动本地模拟上游 (stub_upstream.py) 和待测服务器，在不同并发数下压测，
+报告吞吐量和p50/p95/p99延迟，不访问真实的上游
+
+待测服务器:
+    flask    pages/wolfram_enhanced_api.py（werkzeug多线程服务器）
+    asgi     pages/wolfram_async_api.py（uvicorn）
+    mobile   mobile_api/wolfram_api_server.py（werkzeug多线程服务器）
+
+压测为闭环模式：每个并发连接收到响应后立即发送下一个请求。默认每个请求使用不同的输入，
+全部穿透缓存到达上游；--hit-ratio 设置复用固定输入（命中缓存）的请求比例
+
+运行方式:
+    python benchmarks/bench_servers.py --target flask --concurrency 1,4,16,64 --duration 10
+    python benchmarks/bench_servers.py --target mobile --latency const:50 --json results.json
+    python benchmarks/bench_servers.py --target flask --baseline results.json   # 与上次结果对比
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+PAGES_DIR = os.path.join(ROOT_DIR, "pages")
+
+# 与fixtures/index.json中录制的输入对应
+INPUTS = [
+    "2+2",
+    "solve x^2 + 3x + 2 = 0",
+    "derivative of x^2 + 3x + 1",
+    "y' = y/(x+y^3)",
+]
+
+FLASK_SERVER = "from werkzeug.serving import run_simple; import {module} as m; run_simple('127.0.0.1', {port}, m.app, threaded=True)"
+
+TARGETS = {
+    "flask": {
+        "cwd": PAGES_DIR,
+        "command": ["-c", FLASK_SERVER.format(module="wolfram_enhanced_api", port="{port}")],
+        "scenarios": {
+            "query": ("POST", "/api/query", lambda q: {"input": q, "format": "plaintext"}),
+            "simple": ("GET", "/api/simple/{q}", None),
+            "validate": ("POST", "/api/validate", lambda q: {"input": q}),
+        },
+    },
+    "asgi": {
+        "cwd": PAGES_DIR,
+        "command": ["-m", "uvicorn", "wolfram_async_api:app", "--host", "127.0.0.1", "--port", "{port}",
+                    "--log-level", "warning", "--no-access-log"],
+        "scenarios": {
+            "query": ("POST", "/api/query", lambda q: {"input": q, "format": "plaintext"}),
+            "simple": ("GET", "/api/simple/{q}", None),
+            "validate": ("POST", "/api/validate", lambda q: {"input": q}),
+        },
+    },
+    "mobile": {
+        "cwd": os.path.join(ROOT_DIR, "mobile_api"),
+        "pythonpath": os.path.join(ROOT_DIR, "mobile_poc"),
+        "command": ["-c", FLASK_SERVER.format(module="wolfram_api_server", port="{port}")],
+        "scenarios": {
+            "query": ("POST", "/query", lambda q: {"input": q}),
+            "simple": ("GET", "/query/{q}", None),
+            "result": ("GET", "/result/{q}", None),
+        },
+    },
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url, process, timeout=30):
+    """等待服务可以响应，进程提前退出或超时时抛出RuntimeError"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"进程已退出 (code={process.returncode}): {' '.join(process.args)}")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f"等待 {url} 超时")
+
+
+def start_process(args, cwd, env, ready_url):
+    # 服务器的访问日志写入临时文件：写入不读取的管道会在缓冲区满后阻塞服务器
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen([sys.executable] + args, cwd=cwd, env=env,
+                               stdout=subprocess.DEVNULL, stderr=log)
+    try:
+        wait_until_ready(ready_url, process)
+    except RuntimeError:
+        process.kill()
+        process.wait()
+        log.seek(0)
+        stderr = log.read().decode("utf-8", "replace")
+        raise RuntimeError(f"启动失败:\n{stderr[-2000:]}") from None
+    finally:
+        log.close()
+    return process
+
+
+def stop_process(process):
+    process.terminate()
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def start_stub(latency, validate_latency, error_rate):
+    """在独立进程中启动模拟上游，避免与压测线程争用GIL"""
+    port = free_port()
+    args = [os.path.join(BENCH_DIR, "stub_upstream.py"), "--port", str(port),
+            "--latency", latency, "--error-rate", str(error_rate)]
+    if validate_latency is not None:
+        args += ["--validate-latency", validate_latency]
+    base_url = f"http://127.0.0.1:{port}"
+    return start_process(args, BENCH_DIR, os.environ.copy(), f"{base_url}/stats"), base_url
+
+
+def start_target(name, upstream, extra_env):
+    """启动待测服务器，L2磁盘缓存和图片代理关闭，每次运行从空缓存开始"""
+    target = TARGETS[name]
+    port = free_port()
+    env = os.environ.copy()
+    env.update({
+        "WOLFRAM_UPSTREAM_BASE_URL": upstream,
+        "WOLFRAM_L2_CACHE_PATH": "",
+        "WOLFRAM_IMAGE_PROXY_PATH": "",
+        "PYTHONUNBUFFERED": "1",
+    })
+    if target.get("pythonpath"):
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [target["pythonpath"], env.get("PYTHONPATH")]))
+    env.update(extra_env)
+
+    args = [arg.replace("{port}", str(port)) for arg in target["command"]]
+    base_url = f"http://127.0.0.1:{port}"
+    return start_process(args, target["cwd"], env, f"{base_url}/health"), base_url
+
+
+class InputMix:
+    """生成请求输入：按hit_ratio复用固定输入，其余输入各不相同（缓存未命中）"""
+
+    def __init__(self, hit_ratio, seed):
+        self.hit_ratio = hit_ratio
+        self.rng = random.Random(seed)
+        self.counter = 0
+
+    def next(self):
+        base = self.rng.choice(INPUTS)
+        if self.rng.random() < self.hit_ratio:
+            return base
+        self.counter += 1
+        return f"{base} #{self.counter}"
+
+
+def percentile(sorted_values, p):
+    """最近秩法百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def run_level(base_url, scenario, concurrency, duration, warmup, hit_ratio, run_id):
+    """
+    以固定并发数压测一轮
+
+    Returns:
+        dict: 吞吐量、延迟百分位数（毫秒）和错误数
+    """
+    method, path, make_body = scenario
+    start_event = threading.Event()
+    state = {"measuring": False, "stop": False}
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+
+    def worker(index):
+        session = requests.Session()
+        mix = InputMix(hit_ratio, f"{run_id}-{concurrency}-{index}")
+        mix.counter = index * 10_000_000
+        start_event.wait()
+        while not state["stop"]:
+            q = mix.next()
+            url = base_url + path.replace("{q}", requests.utils.quote(q, safe=""))
+            started = time.perf_counter()
+            try:
+                response = session.request(method, url, json=make_body(q) if make_body else None, timeout=60)
+                failed = response.status_code >= 400
+            except requests.exceptions.RequestException:
+                failed = True
+            elapsed = time.perf_counter() - started
+            if state["measuring"]:
+                if failed:
+                    errors[index] += 1
+                else:
+                    latencies[index].append(elapsed)
+        session.close()
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start_event.set()
+
+    time.sleep(warmup)
+    state["measuring"] = True
+    measure_start = time.perf_counter()
+    time.sleep(duration)
+    state["measuring"] = False
+    measured = time.perf_counter() - measure_start
+    state["stop"] = True
+    for thread in threads:
+        thread.join(timeout=60)
+
+    values = sorted(value for worker_values in latencies for value in worker_values)
+    return {
+        "concurrency": concurrency,
+        "requests": len(values),
+        "errors": sum(errors),
+        "rps": round(len(values) / measured, 1),
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+def print_table(results):
+    print(f"{'并发':>6}{'请求数':>10}{'错误':>8}{'吞吐(rps)':>12}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for row in results:
+        print(f"{row['concurrency']:>6}{row['requests']:>10}{row['errors']:>8}{row['rps']:>12.1f}"
+              f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['max_ms']:>10.2f}")
+
+
+def compare(results, baseline, tolerance):
+    """
+    与基线结果对比，吞吐量下降或p95/p99上升超过tolerance时记为回归
+
+    Returns:
+        list: 回归描述
+    """
+    previous = {row["concurrency"]: row for row in baseline.get("results", [])}
+    regressions = []
+    for row in results:
+        old = previous.get(row["concurrency"])
+        if not old:
+            continue
+        if old["rps"] and row["rps"] < old["rps"] * (1 - tolerance):
+            regressions.append(f"c={row['concurrency']} 吞吐量 {old['rps']} -> {row['rps']} rps")
+        for key in ("p95_ms", "p99_ms"):
+            if old[key] and row[key] > old[key] * (1 + tolerance):
+                regressions.append(f"c={row['concurrency']} {key} {old[key]} -> {row[key]} ms")
+    return regressions
+
+
+def parse_env(values):
+    env = {}
+    for item in values:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"--env 需要 KEY=VALUE 格式: {item}")
+        env[key] = value
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务器端到端基准测试（本地模拟上游）")
+    parser.add_argument("--target", choices=sorted(TARGETS), default="flask", help="待测服务器")
+    parser.add_argument("--scenario", default="query", help="请求类型: query、simple、validate（mobile为query、simple、result）")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="逗号分隔的并发数")
+    parser.add_argument("--duration", type=float, default=10, help="每个并发数的测量时长（秒）")
+    parser.add_argument("--warmup", type=float, default=2, help="每个并发数测量前的预热时长（秒）")
+    parser.add_argument("--hit-ratio", type=float, default=0.0, help="复用固定输入（命中缓存）的请求比例")
+    parser.add_argument("--latency", default="lognormal:80:0.6", help="模拟上游query.jsp的延迟分布，格式见stub_upstream.py")
+    parser.add_argument("--validate-latency", default=None, help="模拟上游validatequery.jsp的延迟分布")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟上游返回503的比例")
+    parser.add_argument("--env", action="append", default=[], help="传给待测服务器的环境变量 KEY=VALUE，可重复")
+    parser.add_argument("--url", default=None, help="压测已在运行的服务器，不启动模拟上游和待测服务器")
+    parser.add_argument("--json", dest="json_path", default=None, help="结果写入JSON文件")
+    parser.add_argument("--baseline", default=None, help="对比的基线结果JSON文件，出现回归时退出码为1")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="对比基线时允许的相对变化")
+    args = parser.parse_args()
+
+    scenarios = TARGETS[args.target]["scenarios"]
+    if args.scenario not in scenarios:
+        parser.error(f"{args.target} 不支持 --scenario {args.scenario}，可选: {', '.join(scenarios)}")
+    try:
+        levels = [int(value) for value in args.concurrency.split(",") if value.strip()]
+        extra_env = parse_env(args.env)
+    except (ValueError, argparse.ArgumentTypeError) as e:
+        parser.error(str(e))
+
+    processes = []
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            stub, upstream = start_stub(args.latency, args.validate_latency, args.error_rate)
+            processes.append(stub)
+            server, base_url = start_target(args.target, upstream, extra_env)
+            processes.append(server)
+
+        print(f"目标: {args.target} {base_url}  场景: {args.scenario}  上游延迟: {args.latency}  缓存命中比例: {args.hit_ratio}")
+        run_id = int(time.time())
+        results = []
+        for concurrency in levels:
+            results.append(run_level(base_url, scenarios[args.scenario], concurrency,
+                                     args.duration, args.warmup, args.hit_ratio, run_id))
+        print_table(results)
+    except RuntimeError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        sys.exit(2)
+    finally:
+        for process in reversed(processes):
+            stop_process(process)
+
+    report = {
+        "target": args.target,
+        "scenario": args.scenario,
+        "latency": args.latency,
+        "hit_ratio": args.hit_ratio,
+        "duration": args.duration,
+        "results": results,
+    }
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("性能回归:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("与基线相比没有回归")
+
+
+if __name__ == "__main__":
+    main()
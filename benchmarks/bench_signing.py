@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+签名性能基准测试
+对比原始的字符串往返实现 (craft_signed_url) 与基于参数字典的实现 (sign_params)
+
+运行方式:
+    python benchmarks/bench_signing.py [--number 20000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pages"))
+
+import wolfram_signing  # noqa: E402
+
+APPID = "3H4296-5YPAGQUJK7"
+SALT = "vFdeaRwBTVqdc5CL"
+BASE_URL = "https://api.wolframalpha.com/v2/query.jsp"
+
+SAMPLE_INPUTS = [
+    "2+2",
+    "solve x^2 + 3x + 2 = 0",
+    "derivative of sin(x)*cos(x)",
+    "y' = y/(x+y^3)",
+    "population of China",
+    "100°F to °C",
+    "∫ x² dx from 0 to π",
+    "a&b=c?d#e%f+g",
+]
+
+
+def make_params(input_text):
+    """与WolframAlphaAPI.query默认参数相同的参数组合"""
+    return {
+        "input": input_text,
+        "format": "plaintext,image",
+        "output": "json",
+        "podtimeout": 10,
+        "scantimeout": 5,
+        "reinterpret": "true",
+        "includepodid": "Result",
+    }
+
+
+def random_params(rng):
+    """生成随机参数，用于校验两种实现的结果一致"""
+    alphabet = "abcxyz019 +-*/^=&%#?'\"()[]{}<>°²π∫√αβ中文\t"
+    params = {"input": "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))}
+    for key in rng.sample(["format", "output", "podtimeout", "assumption", "podstate", "width", "units"], 3):
+        params[key] = rng.choice(["json", 10, "Solution__Step-by-step solution", "", "a=b", 2.5])
+    return params
+
+
+def check_identical(count=2000):
+    """校验两种实现生成的URL逐字节一致"""
+    rng = random.Random(0)
+    cases = [make_params(text) for text in SAMPLE_INPUTS] + [random_params(rng) for _ in range(count)]
+    for params in cases:
+        legacy = wolfram_signing.craft_signed_url(f"{BASE_URL}?{urlencode(params)}", APPID, SALT)
+        fast = wolfram_signing.signed_url(BASE_URL, params, APPID, SALT)
+        if legacy != fast:
+            raise AssertionError(f"签名不一致:\n  params={params!r}\n  legacy={legacy}\n  fast={fast}")
+    return len(cases)
+
+
+def bench(number):
+    params_list = [make_params(text) for text in SAMPLE_INPUTS]
+
+    def legacy():
+        for params in params_list:
+            wolfram_signing.craft_signed_url(f"{BASE_URL}?{urlencode(params)}", APPID, SALT)
+
+    def fast_cold():
+        wolfram_signing._sign_items.cache_clear()
+        for params in params_list:
+            wolfram_signing.signed_url(BASE_URL, params, APPID, SALT)
+
+    def fast_memoized():
+        for params in params_list:
+            wolfram_signing.signed_url(BASE_URL, params, APPID, SALT)
+
+    results = {}
+    for name, fn in [("legacy", legacy), ("fast_cold", fast_cold), ("fast_memoized", fast_memoized)]:
+        fn()
+        seconds = min(timeit.repeat(fn, number=number, repeat=3))
+        results[name] = seconds / (number * len(params_list)) * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="签名性能基准测试")
+    parser.add_argument("--number", type=int, default=20000, help="每轮执行次数")
+    args = parser.parse_args()
+
+    print(f"一致性校验: {check_identical()} 组参数通过")
+
+    results = bench(args.number)
+    baseline = results["legacy"]
+    print(f"{'实现':<16}{'单次耗时(us)':>14}{'加速比':>10}")
+    for name, micros in results.items():
+        print(f"{name:<16}{micros:>14.2f}{baseline / micros:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地模拟的Wolfram|Alpha上游服务器
+在 /v2/query.jsp 和 /v2/validatequery.jsp 上返回录制的queryresult（JSON或XML），
+并按配置的延迟分布延迟响应，用于离线基准测试，不访问真实的上游
+
+录制的响应位于 benchmarks/fixtures/，index.json 指定输入到响应文件的映射（匹配时忽略空白和大小写，
+服务端规范化后的输入也能匹配）；zero_pods_until_retry 中的输入在不带 translation=true 时返回0个Pod，
+用于覆盖服务端的重试逻辑
+
+延迟分布格式:
+    0                    不延迟
+    const:50             固定50ms
+    uniform:20:80        20~80ms均匀分布
+    normal:50:10         均值50ms、标准差10ms的正态分布（截断到0）
+    lognormal:50:0.5     中位数50ms、对数标准差0.5的对数正态分布（长尾）
+    exp:50               均值50ms的指数分布
+
+运行方式:
+    python benchmarks/stub_upstream.py [--port 8599] [--latency lognormal:80:0.6] [--validate-latency const:20]
+
+    然后在启动服务器前设置 WOLFRAM_UPSTREAM_BASE_URL=http://127.0.0.1:8599
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def parse_latency(spec):
+    """
+    解析延迟分布，返回每次调用生成一个延迟（秒）的函数
+
+    Raises:
+        ValueError: 格式不正确
+    """
+    spec = str(spec).strip()
+    if spec in ("", "0", "none"):
+        return lambda: 0.0
+
+    kind, _, rest = spec.partition(":")
+    try:
+        args = [float(value) for value in rest.split(":")] if rest else []
+    except ValueError:
+        raise ValueError(f"无效的延迟分布: {spec}") from None
+
+    rng = random.Random()
+    if kind == "const" and len(args) == 1:
+        return lambda: args[0] / 1000
+    if kind == "uniform" and len(args) == 2:
+        return lambda: rng.uniform(args[0], args[1]) / 1000
+    if kind == "normal" and len(args) == 2:
+        return lambda: max(0.0, rng.gauss(args[0], args[1])) / 1000
+    if kind == "lognormal" and len(args) == 2:
+        mu = math.log(args[0])
+        return lambda: rng.lognormvariate(mu, args[1]) / 1000
+    if kind == "exp" and len(args) == 1:
+        return lambda: rng.expovariate(1 / args[0]) / 1000
+    raise ValueError(f"无效的延迟分布: {spec}")
+
+
+def fixture_key(input_text):
+    """输入的匹配键：去掉所有空白并转为小写"""
+    return "".join(input_text.split()).lower()
+
+
+class FixtureStore:
+    """录制的上游响应，启动时全部读入内存"""
+
+    def __init__(self, directory=FIXTURES_DIR):
+        with open(os.path.join(directory, "index.json"), encoding="utf-8") as f:
+            index = json.load(f)
+
+        self.default = index["default"]
+        self.inputs = {fixture_key(text): name for text, name in index.get("inputs", {}).items()}
+        self.zero_pods = {fixture_key(text) for text in index.get("zero_pods_until_retry", [])}
+
+        self.bodies = {}
+        for name in os.listdir(directory):
+            stem, ext = os.path.splitext(name)
+            if ext in (".json", ".xml") and name != "index.json":
+                with open(os.path.join(directory, name), "rb") as f:
+                    self.bodies[(stem, ext[1:])] = f.read()
+
+        self.nopods = self.bodies[("query_nopods", "json")]
+        self.validate = self.bodies[("validatequery", "json")]
+
+    def query(self, params):
+        """返回 (响应体, Content-Type)"""
+        input_text = fixture_key(params.get("input", ""))
+        output = "xml" if params.get("output", "xml").lower() == "xml" else "json"
+
+        if input_text in self.zero_pods and params.get("translation") != "true":
+            return self.nopods, "application/json"
+
+        fixture = self.inputs.get(input_text, self.default)
+        body = self.bodies.get((fixture, output))
+        if body is None:
+            # 没有录制该格式时返回JSON
+            body, output = self.bodies[(fixture, "json")], "json"
+        return body, f"application/{output}"
+
+
+class StubUpstream(ThreadingHTTPServer):
+    """模拟上游，每个连接一个线程，支持HTTP/1.1 keep-alive"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, store, latency, validate_latency=None, error_rate=0.0):
+        """
+        Args:
+            store (FixtureStore): 录制的响应
+            latency: query.jsp的延迟函数
+            validate_latency: validatequery.jsp的延迟函数，默认与query.jsp相同
+            error_rate (float): 返回503的请求比例
+        """
+        super().__init__(address, StubHandler)
+        self.store = store
+        self.latency = latency
+        self.validate_latency = validate_latency or latency
+        self.error_rate = error_rate
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def count(self, failed):
+        with self._lock:
+            self.requests += 1
+            if failed:
+                self.errors += 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体分两次写出，不关闭Nagle算法时keep-alive连接上每个响应会多出约40ms的延迟确认等待
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+
+        if url.path == "/v2/query.jsp":
+            delay = self.server.latency()
+            body, content_type = self.server.store.query(params)
+        elif url.path == "/v2/validatequery.jsp":
+            delay = self.server.validate_latency()
+            body, content_type = self.server.store.validate, "application/json"
+        elif url.path == "/stats":
+            body = json.dumps({"requests": self.server.requests, "errors": self.server.errors}).encode("utf-8")
+            self._send(200, body, "application/json")
+            return
+        else:
+            self._send(404, b"not found", "text/plain")
+            return
+
+        if delay > 0:
+            time.sleep(delay)
+
+        failed = self.server.error_rate > 0 and random.random() < self.server.error_rate
+        self.server.count(failed)
+        if failed:
+            self._send(503, b"service unavailable", "text/plain")
+        else:
+            self._send(200, body, content_type)
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(host="127.0.0.1", port=0, latency="0", validate_latency=None, error_rate=0.0, fixtures=FIXTURES_DIR):
+    """
+    在后台线程中启动模拟上游
+
+    Returns:
+        StubUpstream: server_address 为实际监听的地址，调用 shutdown() 停止
+    """
+    server = StubUpstream(
+        (host, port),
+        FixtureStore(fixtures),
+        parse_latency(latency),
+        parse_latency(validate_latency) if validate_latency is not None else None,
+        error_rate
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的Wolfram|Alpha上游")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--latency", default="lognormal:80:0.6", help="query.jsp的延迟分布")
+    parser.add_argument("--validate-latency", default=None, help="validatequery.jsp的延迟分布，默认与--latency相同")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回503的请求比例")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="录制响应的目录")
+    args = parser.parse_args()
+
+    try:
+        server = start_stub(args.host, args.port, args.latency, args.validate_latency, args.error_rate, args.fixtures)
+    except ValueError as e:
+        parser.error(str(e))
+
+    host, port = server.server_address[:2]
+    print(f"模拟上游: http://{host}:{port}  (query延迟 {args.latency})")
+    print(f"设置 WOLFRAM_UPSTREAM_BASE_URL=http://{host}:{port} 后启动服务器")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -217,45 +217,18 @@ def demo_error_handling():
     print_result("空查询结果", empty_result)
 
 def demo_performance():
-    """演示性能测试"""
+    """演示性能测试（使用load_generator按固定速率压测，完整参数见 python load_generator.py --help）"""
+    from load_generator import LoadGenerator, print_report
+
     print(f"\n{'='*60}")
     print(" 性能测试")
     print(f"{'='*60}")
-    
-    client = WolframAPIClient()
-    
-    queries = ["2+2", "3*3", "sqrt(16)", "log(10)", "sin(pi/2)"]
-    
-    print(f"\n测试 {len(queries)} 个查询的响应时间...")
-    
-    total_time = 0
-    success_count = 0
-    
-    for i, query in enumerate(queries, 1):
-        start_time = time.time()
-        result = client.quick_query(query)
-        end_time = time.time()
-        
-        response_time = end_time - start_time
-        total_time += response_time
-        
-        if result.get('success'):
-            success_count += 1
-            status = "✅"
-        else:
-            status = "❌"
-        
-        print(f"{i:2d}. {query:12s} {status} {response_time:.2f}s")
-    
-    avg_time = total_time / len(queries)
-    success_rate = success_count / len(queries) * 100
-    
-    print(f"\n统计结果:")
-    print(f"  总查询数: {len(queries)}")
-    print(f"  成功数: {success_count}")
-    print(f"  成功率: {success_rate:.1f}%")
-    print(f"  总时间: {total_time:.2f}s")
-    print(f"  平均时间: {avg_time:.2f}s")
+
+    items = [{"query": query, "endpoint": "quick"} for query in ["2+2", "3*3", "sqrt(16)", "log(10)", "sin(pi/2)"]]
+
+    print(f"\n以每秒5个请求的速率测试 {len(items)} 个查询，预热2秒、测量10秒...\n")
+    report = LoadGenerator("http://localhost:5000", items, rate=5, concurrency=8, duration=10, warmup=2).run()
+    print_report(report)
 
 def main():
     """主函数"""
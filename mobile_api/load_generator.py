@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Wolfram|Alpha API 负载生成工具
+基于WolframAPIClient，按目标请求速率（开环）向API服务器发送请求，统计延迟分布和错误
+
+开环模式下请求按计划时间发出，不因前一个请求变慢而推迟，延迟从计划发出时间算起，
+因此服务器排队造成的等待也计入延迟（避免协调遗漏）；--rate 0 时为闭环模式，
+每个并发连接收到响应后立即发送下一个请求。失败（超时、5xx等）的请求同样计入延迟分布，
+吞吐量只统计在测量期间内完成的成功请求
+
+运行方式:
+    python load_generator.py --rate 50 --duration 60 --warmup 10 --concurrency 32
+    python load_generator.py --mix load_mix.json --rate 100 --arrival poisson --json run1.json
+    python load_generator.py --rate 100 --json run2.json --compare run1.json
+
+查询组合文件 (--mix) 为JSON数组，每项包含 query、可选的 weight（默认1）和 endpoint:
+    [{"query": "2+2", "weight": 5, "endpoint": "result"}, {"query": "H2O", "endpoint": "pods"}]
+endpoint可选 quick(默认)、result、pods、math、science、query(POST)
+"""
+
+import argparse
+import bisect
+import json
+import queue
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from client_example import WolframAPIClient
+
+DEFAULT_MIX = [
+    {"query": "2+2", "weight": 4, "endpoint": "result"},
+    {"query": "3*3", "weight": 2, "endpoint": "quick"},
+    {"query": "sqrt(16)", "weight": 2, "endpoint": "quick"},
+    {"query": "y' = y/(x+y^3)", "weight": 1, "endpoint": "math"},
+    {"query": "atomic mass of carbon", "weight": 1, "endpoint": "science"},
+    {"query": "H2O", "weight": 1, "endpoint": "pods"},
+]
+
+ENDPOINTS = {
+    "quick": WolframAPIClient.quick_query,
+    "result": WolframAPIClient.get_result,
+    "pods": WolframAPIClient.get_pods,
+    "math": WolframAPIClient.math_query,
+    "science": WolframAPIClient.science_query,
+    "query": WolframAPIClient.query,
+}
+
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+class LatencyHistogram:
+    """
+    HdrHistogram风格的对数线性直方图（微秒）
+
+    小于2048us的值精确记录，更大的值按2的幂分段，每段1024个桶，相对误差不超过0.1%；
+    计数稀疏存储，多个直方图可以合并，也可以序列化为JSON后再还原
+    """
+
+    SUB_BUCKET_BITS = 11
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    HALF = SUB_BUCKETS // 2
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value):
+        if value < self.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - self.SUB_BUCKET_BITS
+        return self.SUB_BUCKETS + (shift - 1) * self.HALF + (value >> shift) - self.HALF
+
+    def _highest_equivalent(self, index):
+        """桶内可能的最大值"""
+        if index < self.SUB_BUCKETS:
+            return index
+        shift = (index - self.SUB_BUCKETS) // self.HALF + 1
+        sub = (index - self.SUB_BUCKETS) % self.HALF + self.HALF
+        return ((sub + 1) << shift) - 1
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1e6))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.min = value if self.min is None else min(self.min, value)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        return self
+
+    def percentile(self, p):
+        """第p百分位数（毫秒）"""
+        if not self.total:
+            return 0.0
+        target = max(1, int(round(p / 100 * self.total + 0.4999)))
+        cumulative = 0
+        for index in sorted(self.counts):
+            cumulative += self.counts[index]
+            if cumulative >= target:
+                return min(self._highest_equivalent(index), self.max) / 1000
+        return self.max / 1000
+
+    def summary(self):
+        """延迟摘要（毫秒）"""
+        result = {f"p{p:g}": round(self.percentile(p), 3) for p in PERCENTILES}
+        result.update({
+            "count": self.total,
+            "mean": round(self.sum / self.total / 1000, 3) if self.total else 0.0,
+            "min": round((self.min or 0) / 1000, 3),
+            "max": round(self.max / 1000, 3),
+        })
+        return result
+
+    def to_dict(self):
+        return {"counts": {str(index): count for index, count in sorted(self.counts.items())},
+                "sum": self.sum, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        histogram.total = sum(histogram.counts.values())
+        histogram.sum = data["sum"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
+
+
+def load_mix(path):
+    """
+    读取查询组合文件
+
+    Raises:
+        ValueError: 格式不正确
+    """
+    with open(path, encoding="utf-8") as f:
+        items = json.load(f)
+    if not isinstance(items, list) or not items:
+        raise ValueError("查询组合必须是非空的JSON数组")
+    for item in items:
+        if not isinstance(item, dict) or not item.get("query"):
+            raise ValueError(f"缺少query字段: {item!r}")
+        if item.setdefault("endpoint", "quick") not in ENDPOINTS:
+            raise ValueError(f"不支持的endpoint: {item['endpoint']}（可选 {', '.join(ENDPOINTS)}）")
+        if float(item.setdefault("weight", 1)) <= 0:
+            raise ValueError(f"weight必须大于0: {item!r}")
+    return items
+
+
+class QueryMix:
+    """按权重随机选择查询"""
+
+    def __init__(self, items, seed=None):
+        self.items = items
+        self.rng = random.Random(seed)
+        self.cumulative = []
+        total = 0.0
+        for item in items:
+            total += float(item.get("weight", 1))
+            self.cumulative.append(total)
+        self.total = total
+
+    def next(self):
+        return self.items[bisect.bisect_right(self.cumulative, self.rng.random() * self.total)]
+
+
+class WorkerStats:
+    """单个工作线程的统计，只由该线程写入，结束后合并"""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()  # 从计划发出到收到响应
+        self.service = LatencyHistogram()  # 从实际发出到收到响应
+        self.failed_latency = LatencyHistogram()  # 失败请求（超时、5xx等）的延迟
+        self.endpoints = {}
+        self.ok = 0
+        self.errors = Counter()
+        self.completed_in_window = 0  # 在测量期间内完成的成功请求数，用于计算吞吐量
+
+    def record(self, endpoint, intended, started, finished, error):
+        """记录一个请求的延迟，成功和失败的请求都计入延迟分布，失败的请求另外单独统计"""
+        self.latency.record(finished - intended)
+        self.service.record(finished - started)
+        histogram = self.endpoints.get(endpoint)
+        if histogram is None:
+            histogram = self.endpoints[endpoint] = LatencyHistogram()
+        histogram.record(finished - intended)
+        if error:
+            self.errors[error] += 1
+            self.failed_latency.record(finished - intended)
+        else:
+            self.ok += 1
+
+
+def _error_of(result):
+    """失败请求的错误类别，成功时返回None"""
+    if result.get("success"):
+        return None
+    error = str(result.get("error") or "未知错误")
+    return error.split(":", 1)[0][:80]
+
+
+class LoadGenerator:
+    """
+    开环负载生成
+
+    调度线程按目标速率把请求放入队列，concurrency个工作线程各自使用一个WolframAPIClient发送请求；
+    工作线程都在忙时请求在队列中等待（等待时间计入延迟），队列超过max_queue时丢弃并计数
+    """
+
+    def __init__(self, base_url, items, rate, concurrency=32, duration=30, warmup=5,
+                 arrival="uniform", max_queue=10000, seed=None):
+        """
+        Args:
+            base_url (str): API服务器地址
+            items (list): 查询组合
+            rate (float): 目标请求速率（每秒），0表示闭环模式
+            concurrency (int): 工作线程数（同时进行的最大请求数）
+            duration (float): 测量时长（秒）
+            warmup (float): 测量前的预热时长（秒），预热期间的请求不计入统计
+            arrival (str): uniform 等间隔发出，poisson 按泊松过程发出
+            max_queue (int): 等待发出的最大请求数
+        """
+        self.base_url = base_url
+        self.items = items
+        self.rate = rate
+        self.concurrency = concurrency
+        self.duration = duration
+        self.warmup = warmup
+        self.arrival = arrival
+        self.max_queue = max_queue
+        self.seed = seed
+
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self.scheduled = 0
+        self.dropped = 0
+
+    def run(self):
+        """执行一次压测，返回结果报告"""
+        self.start = time.perf_counter()
+        self.measure_start = self.start + self.warmup
+        self.measure_end = self.measure_start + self.duration
+
+        stats = [WorkerStats() for _ in range(self.concurrency)]
+        target = self._closed_worker if self.rate <= 0 else self._open_worker
+        workers = [threading.Thread(target=target, args=(stats[i], i), daemon=True) for i in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+
+        if self.rate > 0:
+            self._schedule()
+            for _ in workers:
+                self._queue.put(None)
+        else:
+            time.sleep(max(0.0, self.measure_end - time.perf_counter()))
+            self._stop.set()
+        for worker in workers:
+            worker.join()
+
+        return self._report(stats, time.perf_counter() - self.start)
+
+    def _schedule(self):
+        """按目标速率放入请求，直到测量结束"""
+        rng = random.Random(self.seed)
+        mix = QueryMix(self.items, self.seed)
+        intended = self.start
+        while intended < self.measure_end:
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if self._queue.qsize() >= self.max_queue:
+                if intended >= self.measure_start:
+                    self.dropped += 1
+            else:
+                self._queue.put((intended, mix.next()))
+                if intended >= self.measure_start:
+                    self.scheduled += 1
+            gap = rng.expovariate(self.rate) if self.arrival == "poisson" else 1 / self.rate
+            intended += gap
+
+    def _send(self, client, item):
+        method = ENDPOINTS[item["endpoint"]]
+        try:
+            return _error_of(method(client, item["query"]))
+        except Exception as e:
+            return type(e).__name__
+
+    def _record(self, stats, item, intended, started, error):
+        """
+        计划在测量期间发出的请求计入延迟（测量结束后才完成的也计入）；
+        吞吐量按完成时间统计，只计在测量期间内完成的成功请求
+        """
+        finished = time.perf_counter()
+        if intended >= self.measure_start:
+            stats.record(item["endpoint"], intended, started, finished, error)
+        if not error and self.measure_start <= finished <= self.measure_end:
+            stats.completed_in_window += 1
+
+    def _open_worker(self, stats, index):
+        client = WolframAPIClient(self.base_url)
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+            intended, item = task
+            started = time.perf_counter()
+            error = self._send(client, item)
+            self._record(stats, item, intended, started, error)
+        client.session.close()
+
+    def _closed_worker(self, stats, index):
+        client = WolframAPIClient(self.base_url)
+        mix = QueryMix(self.items, None if self.seed is None else f"{self.seed}-{index}")
+        while not self._stop.is_set():
+            item = mix.next()
+            started = time.perf_counter()
+            error = self._send(client, item)
+            self._record(stats, item, started, started, error)
+        client.session.close()
+
+    def _report(self, stats, elapsed):
+        latency = LatencyHistogram()
+        service = LatencyHistogram()
+        failed_latency = LatencyHistogram()
+        endpoints = {}
+        errors = Counter()
+        ok = 0
+        completed_in_window = 0
+        for worker in stats:
+            latency.merge(worker.latency)
+            service.merge(worker.service)
+            failed_latency.merge(worker.failed_latency)
+            for endpoint, histogram in worker.endpoints.items():
+                endpoints.setdefault(endpoint, LatencyHistogram()).merge(histogram)
+            errors.update(worker.errors)
+            ok += worker.ok
+            completed_in_window += worker.completed_in_window
+
+        failed = sum(errors.values())
+        return {
+            "config": {
+                "url": self.base_url,
+                "mode": "open" if self.rate > 0 else "closed",
+                "rate": self.rate,
+                "arrival": self.arrival,
+                "concurrency": self.concurrency,
+                "duration": self.duration,
+                "warmup": self.warmup,
+                "mix": self.items,
+            },
+            "elapsed": round(elapsed, 3),
+            "scheduled": self.scheduled,
+            "dropped": self.dropped,
+            "completed": ok + failed,
+            "ok": ok,
+            "failed": failed,
+            "throughput": round(completed_in_window / self.duration, 2) if self.duration else 0.0,
+            "latency_ms": latency.summary(),
+            "service_ms": service.summary(),
+            "failed_latency_ms": failed_latency.summary(),
+            "endpoints": {endpoint: histogram.summary() for endpoint, histogram in sorted(endpoints.items())},
+            "errors": dict(errors.most_common(10)),
+            "histogram": latency.to_dict(),
+        }
+
+
+def print_report(report):
+    config = report["config"]
+    target = f"{config['rate']} rps ({config['arrival']})" if config["mode"] == "open" else "闭环"
+    print(f"目标: {config['url']}  速率: {target}  并发: {config['concurrency']}  测量: {config['duration']}s  预热: {config['warmup']}s")
+    print(f"完成: {report['completed']}  成功: {report['ok']}  失败: {report['failed']}  丢弃: {report['dropped']}  吞吐: {report['throughput']} rps")
+
+    columns = ["p50", "p90", "p95", "p99", "p99.9", "max", "mean"]
+    print(f"{'':<12}" + "".join(f"{name:>10}" for name in columns))
+    rows = [("延迟(ms)", report["latency_ms"]), ("服务(ms)", report["service_ms"])]
+    if report["failed"]:
+        rows.append(("失败(ms)", report["failed_latency_ms"]))
+    for name, summary in rows:
+        print(f"{name:<10}" + "".join(f"{summary[column]:>10.2f}" for column in columns))
+    for endpoint, summary in report["endpoints"].items():
+        print(f"{endpoint:<12}" + "".join(f"{summary[column]:>10.2f}" for column in columns))
+
+    if report["errors"]:
+        print("错误:")
+        for error, count in report["errors"].items():
+            print(f"  {count:>6}  {error}")
+
+
+def print_comparison(report, baseline):
+    """对比两次运行的吞吐量和延迟百分位数"""
+    print("与基线对比:")
+    rows = [("吞吐(rps)", baseline["throughput"], report["throughput"])]
+    for key in ("p50", "p90", "p99", "p99.9", "max"):
+        rows.append((f"{key}(ms)", baseline["latency_ms"][key], report["latency_ms"][key]))
+    rows.append(("失败", baseline["failed"], report["failed"]))
+    for name, old, new in rows:
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "-"
+        print(f"  {name:<12}{old:>12}{new:>12}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wolfram|Alpha API 负载生成工具")
+    parser.add_argument("--url", default="http://localhost:5000", help="API服务器地址")
+    parser.add_argument("--rate", type=float, default=20, help="目标请求速率（每秒），0为闭环模式")
+    parser.add_argument("--arrival", choices=["uniform", "poisson"], default="uniform", help="请求到达方式")
+    parser.add_argument("--concurrency", type=int, default=32, help="最大同时进行的请求数")
+    parser.add_argument("--duration", type=float, default=30, help="测量时长（秒）")
+    parser.add_argument("--warmup", type=float, default=5, help="预热时长（秒），不计入统计")
+    parser.add_argument("--max-queue", type=int, default=10000, help="等待发出的最大请求数，超出时丢弃")
+    parser.add_argument("--mix", default=None, help="查询组合JSON文件")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    parser.add_argument("--json", dest="json_path", default=None, help="结果写入JSON文件")
+    parser.add_argument("--compare", default=None, help="与之前运行的JSON结果对比")
+    args = parser.parse_args()
+
+    if args.concurrency < 1:
+        parser.error("--concurrency 必须大于0")
+    try:
+        items = load_mix(args.mix) if args.mix else DEFAULT_MIX
+    except (OSError, ValueError) as e:
+        parser.error(f"无法读取查询组合: {e}")
+
+    generator = LoadGenerator(args.url, items, args.rate, args.concurrency, args.duration,
+                              args.warmup, args.arrival, args.max_queue, args.seed)
+    try:
+        report = generator.run()
+    except KeyboardInterrupt:
+        print("\n压测被用户中断")
+        sys.exit(1)
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
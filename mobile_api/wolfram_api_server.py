@@ -6,17 +6,94 @@ Wolfram|Alpha API 网络服务
 基于Flask框架，提供RESTful API接口
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import json
+import os
 import traceback
+from wolfram_http import ResponseCompressor, conditional_json, error_json, init_json
+from wolfram_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from wolfram_metrics import FlaskMetrics, MetricsRegistry, instrument_cache, instrument_transport
 from wolfram_mobile_api import WolframMobileAPI
+from wolfram_symbolic import create_engine
+
+# 响应压缩和JSON序列化配置
+COMPRESS = os.environ.get("WOLFRAM_COMPRESS", "true").lower() == "true"
+COMPRESS_MIN_SIZE = int(os.environ.get("WOLFRAM_COMPRESS_MIN_SIZE", 1024))
+COMPRESS_LEVEL = int(os.environ.get("WOLFRAM_COMPRESS_LEVEL", 6))
+BROTLI_LEVEL = int(os.environ.get("WOLFRAM_BROTLI_LEVEL", 4))
+JSON_BACKEND = os.environ.get("WOLFRAM_JSON_BACKEND", "auto")
+# GET查询接口的HTTP缓存配置
+HTTP_MAX_AGE = int(os.environ.get("WOLFRAM_HTTP_MAX_AGE", 300))
+HTTP_STALE_WHILE_REVALIDATE = int(os.environ.get("WOLFRAM_HTTP_STALE_WHILE_REVALIDATE", 3600))
+# 符号计算降级模式：auto（已安装SymPy时启用）、true 或 false
+# /math 的上游超过延迟预算仍未返回时开始本地计算，熔断器打开时直接使用本地结果
+SYMBOLIC = os.environ.get("WOLFRAM_SYMBOLIC", "auto")
+SYMBOLIC_BUDGET = float(os.environ.get("WOLFRAM_SYMBOLIC_BUDGET", 3))
+SYMBOLIC_WORKERS = int(os.environ.get("WOLFRAM_SYMBOLIC_WORKERS", 2))
+SYMBOLIC_TIMEOUT = float(os.environ.get("WOLFRAM_SYMBOLIC_TIMEOUT", 10))
 
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
 
+# 服务指标，需在压缩之前注册才能统计实际发送的字节数
+metrics = MetricsRegistry()
+http_metrics = FlaskMetrics(metrics).init_app(app)
+
+# 按Accept-Encoding压缩响应，jsonify在安装了orjson时使用orjson序列化
+compressor = ResponseCompressor(COMPRESS_MIN_SIZE, COMPRESS_LEVEL, BROTLI_LEVEL).init_app(app) if COMPRESS else None
+json_backend = init_json(app, JSON_BACKEND)
+
 # 创建API实例
 wolfram_api = WolframMobileAPI()
+symbolic = create_engine(SYMBOLIC, workers=SYMBOLIC_WORKERS, budget=SYMBOLIC_BUDGET, timeout=SYMBOLIC_TIMEOUT)
+
+# 上游延迟、缓存、请求合并和降级指标
+instrument_transport(metrics, wolfram_api.transport)
+instrument_cache(metrics, wolfram_api.cache)
+metrics.callback("inflight_coalesced_total", "被合并到进行中请求的查询数",
+                 lambda: wolfram_api.inflight.stats()['coalesced'], type="counter")
+metrics.callback("negative_cache_stores_total", "短期缓存的失败结果数",
+                 lambda: wolfram_api.fallback_stats['negative_cached'], type="counter")
+metrics.callback("stale_served_total", "上游不可用时返回过期缓存的次数",
+                 lambda: wolfram_api.fallback_stats['stale_served'], type="counter")
+metrics.callback("query_normalization_merges_total", "规范化后与已有查询合并的不同写法数",
+                 lambda: wolfram_api.normalizer.merged, type="counter")
+metrics.callback("local_eval_answered_total", "在本地计算、没有请求上游的查询数",
+                 lambda: wolfram_api.local_stats['answered'], type="counter")
+metrics.callback("derived_pod_results_total", "从缓存的完整结果派生、没有请求上游的部分Pod查询数",
+                 lambda: wolfram_api.pods.stats['derived'] if wolfram_api.pods is not None else 0, type="counter")
+metrics.callback("symbolic_outcomes_total", "符号计算降级模式的结果（上游胜出、本地胜出、熔断时本地计算等）",
+                 lambda: {(name,): value for name, value in symbolic.counts.items()}, ("outcome",), "counter")
+
+class QueryNotFound(Exception):
+    """上游正常返回但没有所需的结果"""
+
+
+def check_result(result):
+    """
+    检查query_json的结果，只有成功的结果可以按HTTP_MAX_AGE缓存
+
+    Returns:
+        dict: 成功的结果
+
+    Raises:
+        QueryNotFound: Wolfram|Alpha无法理解输入（success=false且没有错误）
+        Exception: 上游返回错误（如 Invalid appid）
+    """
+    query_result = result.get('queryresult', {})
+    if query_result.get('success', False):
+        return result
+    error = query_result.get('error')
+    if error:
+        message = error.get('msg', '未知错误') if isinstance(error, dict) else '未知错误'
+        raise Exception(f"查询失败: {message}")
+    raise QueryNotFound("未找到结果")
+
+
+def query_pods(query_text, **kwargs):
+    """查询并返回结果中的Pod列表，异常与check_result相同（上游请求失败时抛出原异常）"""
+    return check_result(wolfram_api.query_json(query_text, **kwargs))['queryresult'].get('pods', [])
 
 @app.route('/')
 def home():
@@ -30,7 +107,8 @@ def home():
             "/query/<query_text>": "GET - 快速查询",
             "/result/<query_text>": "GET - 获取结果文本",
             "/pods/<query_text>": "GET - 获取所有pods",
-            "/health": "GET - 健康检查"
+            "/health": "GET - 健康检查",
+            "/metrics": "GET - Prometheus格式的服务指标"
         },
         "usage": {
             "POST /query": {
@@ -53,9 +131,23 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "service": "Wolfram|Alpha API Server",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "cache": wolfram_api.cache.stats(),
+        "upstream": wolfram_api.transport.stats(),
+        "fallback": wolfram_api.fallback_stats,
+        "normalization": wolfram_api.normalizer.stats(),
+        "local_eval": wolfram_api.local_stats,
+        "derived_pods": wolfram_api.pods.stats if wolfram_api.pods is not None else None,
+        "symbolic": symbolic.stats(),
+        "compression": compressor.stats() if compressor is not None else None,
+        "json_backend": json_backend
     })
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus格式的服务指标"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/query', methods=['POST'])
 def query():
     """执行Wolfram|Alpha查询"""
@@ -99,93 +191,100 @@ def query():
 def quick_query(query_text):
     """快速查询 - GET方式"""
     try:
-        result = wolfram_api.query_json(query_text)
-        return jsonify({
+        result = check_result(wolfram_api.query_json(query_text))
+        return conditional_json({
             "success": True,
             "query": query_text,
             "data": result
-        })
+        }, HTTP_MAX_AGE, HTTP_STALE_WHILE_REVALIDATE)
+    except QueryNotFound as e:
+        return error_json(str(e), 404, query=query_text)
     except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": str(e),
-            "query": query_text
-        }), 500
+        return error_json(str(e), 502, query=query_text)
 
 @app.route('/result/<path:query_text>')
 def get_result(query_text):
     """获取主要结果文本"""
     try:
-        result = wolfram_api.get_result_text(query_text)
-        return jsonify({
+        pods = query_pods(query_text, includepodid="Result")
+        subpods = pods[0].get('subpods', []) if pods else []
+        result = subpods[0].get('plaintext') if subpods else None
+        if not result:
+            raise QueryNotFound("未找到结果")
+        return conditional_json({
             "success": True,
             "query": query_text,
             "result": result
-        })
+        }, HTTP_MAX_AGE, HTTP_STALE_WHILE_REVALIDATE)
+    except QueryNotFound as e:
+        return error_json(str(e), 404, query=query_text)
     except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": str(e),
-            "query": query_text
-        }), 500
+        return error_json(str(e), 502, query=query_text)
 
 @app.route('/pods/<path:query_text>')
 def get_pods(query_text):
     """获取所有pods结果"""
     try:
-        result = wolfram_api.get_all_results(query_text)
-        return jsonify({
+        result = WolframMobileAPI.pod_texts(query_pods(query_text))
+        if not result:
+            raise QueryNotFound("未找到结果")
+        return conditional_json({
             "success": True,
             "query": query_text,
             "pods": result
-        })
+        }, HTTP_MAX_AGE, HTTP_STALE_WHILE_REVALIDATE)
+    except QueryNotFound as e:
+        return error_json(str(e), 404, query=query_text)
     except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": str(e),
-            "query": query_text
-        }), 500
+        return error_json(str(e), 502, query=query_text)
 
 @app.route('/math/<path:query_text>')
 def math_query(query_text):
     """数学查询专用接口"""
     try:
-        # 数学查询通常需要特殊处理
-        result = wolfram_api.query_json(
-            query_text, 
-            includepodid="Result,Solution,Plot",
-            podstate="Solution__Step-by-step solution"
+        # 数学查询通常需要特殊处理；上游超过延迟预算或熔断器打开时，
+        # 求导、积分、解方程等查询使用本地符号计算的结果
+        result = symbolic.race(
+            query_text,
+            lambda: wolfram_api.query_json(
+                query_text,
+                includepodid="Result,Solution,Plot",
+                podstate="Solution__Step-by-step solution"
+            ),
+            wolfram_api.transport.breaker
         )
-        return jsonify({
+        payload = {
             "success": True,
             "query": query_text,
             "type": "math",
-            "data": result
-        })
+            "data": check_result(result)
+        }
+        if result['queryresult'].get('local'):
+            # 本地符号计算的降级结果（没有逐步解答和图表）不缓存，上游恢复后立即返回上游结果
+            response = jsonify(payload)
+            response.headers["Cache-Control"] = "no-store"
+            return response
+        return conditional_json(payload, HTTP_MAX_AGE, HTTP_STALE_WHILE_REVALIDATE)
+    except QueryNotFound as e:
+        return error_json(str(e), 404, query=query_text)
     except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": str(e),
-            "query": query_text
-        }), 500
+        return error_json(str(e), 502, query=query_text)
 
 @app.route('/science/<path:query_text>')
 def science_query(query_text):
     """科学查询专用接口"""
     try:
-        result = wolfram_api.query_json(query_text)
-        return jsonify({
+        result = check_result(wolfram_api.query_json(query_text))
+        return conditional_json({
             "success": True,
             "query": query_text,
             "type": "science",
             "data": result
-        })
+        }, HTTP_MAX_AGE, HTTP_STALE_WHILE_REVALIDATE)
+    except QueryNotFound as e:
+        return error_json(str(e), 404, query=query_text)
     except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": str(e),
-            "query": query_text
-        }), 500
+        return error_json(str(e), 502, query=query_text)
 
 @app.errorhandler(404)
 def not_found(error):
@@ -193,7 +292,7 @@ def not_found(error):
         "success": False,
         "error": "接口不存在",
         "available_endpoints": [
-            "/", "/health", "/query", "/query/<text>", 
+            "/", "/health", "/metrics", "/query", "/query/<text>", 
             "/result/<text>", "/pods/<text>", "/math/<text>", "/science/<text>"
         ]
     }), 404
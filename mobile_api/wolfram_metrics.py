@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Prometheus文本格式的服务指标
+
+计数值按线程分片：每个线程只写自己的分片，热路径上不加锁；线程结束时分片并入汇总值，
+采集时对所有分片求和。带标签的子指标在首次使用时创建并缓存，之后直接复用
+"""
+
+import bisect
+import threading
+import time
+import weakref
+
+from flask import g, request
+
+# 延迟直方图的桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# 响应大小直方图的桶（字节）
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _ShardHolder:
+    """线程局部分片的持有者，线程结束时被回收并触发分片合并"""
+
+    __slots__ = ("values", "__weakref__")
+
+    def __init__(self, values):
+        self.values = values
+
+
+class _Shards:
+    """所有指标共用的计数槽，每个线程一份"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._live = {}  # id(values) -> values
+        self._retired = []  # 已结束线程的累计值
+        self.size = 0
+
+    def allocate(self, count):
+        """分配count个连续的计数槽，返回起始下标"""
+        with self._lock:
+            start = self.size
+            self.size += count
+            self._retired.extend([0] * count)
+            return start
+
+    def local(self):
+        """当前线程的分片，只由当前线程写入，不需要加锁"""
+        try:
+            values = self._local.holder.values
+        except AttributeError:
+            values = self._new_shard()
+        if len(values) < self.size:
+            # 分片创建后又分配了新的计数槽
+            values.extend([0] * (self.size - len(values)))
+        return values
+
+    def add(self, index, amount):
+        """在当前线程的分片上累加"""
+        try:
+            self._local.holder.values[index] += amount
+        except (AttributeError, IndexError):
+            self.local()[index] += amount
+
+    def _new_shard(self):
+        values = [0] * self.size
+        holder = _ShardHolder(values)
+        with self._lock:
+            self._live[id(values)] = values
+        weakref.finalize(holder, self._retire, values)
+        self._local.holder = holder
+        return values
+
+    def _retire(self, values):
+        with self._lock:
+            self._live.pop(id(values), None)
+            for index, value in enumerate(values):
+                self._retired[index] += value
+
+    def snapshot(self):
+        """返回所有计数槽的当前总和"""
+        with self._lock:
+            totals = list(self._retired)
+            for values in list(self._live.values()):
+                for index, value in enumerate(values):
+                    totals[index] += value
+        return totals
+
+
+def _format_value(value):
+    if isinstance(value, int):
+        return str(value)
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    """带标签的指标，labels()返回缓存的子指标"""
+
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}  # 标签值 -> 子指标
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """返回标签值对应的子指标，首次使用时创建"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._new_child(tuple(str(value) for value in values))
+                    self._children[values] = child
+        return child
+
+    def _new_child(self, labelvalues):
+        raise NotImplementedError
+
+    def render(self, totals):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for child in list(self._children.values()):
+            lines.extend(child.render(self.name, totals))
+        return lines
+
+
+class _ValueChild:
+    __slots__ = ("_shards", "_index", "_label_str")
+
+    def __init__(self, shards, label_str):
+        self._shards = shards
+        self._index = shards.allocate(1)
+        self._label_str = label_str
+
+    def inc(self, amount=1):
+        self._shards.add(self._index, amount)
+
+    def dec(self, amount=1):
+        self._shards.add(self._index, -amount)
+
+    def render(self, name, totals):
+        return [f"{name}{self._label_str} {_format_value(totals[self._index])}"]
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+
+    type = "counter"
+
+    def _new_child(self, labelvalues):
+        return _ValueChild(self.registry._shards, _format_labels(self.labelnames, labelvalues))
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(Counter):
+    """可增可减的数值（如进行中的请求数）"""
+
+    type = "gauge"
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+
+class _HistogramChild:
+    __slots__ = ("_shards", "_buckets", "_base", "_sum_index", "_bucket_labels", "_label_str")
+
+    def __init__(self, shards, buckets, labelnames, labelvalues):
+        self._shards = shards
+        self._buckets = buckets
+        # 每个桶一个计数槽（含+Inf），最后一个槽为观测值之和
+        self._base = shards.allocate(len(buckets) + 2)
+        self._sum_index = self._base + len(buckets) + 1
+        self._label_str = _format_labels(labelnames, labelvalues)
+        self._bucket_labels = [
+            _format_labels(labelnames + ("le",), labelvalues + (_format_value(bound),))
+            for bound in buckets + (float("inf"),)
+        ]
+
+    def observe(self, value):
+        values = self._shards.local()
+        values[self._base + bisect.bisect_left(self._buckets, value)] += 1
+        values[self._sum_index] += value
+
+    def render(self, name, totals):
+        lines = []
+        cumulative = 0
+        for offset, label_str in enumerate(self._bucket_labels):
+            cumulative += totals[self._base + offset]
+            lines.append(f"{name}_bucket{label_str} {cumulative}")
+        lines.append(f"{name}_sum{self._label_str} {_format_value(totals[self._sum_index])}")
+        lines.append(f"{name}_count{self._label_str} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    """按桶统计的分布（延迟、响应大小）"""
+
+    type = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self, labelvalues):
+        return _HistogramChild(self.registry._shards, self.buckets, self.labelnames, labelvalues)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class CallbackMetric:
+    """采集时调用函数取值的指标，用于导出缓存等组件已有的统计"""
+
+    def __init__(self, name, documentation, fn, labelnames=(), type="gauge"):
+        """
+        Args:
+            fn: 无标签时返回数值；有标签时返回 {标签值元组: 数值}
+        """
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.type = type
+
+    def render(self, totals):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        try:
+            value = self.fn()
+        except Exception:
+            return lines
+        if not self.labelnames:
+            value = {(): value}
+        for labelvalues, number in value.items():
+            if number is not None:
+                label_str = _format_labels(self.labelnames, tuple(str(value) for value in labelvalues))
+                lines.append(f"{self.name}{label_str} {_format_value(number)}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表，所有指标名自动加上namespace前缀"""
+
+    def __init__(self, namespace="wolfram"):
+        self.namespace = namespace
+        self._shards = _Shards()
+        self._metrics = []
+
+    def _name(self, name):
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, self._name(name), documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(self, self._name(name), documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(self, self._name(name), documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, fn, labelnames=(), type="gauge"):
+        return self._register(CallbackMetric(self._name(name), documentation, fn, labelnames, type))
+
+    def render(self):
+        """生成Prometheus文本格式的全部指标"""
+        totals = self._shards.snapshot()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(totals))
+        return "\n".join(lines) + "\n"
+
+
+class FlaskMetrics:
+    """
+    Flask请求指标：按路由统计请求数、延迟和响应大小，以及进行中的请求数
+
+    路由标签使用URL规则（如 /api/simple/<path:query_text>），不会因查询文本不同而产生新的标签
+    """
+
+    def __init__(self, registry):
+        self.requests = registry.counter("http_requests_total", "HTTP请求数", ("route", "method", "status"))
+        self.latency = registry.histogram("http_request_duration_seconds", "HTTP请求处理耗时（秒）", ("route", "method"))
+        self.size = registry.histogram("http_response_size_bytes", "HTTP响应体字节数", ("route",), SIZE_BUCKETS)
+        self.in_flight = registry.gauge("http_requests_in_flight", "进行中的HTTP请求数").labels()
+
+    def init_app(self, app):
+        """
+        注册到Flask应用
+
+        after_request按注册的逆序执行，需在压缩等修改响应体的钩子之前注册，才能统计实际发送的字节数
+        """
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        return self
+
+    def _before_request(self):
+        g._metrics_start = time.perf_counter()
+        self.in_flight.inc()
+
+    def _after_request(self, response):
+        start = g.get("_metrics_start")
+        if start is None:
+            return response
+
+        rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        self.latency.labels(rule, request.method).observe(time.perf_counter() - start)
+        self.requests.labels(rule, request.method, response.status_code).inc()
+        if not response.is_streamed:
+            self.size.labels(rule).observe(response.content_length or 0)
+        return response
+
+    def _teardown_request(self, exc):
+        if g.pop("_metrics_start", None) is not None:
+            self.in_flight.dec()
+
+
+def instrument_transport(registry, transport):
+    """
+    为UpstreamTransport注册上游请求延迟和失败数指标，按上游接口（query.jsp、validatequery.jsp等）区分；
+    启用了自适应并发限制时同时导出当前上限和排队数，启用了熔断器时导出熔断状态和被拒绝的请求数
+    """
+    latency = registry.histogram("upstream_request_duration_seconds", "上游请求耗时（秒）", ("endpoint",))
+    failures = registry.counter("upstream_failures_total", "失败的上游请求数", ("endpoint",))
+    in_flight = registry.callback("upstream_requests_in_flight", "进行中的上游请求数", lambda: transport.in_flight)
+
+    def observe(endpoint, seconds, failed):
+        latency.labels(endpoint).observe(seconds)
+        if failed:
+            failures.labels(endpoint).inc()
+
+    transport.observers.append(observe)
+
+    limiter = getattr(transport, "limiter", None)
+    if limiter is not None:
+        registry.callback("upstream_concurrency_limit", "自适应并发限制的当前上限", lambda: limiter.limit)
+        registry.callback("upstream_queued_requests", "等待上游并发名额的请求数", lambda: limiter.queued)
+        registry.callback("upstream_queue_rejected_total", "排队超时放弃的请求数", lambda: limiter.rejected, type="counter")
+
+    breaker = getattr(transport, "breaker", None)
+    if breaker is not None:
+        states = {"closed": 0, "half_open": 1, "open": 2}
+        registry.callback("upstream_circuit_state", "上游熔断器状态（0关闭、1半开、2打开）",
+                          lambda: states[breaker.state])
+        registry.callback("upstream_circuit_opened_total", "熔断器打开的次数", lambda: breaker.opened, type="counter")
+        registry.callback("upstream_short_circuited_total", "熔断器打开期间被直接拒绝的请求数",
+                          lambda: breaker.short_circuited, type="counter")
+    return latency, failures, in_flight
+
+
+def instrument_cache(registry, cache):
+    """导出TieredCache各级缓存的命中、未命中、命中率和容量"""
+
+    def tier_stats(field):
+        def collect():
+            stats = cache.stats()
+            return {(tier,): tier_stats[field] for tier, tier_stats in stats.items() if tier_stats is not None}
+        return collect
+
+    registry.callback("cache_hits_total", "缓存命中数", tier_stats("hits"), ("tier",), "counter")
+    registry.callback("cache_misses_total", "缓存未命中数", tier_stats("misses"), ("tier",), "counter")
+    registry.callback("cache_hit_ratio", "缓存命中率", tier_stats("hit_ratio"), ("tier",))
+    registry.callback("cache_entries", "缓存条目数", tier_stats("entries"), ("tier",))
+    registry.callback("cache_bytes", "缓存字节数", tier_stats("bytes"), ("tier",))
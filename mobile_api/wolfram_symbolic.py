@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+上游缓慢或不可用时的本地符号计算（降级模式）
+对求导、积分、解方程、因式分解、展开、化简和极限这几类查询，使用SymPy在本地计算，
+生成带有Input和Result两个Pod的结果（queryresult.local为True，engine为"sympy"）：
+    - 上游在延迟预算内返回时使用上游结果
+    - 超过预算后开始本地计算，与上游竞争，先成功的结果胜出
+    - 熔断器打开时直接使用本地结果
+
+符号计算在进程池中执行，不占用请求线程和GIL；每个工作进程缓存已解析的表达式。
+SymPy的计算无法中断：解析前拒绝过大的指数、整数和过深的嵌套，超时的计算所在的进程池被结束并替换，
+不会占住工作进程拖慢后续查询。SymPy为可选依赖，未安装时所有查询照常请求上游
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import re
+import signal
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import sympy
+    from sympy.parsing.sympy_parser import (
+        convert_xor,
+        implicit_multiplication_application,
+        parse_expr,
+        standard_transformations,
+    )
+except ImportError:
+    sympy = None
+
+from wolfram_breaker import OPEN
+
+MAX_EXPRESSION_LENGTH = 200
+# 解析时就会求值的整数运算（9^9^9、10^100000）在解析前拒绝
+MAX_INTEGER_DIGITS = 15
+MAX_EXPONENT = 100
+MAX_NESTING = 8
+
+SymbolicQuery = namedtuple("SymbolicQuery", ["operation", "expression", "variable", "extra"])
+
+# 查询文本 -> 操作，按顺序匹配
+_COMMANDS = [
+    ("derivative", re.compile(
+        r"^(?:derivative of|differentiate|d/d(?P<var>[a-z]))\s+(?P<expr>.+?)"
+        r"(?:\s+(?:with respect to|wrt)\s+(?P<wrt>[a-z]))?$", re.I)),
+    ("integral", re.compile(
+        r"^(?:integrate|integral of)\s+(?P<expr>.+?)(?:\s*d(?P<var>[a-z]))?"
+        r"(?:\s+from\s+(?P<lower>\S+)\s+to\s+(?P<upper>\S+))?$", re.I)),
+    ("limit", re.compile(
+        r"^(?:limit|lim)\s+(?:of\s+)?(?P<expr>.+?)\s+as\s+(?P<var>[a-z])\s*(?:->|→|approaches|to)\s*(?P<point>\S+)$", re.I)),
+    ("limit", re.compile(r"^(?:limit|lim)\s+(?P<var>[a-z])\s*(?:->|→)\s*(?P<point>\S+)\s+(?P<expr>.+)$", re.I)),
+    ("solve", re.compile(r"^solve\s+(?P<expr>.+?)(?:\s+for\s+(?P<var>[a-z]))?$", re.I)),
+    ("factor", re.compile(r"^factor\s+(?P<expr>.+)$", re.I)),
+    ("expand", re.compile(r"^expand\s+(?P<expr>.+)$", re.I)),
+    ("simplify", re.compile(r"^simplify\s+(?P<expr>.+)$", re.I)),
+]
+
+# 表达式中允许的字符和函数名；其余单词（以及属性访问）一律交给上游，避免执行任意代码
+_SAFE_EXPRESSION = re.compile(r"^[0-9A-Za-z+\-*/^().,=\s]+$")
+_IDENTIFIER = re.compile(r"[A-Za-z]+")
+_INTEGER = re.compile(r"\d+")
+_EXPONENT = re.compile(r"\^\s*\(?\s*[+-]?\s*(\d+)")
+# 幂的指数中还有幂（x^2^3、x^(2^10)）
+_POWER_TOWER = re.compile(r"\^\s*[\w.]+\s*\^|\^\s*[+-]?\s*\([^()]*\^")
+_FUNCTION_NAMES = {
+    "sin": "sin", "cos": "cos", "tan": "tan", "cot": "cot", "sec": "sec", "csc": "csc",
+    "arcsin": "asin", "arccos": "acos", "arctan": "atan", "asin": "asin", "acos": "acos", "atan": "atan",
+    "sinh": "sinh", "cosh": "cosh", "tanh": "tanh",
+    "exp": "exp", "log": "log", "ln": "log", "sqrt": "sqrt", "abs": "Abs",
+}
+_CONSTANTS = {"pi": "pi", "e": "E", "oo": "oo", "infinity": "oo", "inf": "oo"}
+
+
+def available():
+    """是否安装了SymPy"""
+    return sympy is not None
+
+
+def parse_query(input_text):
+    """
+    识别可以在本地计算的符号查询
+
+    Returns:
+        SymbolicQuery: 无法识别或表达式不安全时返回None
+    """
+    text = " ".join(str(input_text).split()).replace("∞", "oo")
+    for operation, pattern in _COMMANDS:
+        match = pattern.match(text)
+        if match is None:
+            continue
+        groups = match.groupdict()
+        expression = groups["expr"]
+        extra = tuple(groups[name] for name in ("lower", "upper", "point") if groups.get(name))
+        if not all(_is_safe(part, allow_equation=operation == "solve") for part in (expression,) + extra):
+            return None
+        variable = groups.get("wrt") or groups.get("var")
+        return SymbolicQuery(operation, expression, variable.lower() if variable else None, extra)
+    return None
+
+
+def _is_safe(expression, allow_equation=False):
+    if len(expression) > MAX_EXPRESSION_LENGTH or not _SAFE_EXPRESSION.match(expression):
+        return False
+    if "=" in expression and (not allow_equation or expression.count("=") > 1):
+        return False
+    if any(len(digits) > MAX_INTEGER_DIGITS for digits in _INTEGER.findall(expression)):
+        return False
+    if any(int(digits) > MAX_EXPONENT for digits in _EXPONENT.findall(expression)) or _POWER_TOWER.search(expression):
+        return False
+    if _nesting(expression) > MAX_NESTING:
+        return False
+    for word in _IDENTIFIER.findall(expression):
+        word = word.lower()
+        if len(word) > 1 and word not in _FUNCTION_NAMES and word not in _CONSTANTS:
+            return False
+    return True
+
+
+def _nesting(expression):
+    depth = deepest = 0
+    for char in expression:
+        if char == "(":
+            depth += 1
+            deepest = max(deepest, depth)
+        elif char == ")":
+            depth -= 1
+    return deepest
+
+
+@functools.lru_cache(maxsize=2048)
+def _parse(text):
+    """解析表达式（每个工作进程各自缓存）"""
+    namespace = {name: getattr(sympy, name) for name in ("Integer", "Float", "Rational", "Symbol", "Function")}
+    for alias, name in _FUNCTION_NAMES.items():
+        namespace[alias] = getattr(sympy, name)
+    local = {alias: getattr(sympy, name) for alias, name in _CONSTANTS.items()}
+    transformations = standard_transformations + (implicit_multiplication_application, convert_xor)
+    return parse_expr(text.lower(), local_dict=local, global_dict=namespace, transformations=transformations)
+
+
+def _variable(expr, name):
+    if name:
+        return sympy.Symbol(name)
+    symbols = sorted(expr.free_symbols, key=lambda symbol: symbol.name)
+    if len(symbols) == 1:
+        return symbols[0]
+    if sympy.Symbol("x") in symbols:
+        return sympy.Symbol("x")
+    raise ValueError("无法确定自变量")
+
+
+def _plaintext(expr):
+    """按上游纯文本的写法输出：^表示幂，空格表示乘"""
+    text = sympy.sstr(expr).replace("**", "^").replace("*", " ")
+    return re.sub(r"\bE\b", "e", re.sub(r"\boo\b", "∞", text))
+
+
+def compute(operation, expression, variable=None, extra=()):
+    """
+    执行符号计算（在进程池中运行）
+
+    Returns:
+        tuple: (Input的纯文本, [Result的纯文本, ...])
+
+    Raises:
+        ValueError: 无法计算或结果没有闭式
+    """
+    if operation == "solve":
+        left, _, right = expression.partition("=")
+        lhs, rhs = _parse(left), _parse(right or "0")
+        symbol = _variable(lhs - rhs, variable)
+        solutions = sympy.solve(sympy.Eq(lhs, rhs), symbol)
+        if not solutions:
+            raise ValueError("没有找到解")
+        return f"solve {_plaintext(lhs)} = {_plaintext(rhs)}", [f"{symbol} = {_plaintext(value)}" for value in solutions]
+
+    expr = _parse(expression)
+    if operation in ("factor", "expand", "simplify"):
+        return f"{operation} {_plaintext(expr)}", [_plaintext(getattr(sympy, operation)(expr))]
+
+    symbol = _variable(expr, variable)
+    if operation == "derivative":
+        return f"d/d{symbol}({_plaintext(expr)})", [_plaintext(sympy.diff(expr, symbol))]
+
+    if operation == "integral":
+        if extra:
+            lower, upper = (_parse(bound) for bound in extra)
+            value = sympy.integrate(expr, (symbol, lower, upper))
+            input_text = f"integral_{_plaintext(lower)}^{_plaintext(upper)} {_plaintext(expr)} d{symbol}"
+            results = [_plaintext(value)]
+        else:
+            value = sympy.integrate(expr, symbol)
+            input_text = f"integral {_plaintext(expr)} d{symbol}"
+            results = [f"{_plaintext(value)} + constant"]
+        if value.has(sympy.Integral):
+            raise ValueError("积分没有闭式解")
+        return input_text, results
+
+    if operation == "limit":
+        point = _parse(extra[0])
+        value = sympy.limit(expr, symbol, point)
+        if value.has(sympy.Limit):
+            raise ValueError("无法计算极限")
+        return f"lim_({symbol}->{_plaintext(point)}) {_plaintext(expr)}", [_plaintext(value)]
+
+    raise ValueError(f"不支持的操作: {operation}")
+
+
+def query_result(input_text, computed):
+    """把compute的结果包装成与上游形状相同的queryresult"""
+    input_plaintext, results = computed
+    pods = [
+        {
+            "title": "Input",
+            "scanner": "Identity",
+            "id": "Input",
+            "position": 100,
+            "error": False,
+            "numsubpods": 1,
+            "subpods": [{"title": "", "plaintext": input_plaintext}],
+        },
+        {
+            "title": "Result" if len(results) == 1 else "Results",
+            "scanner": "Symbolic",
+            "id": "Result",
+            "position": 200,
+            "error": False,
+            "numsubpods": len(results),
+            "primary": True,
+            "subpods": [{"title": "", "plaintext": text} for text in results],
+        },
+    ]
+    return {
+        "queryresult": {
+            "success": True,
+            "error": False,
+            "numpods": len(pods),
+            "datatypes": "Math",
+            "timedout": "",
+            "inputstring": input_text,
+            "local": True,
+            "engine": "sympy",
+            "pods": pods,
+        }
+    }
+
+
+def _discard(task):
+    if not task.cancelled():
+        task.exception()
+
+
+# Windows没有SIGKILL，os.kill使用SIGTERM时调用TerminateProcess
+_KILL_SIGNAL = getattr(signal, "SIGKILL", signal.SIGTERM)
+
+
+def _report_pid(pids):
+    """工作进程的initializer：上报自己的PID"""
+    pids.put(os.getpid())
+
+
+class _WorkerPool:
+    """
+    符号计算的进程池，记录工作进程的PID
+
+    工作进程启动时（执行任何计算之前）通过队列上报PID，kill时直接结束这些进程，
+    不依赖ProcessPoolExecutor的内部属性
+    """
+
+    def __init__(self, workers):
+        context = multiprocessing.get_context()
+        self._pids = context.SimpleQueue()
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                            initializer=_report_pid, initargs=(self._pids,))
+
+    def submit(self, fn, *args):
+        return self.executor.submit(fn, *args)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def kill(self):
+        """结束所有工作进程（正在执行的计算无法取消），进程池中的其他计算以BrokenProcessPool失败"""
+        pids = set()
+        while not self._pids.empty():
+            pids.add(self._pids.get())
+        for pid in pids:
+            try:
+                os.kill(pid, _KILL_SIGNAL)
+            except OSError:
+                pass  # 已经退出
+        self.shutdown()
+
+
+class SymbolicEngine:
+    """
+    本地符号计算与上游查询的竞争
+
+    race/arace的upstream参数为发出上游查询的函数（或协程函数），breaker为上游的熔断器；
+    无法在本地计算的查询直接调用upstream
+    """
+
+    def __init__(self, enabled=True, workers=2, budget=3.0, timeout=10.0, threads=32):
+        """
+        Args:
+            enabled (bool): 是否启用（未安装SymPy时始终禁用）
+            workers (int): 符号计算进程数
+            budget (float): 上游的延迟预算（秒），超过后开始本地计算
+            timeout (float): 本地计算的最长时间（秒）
+            threads (int): race中等待上游结果的线程数
+        """
+        self.enabled = enabled and available()
+        self.workers = workers
+        self.budget = budget
+        self.timeout = timeout
+        self.threads = threads
+
+        self._lock = threading.Lock()
+        self._pool = None
+        self._running = {}  # 计算 -> (所在的进程池, 截止时间)
+        self._executor = None
+        self.counts = {
+            "raced": 0,
+            "upstream_wins": 0,
+            "local_wins": 0,
+            "circuit_open": 0,
+            "upstream_failed": 0,
+            "local_failed": 0,
+        }
+        # 因计算超时结束并替换进程池的次数
+        self.pool_restarts = 0
+
+    def parse(self, input_text):
+        """启用时返回可以在本地计算的SymbolicQuery，否则返回None"""
+        return parse_query(input_text) if self.enabled else None
+
+    def submit(self, query):
+        """
+        在进程池中执行符号计算，返回concurrent.futures.Future
+
+        没有人等待、但已超过timeout仍在执行的计算（例如上游先返回后留下的计算）占着工作进程，
+        提交前先替换它们所在的进程池
+        """
+        stale = None
+        with self._lock:
+            now = time.monotonic()
+            if any(pool is self._pool and deadline <= now for pool, deadline in self._running.values()):
+                stale, self._pool = self._pool, None
+                self.pool_restarts += 1
+            if self._pool is None:
+                self._pool = _WorkerPool(self.workers)
+            try:
+                future = self._pool.submit(compute, *query)
+            except BrokenProcessPool:
+                # 工作进程被外部结束（例如内存不足）
+                self._pool = _WorkerPool(self.workers)
+                future = self._pool.submit(compute, *query)
+            self._running[future] = (self._pool, now + self.timeout)
+        if stale is not None:
+            stale.kill()
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future):
+        with self._lock:
+            self._running.pop(future, None)
+
+    def _abandon(self, future):
+        """放弃超时的计算：尚未开始时取消，正在执行时结束并替换所在的进程池"""
+        if future.cancel() or future.done():
+            return
+        with self._lock:
+            entry = self._running.get(future)
+            if entry is None or entry[0] is not self._pool:
+                return
+            pool, self._pool = self._pool, None
+            self.pool_restarts += 1
+        pool.kill()
+
+    def _threads(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="wolfram-symbolic")
+            return self._executor
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def evaluate(self, input_text, query):
+        """同步执行本地计算并返回queryresult"""
+        future = self.submit(query)
+        try:
+            return query_result(input_text, future.result(timeout=self.timeout))
+        except Exception:
+            self._abandon(future)
+            self._count("local_failed")
+            raise
+
+    def race(self, input_text, upstream, breaker=None):
+        """
+        在请求线程中执行：上游在预算内返回时使用上游结果，否则与本地计算竞争
+
+        Returns:
+            dict: 上游结果或本地计算的queryresult
+        """
+        query = self.parse(input_text)
+        if query is None:
+            return upstream()
+
+        if breaker is not None and breaker.state == OPEN:
+            try:
+                result = self.evaluate(input_text, query)
+            except Exception:
+                return upstream()
+            self._count("circuit_open")
+            return result
+
+        self._count("raced")
+        remote = self._threads().submit(upstream)
+        try:
+            result = remote.result(timeout=self.budget)
+        except FutureTimeoutError:
+            pass
+        except Exception:
+            return self._after_upstream_failure(input_text, query, remote)
+        else:
+            self._count("upstream_wins")
+            return result
+
+        started = time.monotonic()
+        local = self.submit(query)
+        done, _ = wait({remote, local}, timeout=self.timeout, return_when=FIRST_COMPLETED)
+        if remote in done and remote.exception() is None:
+            local.cancel()
+            self._count("upstream_wins")
+            return remote.result()
+        if not local.done():
+            # 上游已失败，在剩余时间内等待本地结果
+            wait({local}, timeout=max(0.0, self.timeout - (time.monotonic() - started)))
+        if local.done() and local.exception() is None:
+            self._count("local_wins")
+            return query_result(input_text, local.result())
+
+        self._abandon(local)
+        self._count("local_failed")
+        # 本地计算失败或超时，等待上游（上游失败时抛出上游的异常）
+        result = remote.result()
+        self._count("upstream_wins")
+        return result
+
+    def _after_upstream_failure(self, input_text, query, remote):
+        """上游在预算内失败时使用本地结果，本地也失败时抛出上游的异常"""
+        try:
+            result = self.evaluate(input_text, query)
+        except Exception:
+            return remote.result()
+        self._count("upstream_failed")
+        return result
+
+    async def arace(self, input_text, upstream, breaker=None):
+        """race的异步版本，upstream为返回协程的函数"""
+        query = self.parse(input_text)
+        if query is None:
+            return await upstream()
+
+        if breaker is not None and breaker.state == OPEN:
+            try:
+                result = await self._aevaluate(input_text, query)
+            except Exception:
+                return await upstream()
+            self._count("circuit_open")
+            return result
+
+        self._count("raced")
+        remote = asyncio.ensure_future(upstream())
+        done, _ = await asyncio.wait({remote}, timeout=self.budget)
+        if remote in done:
+            if remote.exception() is None:
+                self._count("upstream_wins")
+                return remote.result()
+            try:
+                result = await self._aevaluate(input_text, query)
+            except Exception:
+                return remote.result()
+            self._count("upstream_failed")
+            return result
+
+        started = time.monotonic()
+        computation = self.submit(query)
+        local = asyncio.wrap_future(computation)
+        done, _ = await asyncio.wait({remote, local}, timeout=self.timeout, return_when=asyncio.FIRST_COMPLETED)
+        if remote in done and remote.exception() is None:
+            local.cancel()
+            self._count("upstream_wins")
+            return remote.result()
+        if not local.done():
+            await asyncio.wait({local}, timeout=max(0.0, self.timeout - (time.monotonic() - started)))
+        if local.done() and not local.cancelled() and local.exception() is None:
+            # 上游请求继续执行（完成后写入缓存），忽略其结果
+            remote.add_done_callback(_discard)
+            self._count("local_wins")
+            return query_result(input_text, local.result())
+
+        local.cancel()
+        self._abandon(computation)
+        self._count("local_failed")
+        result = await remote
+        self._count("upstream_wins")
+        return result
+
+    async def _aevaluate(self, input_text, query):
+        computation = self.submit(query)
+        try:
+            computed = await asyncio.wait_for(asyncio.wrap_future(computation), self.timeout)
+        except Exception:
+            self._abandon(computation)
+            self._count("local_failed")
+            raise
+        return query_result(input_text, computed)
+
+    def stats(self):
+        """返回降级模式的统计信息"""
+        with self._lock:
+            return dict(
+                self.counts,
+                enabled=self.enabled,
+                available=available(),
+                budget=self.budget,
+                pool_restarts=self.pool_restarts,
+            )
+
+
+def create_engine(mode="auto", **kwargs):
+    """
+    按配置创建SymbolicEngine
+
+    Args:
+        mode (str): auto（已安装SymPy时启用）、true 或 false
+
+    Raises:
+        ImportError: mode为true但没有安装SymPy
+    """
+    mode = str(mode).lower()
+    if mode == "true" and not available():
+        raise ImportError("WOLFRAM_SYMBOLIC=true 需要安装sympy")
+    return SymbolicEngine(mode in ("auto", "true"), **kwargs)
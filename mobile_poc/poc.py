@@ -1,6 +1,6 @@
 import requests
-from hashlib import md5
-from urllib.parse import urlsplit, urlencode, unquote_plus
+
+import wolfram_signing
 
 headers = {"User-Agent": "Wolfram Android App"}
 APPID = "3H4296-5YPAGQUJK7" # Mobile app AppId
@@ -18,15 +18,7 @@ def calc_sig(query):
 	In format of "input=...&arg1=...&arg2=..."
 	"""
 
-	params = list(filter(lambda x: len(x) > 1, list(map(lambda x: x.split("="), query.split("&"))))) # split string by & and = and remove empty strings
-	params.sort(key = lambda x: x[0]) # sort by the key
-
-	s = SIG_SALT
-	# Concatenate query together
-	for key, val in params:
-		s += key + val
-	s = s.encode("utf-8")
-	return md5(s).hexdigest().upper()
+	return wolfram_signing.calc_sig(query, SIG_SALT)
 
 def craft_signed_url(url):
 	"""
@@ -36,13 +28,17 @@ def craft_signed_url(url):
 	In format of "https://server/path?input=...&arg1=...&arg2=..."
 	"""
 
-	(scheme, netloc, path, query, _) = urlsplit(url)
-	_query = {"appid": APPID}
+	return wolfram_signing.craft_signed_url(url, APPID, SIG_SALT)
+
+def sign_params(params):
+	"""
+	Craft signed query string directly from a parameter dict (same result as craft_signed_url, memoized)
+	
+	@params
+	Example is {"input": "2+2", "output": "json"}
+	"""
 
-	_query.update(dict(list(filter(lambda x: len(x) > 1, list(map(lambda x: list(map(lambda y: unquote_plus(y), x.split("="))), query.split("&")))))))
-	query = urlencode(_query)
-	_query.update({"sig": calc_sig(query)}) # Calculate signature of all query before we set "sig" up.
-	return f"{scheme}://{netloc}{path}?{urlencode(_query)}"
+	return wolfram_signing.sign_params(params, APPID, SIG_SALT)
 
 def basic_test(query_part):
 	"""
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Wolfram|Alpha 查询结果缓存
+提供进程内的LRU+TTL缓存(L1)和基于SQLite的磁盘缓存(L2)，按规范化后的查询参数作为键；
+过期条目在stale_ttl秒内继续保留，上游不可用时可以通过get_stale读取
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import urlencode
+
+# 不参与缓存键计算的参数（签名和AppId与查询结果无关）
+IGNORED_KEY_PARAMS = ("sig", "appid")
+# 磁盘缓存中原始bytes值的前缀（JSON文本不会以该字节开头）
+RAW_MARKER = b"\x00"
+
+
+def make_cache_key(params, endpoint="query"):
+    """
+    根据查询参数生成规范化的缓存键
+
+    Args:
+        params (dict): 查询参数
+        endpoint (str): 上游接口名称 (query, validatequery)
+
+    Returns:
+        str: 缓存键，形如 "query?format=...&input=..."
+    """
+    items = sorted(
+        (str(key), str(value))
+        for key, value in params.items()
+        if key not in IGNORED_KEY_PARAMS and value is not None
+    )
+    return f"{endpoint}?{urlencode(items)}"
+
+
+class LRUCache:
+    """线程安全的LRU+TTL缓存，同时限制条目数和总字节数"""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=3600, stale_ttl=0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+        self._data = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """读取缓存，未命中或已过期时返回None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, expires_at = entry
+            now = time.monotonic()
+            if expires_at <= now:
+                if expires_at + self.stale_ttl <= now:
+                    self._remove(key)
+                    self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_stale(self, key):
+        """读取缓存，已过期但仍在stale_ttl内的条目也返回"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[2] + self.stale_ttl <= time.monotonic():
+                return None
+            return entry[0]
+
+    def set(self, key, value, size, ttl=None):
+        """
+        写入缓存
+
+        Args:
+            key (str): 缓存键
+            value: 缓存值
+            size (int): 值的字节数，用于总量限制
+            ttl (float): 该条目的存活秒数，默认使用缓存的ttl
+        """
+        if size > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        """删除缓存条目"""
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class SQLiteCache:
+    """
+    基于SQLite的磁盘缓存，多个进程（如gunicorn worker）可共享同一个数据库文件
+
+    数据库使用WAL模式，值以zlib压缩的JSON（bytes值为原始字节）存储，过期条目按TTL淘汰
+    """
+
+    PURGE_INTERVAL = 200  # 每写入多少次执行一次淘汰
+
+    def __init__(self, path, ttl=86400, max_bytes=512 * 1024 * 1024, compress_level=6, stale_ttl=0):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes_since_purge = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connect()
+
+    def _connect(self):
+        """获取当前线程的数据库连接，fork后的子进程会重新建立连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "size INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """读取缓存，未命中、已过期或数据库出错时返回None"""
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key):
+        """
+        读取缓存及其过期时间
+
+        Returns:
+            tuple: (值, 过期时间的time.time()时间戳)，未命中、已过期或数据库出错时返回None
+        """
+        return self._get(key, time.time())
+
+    def get_stale(self, key):
+        """读取缓存，已过期但仍在stale_ttl内的条目也返回（不计入命中统计）"""
+        entry = self._get(key, time.time() - self.stale_ttl, count=False)
+        return entry[0] if entry is not None else None
+
+    def _get(self, key, not_expired_at, count=True):
+        try:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?",
+                (key, not_expired_at)
+            ).fetchone()
+        except sqlite3.Error:
+            self._count("errors")
+            return None
+
+        if row is None:
+            if count:
+                self._count("misses")
+            return None
+
+        if count:
+            self._count("hits")
+        data = zlib.decompress(row[0])
+        if data[:1] == RAW_MARKER:
+            return data[1:], row[1]
+        return json.loads(data), row[1]
+
+    def set(self, key, value, size=None, ttl=None):
+        """写入缓存，bytes值原样存储，其他值序列化为JSON；size参数仅为与LRUCache保持接口一致"""
+        if isinstance(value, bytes):
+            data = RAW_MARKER + value
+        else:
+            data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        blob = zlib.compress(data, self.compress_level)
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, expires_at) VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), expires_at)
+            )
+        except sqlite3.Error:
+            self._count("errors")
+            return
+
+        self._count("writes")
+        with self._lock:
+            self._writes_since_purge += 1
+            should_purge = self._writes_since_purge >= self.PURGE_INTERVAL
+            if should_purge:
+                self._writes_since_purge = 0
+        if should_purge:
+            self.purge()
+
+    def delete(self, key):
+        """删除缓存条目"""
+        try:
+            self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+        except sqlite3.Error:
+            self._count("errors")
+
+    def purge(self):
+        """删除过期超过stale_ttl的条目，超出容量时按过期时间从早到晚继续淘汰"""
+        try:
+            conn = self._connect()
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time() - self.stale_ttl,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                rows = conn.execute("SELECT key, size FROM cache ORDER BY expires_at")
+                victims = []
+                for key, size in rows:
+                    if excess <= 0:
+                        break
+                    victims.append((key,))
+                    excess -= size
+                conn.executemany("DELETE FROM cache WHERE key = ?", victims)
+        except sqlite3.Error:
+            self._count("errors")
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        """返回缓存统计信息"""
+        try:
+            entries, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+            ).fetchone()
+        except sqlite3.Error:
+            entries, size = None, None
+
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class TieredCache:
+    """
+    两级缓存：先查进程内L1，未命中再查磁盘L2，L2命中的结果回填到L1
+
+    回填的条目保留L2中剩余的存活时间（不超过L1的ttl），短期缓存的失败结果在其他worker中同样短期有效
+    """
+
+    def __init__(self, l1, l2=None):
+        self.l1 = l1
+        self.l2 = l2
+
+    def get(self, key):
+        value = self.l1.get(key)
+        if value is not None or self.l2 is None:
+            return value
+
+        entry = self.l2.get_entry(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        ttl = min(expires_at - time.time(), self.l1.ttl)
+        if ttl > 0:
+            self.l1.set(key, value, _estimate_size(value), ttl)
+        return value
+
+    def get_stale(self, key):
+        """读取可能已过期的条目，用于上游不可用时降级"""
+        value = self.l1.get_stale(key)
+        if value is None and self.l2 is not None:
+            value = self.l2.get_stale(key)
+        return value
+
+    def set(self, key, value, size, ttl=None):
+        self.l1.set(key, value, size, ttl)
+        if self.l2 is not None:
+            self.l2.set(key, value, size, ttl)
+
+    def delete(self, key):
+        self.l1.delete(key)
+        if self.l2 is not None:
+            self.l2.delete(key)
+
+    def stats(self):
+        """返回各级缓存的统计信息"""
+        return {
+            "l1": self.l1.stats(),
+            "l2": self.l2.stats() if self.l2 is not None else None,
+        }
+
+
+class SingleFlight:
+    """
+    合并相同键的并发调用：同一时刻只有一个调用者真正执行，
+    其余调用者等待同一个Future并共享其结果（或异常）
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> Future
+        self._lock = threading.Lock()
+
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """执行fn()，若相同key的调用正在进行则等待其结果"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self):
+        """返回合并统计信息"""
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+            }
+
+
+def _estimate_size(value):
+    """估算缓存值的字节数"""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
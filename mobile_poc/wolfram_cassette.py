@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+上游请求的录制与回放
+录制模式下把上游响应（状态码、响应体、耗时）追加写入日志文件，回放模式下直接从日志返回，
+可按原始耗时或零延迟回放，用于离线基准测试和预热缓存
+
+日志文件只追加不修改，每条记录为固定长度的头部 + Content-Type + zlib压缩的响应体；
+索引保存在同名的 .idx SQLite数据库中（请求签名 -> 记录位置），查找时只读取一条记录，
+不需要把录制内容载入内存。索引丢失或落后于日志时，启动时从日志补建
+"""
+
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+import zlib
+from collections import namedtuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+MODES = ("record", "replay", "hybrid")
+
+# 魔数、请求签名、状态码、耗时(微秒)、Content-Type长度、响应体长度、响应体CRC32
+_HEADER = struct.Struct(">4s16sHIHII")
+_MAGIC = b"WAC1"
+
+# 不参与请求签名的参数（与缓存键一致）
+_IGNORED_PARAMS = {"sig", "appid"}
+
+CassetteEntry = namedtuple("CassetteEntry", ["status", "content", "content_type", "elapsed"])
+
+
+def request_key(url):
+    """
+    请求签名：接口路径和按名称排序的查询参数（忽略sig/appid）的哈希
+
+    Returns:
+        bytes: 16字节的签名
+    """
+    parts = urlsplit(url)
+    items = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in _IGNORED_PARAMS
+    )
+    canonical = f"{parts.path}?{urlencode(items)}"
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).digest()
+
+
+def parse_latency(value):
+    """回放延迟：original 按原始耗时，zero 不延迟，数字为原始耗时的倍数"""
+    value = str(value).strip().lower()
+    if value == "original":
+        return 1.0
+    if value == "zero":
+        return 0.0
+    scale = float(value)
+    if scale < 0:
+        raise ValueError(f"无效的回放延迟: {value}")
+    return scale
+
+
+class Cassette:
+    """
+    录制的上游响应
+
+    mode:
+        record   所有请求访问上游并录制（同一请求的新记录覆盖旧记录）
+        replay   只从录制中返回，未录制的请求视为请求失败
+        hybrid   已录制的请求直接回放，未录制的请求访问上游并录制
+    """
+
+    def __init__(self, path, mode="replay", latency="original", compress_level=6):
+        """
+        Args:
+            path (str): 日志文件路径，索引为 path + ".idx"
+            mode (str): record、replay 或 hybrid
+            latency: 回放延迟，见parse_latency
+            compress_level (int): 响应体的zlib压缩级别
+        """
+        if mode not in MODES:
+            raise ValueError(f"无效的录制模式: {mode}（可选 {', '.join(MODES)}）")
+
+        self.path = path
+        self.index_path = path + ".idx"
+        self.mode = mode
+        self.latency_scale = parse_latency(latency)
+        self.compress_level = compress_level
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self.corrupt = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        writable = mode != "replay"
+        flags = (os.O_RDWR | os.O_CREAT | os.O_APPEND) if writable else os.O_RDONLY
+        self._fd = os.open(path, flags | getattr(os, "O_BINARY", 0), 0o644)
+        self._catch_up()
+
+    @property
+    def replaying(self):
+        return self.mode in ("replay", "hybrid")
+
+    @property
+    def recording(self):
+        return self.mode in ("record", "hybrid")
+
+    def _connect(self):
+        """当前线程的索引数据库连接，fork后的子进程会重新建立连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.index_path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key BLOB PRIMARY KEY, offset INTEGER NOT NULL, length INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _indexed_end(self, conn):
+        row = conn.execute("SELECT value FROM meta WHERE name = 'indexed_end'").fetchone()
+        return row[0] if row else 0
+
+    def _catch_up(self):
+        """把索引之后追加的日志记录补进索引（索引丢失或上次写入索引前进程退出）"""
+        conn = self._connect()
+        offset = self._indexed_end(conn)
+        size = os.fstat(self._fd).st_size
+        if offset >= size:
+            return
+
+        rows = []
+        while offset + _HEADER.size <= size:
+            header = _HEADER.unpack(self._read_at(offset, _HEADER.size))
+            magic, key, _, _, type_length, body_length, _ = header
+            length = _HEADER.size + type_length + body_length
+            if magic != _MAGIC or offset + length > size:
+                # 末尾不完整的记录（写入中途退出），之后的追加会从文件末尾开始
+                break
+            rows.append((key, offset, length))
+            offset += length
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR REPLACE INTO entries (key, offset, length) VALUES (?, ?, ?)", rows)
+            conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('indexed_end', ?)", (size,))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _read_at(self, offset, length):
+        if hasattr(os, "pread"):
+            return os.pread(self._fd, length, offset)
+        with self._lock:
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            return os.read(self._fd, length)
+
+    def play(self, url):
+        """
+        查找录制的响应
+
+        Returns:
+            CassetteEntry: 未录制时返回None
+        """
+        row = self._connect().execute(
+            "SELECT offset, length FROM entries WHERE key = ?", (request_key(url),)
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+
+        record = self._read_at(row[0], row[1])
+        magic, _, status, elapsed_us, type_length, body_length, crc = _HEADER.unpack_from(record)
+        body = record[_HEADER.size + type_length:]
+        if magic != _MAGIC or len(body) != body_length or zlib.crc32(body) != crc:
+            self._count("corrupt")
+            return None
+
+        self._count("hits")
+        content_type = record[_HEADER.size:_HEADER.size + type_length].decode("latin-1")
+        return CassetteEntry(status, zlib.decompress(body), content_type, elapsed_us / 1e6)
+
+    def delay(self, entry):
+        """回放时应等待的秒数"""
+        return entry.elapsed * self.latency_scale
+
+    def record(self, url, status, content, content_type, elapsed):
+        """追加一条录制记录，同一请求的新记录覆盖旧记录"""
+        key = request_key(url)
+        body = zlib.compress(content, self.compress_level)
+        content_type = (content_type or "").encode("latin-1", "replace")[:0xFFFF]
+        record = _HEADER.pack(
+            _MAGIC, key, status, min(int(elapsed * 1e6), 0xFFFFFFFF),
+            len(content_type), len(body), zlib.crc32(body)
+        ) + content_type + body
+
+        with self._lock:
+            # 多个进程同时录制时用文件锁保证记录不交错
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                offset = os.lseek(self._fd, 0, os.SEEK_END)
+                os.write(self._fd, record)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, offset, length) VALUES (?, ?, ?)",
+                    (key, offset, len(record))
+                )
+                conn.execute(
+                    "INSERT INTO meta (name, value) VALUES ('indexed_end', ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = MAX(value, excluded.value)",
+                    (offset + len(record),)
+                )
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            # 日志已写入，下次启动时补建索引
+            return
+        self._count("recorded")
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        os.close(self._fd)
+
+    def stats(self):
+        """返回录制/回放统计信息"""
+        with self._lock:
+            return {
+                "path": self.path,
+                "mode": self.mode,
+                "latency_scale": self.latency_scale,
+                "entries": len(self),
+                "bytes": os.fstat(self._fd).st_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "recorded": self.recorded,
+                "corrupt": self.corrupt,
+            }
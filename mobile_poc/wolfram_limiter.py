@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+上游请求的自适应并发限制 (AIMD)
+上游响应正常时并发上限逐步加一，出现超时、429/5xx或延迟突增时按比例减小，
+超出上限的请求排队等待，超过等待期限时放弃，使并发数贴近上游的实际承载能力；
+同步请求和asyncio请求共用同一个上限
+"""
+
+import asyncio
+import collections
+import threading
+import time
+
+
+class LimiterTimeout(Exception):
+    """排队等待超过期限"""
+
+
+class AdaptiveLimiter:
+    """
+    加性增、乘性减的并发限制
+
+    - 每个正常返回的请求使上限增加 1/上限（即每轮往返约加一），只在并发数接近上限时增加
+    - 超时、429/5xx或延迟突增时，上限乘以backoff；只有在上次减小之后发出的请求才会触发减小，
+      避免同一批慢请求连续减小多次
+    - 不同查询的耗时相差很大，单个慢请求不算延迟突增：近期延迟（短窗口的指数移动平均）
+      超过长期基线（长窗口的指数移动平均）的latency_tolerance倍时才算
+    """
+
+    def __init__(self, initial_limit=32, min_limit=1, max_limit=256, backoff=0.7,
+                 latency_tolerance=2.0, short_window=10, long_window=500):
+        """
+        Args:
+            initial_limit (int): 初始并发上限
+            min_limit (int): 最小并发上限
+            max_limit (int): 最大并发上限
+            backoff (float): 减小时乘以的系数 (0-1)
+            latency_tolerance (float): 近期延迟超过长期基线的倍数时视为延迟突增
+            short_window (int): 近期延迟的平滑窗口（请求数）
+            long_window (int): 长期基线的平滑窗口（请求数）
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.short_alpha = 1 / short_window
+        self.long_alpha = 1 / long_window
+
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._cond = threading.Condition()
+        self._async_waiters = collections.deque()  # 排队中的asyncio请求 (事件循环, future)
+        self._last_decrease = 0.0
+        self.recent = None
+        self.baseline = None
+
+        self.in_flight = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.rejected = 0
+        self.increases = 0
+        self.decreases = 0
+        self.total_wait = 0.0
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def acquire(self, timeout=None):
+        """
+        获取一个并发名额，超出上限时排队等待
+
+        Returns:
+            float: 发出时间，释放时传给release
+
+        Raises:
+            LimiterTimeout: 等待超过timeout秒
+        """
+        with self._cond:
+            if self.in_flight >= int(self._limit):
+                started = time.perf_counter()
+                deadline = None if timeout is None else started + timeout
+                self.queued += 1
+                self.peak_queued = max(self.peak_queued, self.queued)
+                try:
+                    while self.in_flight >= int(self._limit):
+                        remaining = None if deadline is None else deadline - time.perf_counter()
+                        if remaining is not None and remaining <= 0:
+                            self.rejected += 1
+                            raise LimiterTimeout(f"等待上游并发名额超过 {timeout} 秒")
+                        self._cond.wait(remaining)
+                finally:
+                    self.queued -= 1
+                    self.total_wait += time.perf_counter() - started
+            self.in_flight += 1
+        return time.perf_counter()
+
+    async def acquire_async(self, timeout=None):
+        """
+        acquire的asyncio版本，排队时不阻塞事件循环
+
+        Returns:
+            float: 发出时间，释放时传给release
+
+        Raises:
+            LimiterTimeout: 等待超过timeout秒
+        """
+        with self._cond:
+            if self.in_flight < int(self._limit):
+                self.in_flight += 1
+                return time.perf_counter()
+            started = time.perf_counter()
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else started + timeout
+        waiter = None
+        try:
+            while True:
+                with self._cond:
+                    if self.in_flight < int(self._limit):
+                        self.in_flight += 1
+                        break
+                    remaining = None if deadline is None else deadline - time.perf_counter()
+                    if remaining is not None and remaining <= 0:
+                        self.rejected += 1
+                        raise LimiterTimeout(f"等待上游并发名额超过 {timeout} 秒")
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+                try:
+                    await asyncio.wait_for(waiter, remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                if waiter is not None and (loop, waiter) in self._async_waiters:
+                    self._async_waiters.remove((loop, waiter))
+                self.queued -= 1
+                self.total_wait += time.perf_counter() - started
+                # 被唤醒后没有用上名额（超时、取消）时转交给下一个等待者
+                if self.in_flight < int(self._limit):
+                    self._notify()
+        return time.perf_counter()
+
+    def release(self, start, throttled=False):
+        """
+        释放名额并根据结果调整上限
+
+        Args:
+            start (float): acquire返回的发出时间
+            throttled (bool): 请求超时、被限流(429)或上游出错(5xx)，None表示请求被取消，只释放名额
+        """
+        now = time.perf_counter()
+        elapsed = now - start
+        with self._cond:
+            self.in_flight -= 1
+            if throttled is None:
+                self._notify()
+                return
+            spike = False
+            if not throttled:
+                if self.baseline is None:
+                    self.recent = self.baseline = elapsed
+                self.recent += (elapsed - self.recent) * self.short_alpha
+                self.baseline += (elapsed - self.baseline) * self.long_alpha
+                spike = self.recent > self.baseline * self.latency_tolerance
+
+            if throttled or spike:
+                if start >= self._last_decrease and self._limit > self.min_limit:
+                    self._limit = max(float(self.min_limit), self._limit * self.backoff)
+                    self._last_decrease = now
+                    self.decreases += 1
+            elif self.in_flight + 1 >= int(self._limit) / 2 and self._limit < self.max_limit:
+                previous = int(self._limit)
+                self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+                if int(self._limit) > previous:
+                    self.increases += 1
+            self._notify()
+
+    def _notify(self):
+        """唤醒一个排队的请求，先唤醒asyncio请求（调用时持有_cond）"""
+        while self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            if not waiter.done():
+                try:
+                    loop.call_soon_threadsafe(_wake, waiter)
+                except RuntimeError:
+                    # 事件循环已经关闭
+                    continue
+                return
+        self._cond.notify()
+
+    def stats(self):
+        """返回限流统计信息"""
+        with self._cond:
+            return {
+                "limit": int(self._limit),
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "peak_queued": self.peak_queued,
+                "rejected": self.rejected,
+                "increases": self.increases,
+                "decreases": self.decreases,
+                "recent_ms": round(self.recent * 1000, 2) if self.recent is not None else None,
+                "baseline_ms": round(self.baseline * 1000, 2) if self.baseline is not None else None,
+                "total_wait_seconds": round(self.total_wait, 3),
+            }
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
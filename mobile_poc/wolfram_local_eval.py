@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+简单算术表达式的本地计算
+"2+2"、"sqrt(16)"、"sin(pi/2)" 这类纯数值输入直接在本地用精确的有理数运算求值，
+生成与上游形状相同、带有Input和Result两个Pod的queryresult（queryresult.local为True），
+不再发出需要数秒的上游请求
+
+只处理结果可以精确确定的输入：整数和分数的四则运算、整数次幂、完全平方数的平方根、
+特殊角(π的有理数倍)的三角函数等；小数、无理数结果、隐式乘法、单词等一律交给上游
+"""
+
+import ast
+import math
+import re
+from fractions import Fraction
+
+# 结果最多的位数，更长的结果交给上游（上游对超长数字的显示方式不同）
+MAX_RESULT_DIGITS = 60
+MAX_EXPONENT = 1024
+
+# 允许出现的字符；数字后紧跟字母或括号（隐式乘法，如 2pi、2(3)）时不处理
+_ALLOWED = re.compile(r"^[0-9+\-*/^().\sA-Za-zπ]+$")
+_IMPLICIT_PRODUCT = re.compile(r"[0-9)]\s*[A-Za-zπ(]")
+
+# 不影响Input/Result两个Pod内容的查询参数，含有其他参数（podstate、assumption等）时交给上游
+PASSIVE_PARAMS = {
+    "input", "format", "output", "includepodid", "podtimeout", "scantimeout",
+    "reinterpret", "translation", "ignorecase",
+}
+LOCAL_PODS = ("Input", "Result")
+
+_HALF = Fraction(1, 2)
+# π的有理数倍（对2取模）-> 三角函数值
+_SIN = {Fraction(0): 0, Fraction(1, 6): _HALF, _HALF: 1, Fraction(5, 6): _HALF, Fraction(1): 0,
+        Fraction(7, 6): -_HALF, Fraction(3, 2): -1, Fraction(11, 6): -_HALF}
+_COS = {Fraction(0): 1, Fraction(1, 3): _HALF, _HALF: 0, Fraction(2, 3): -_HALF, Fraction(1): -1,
+        Fraction(4, 3): -_HALF, Fraction(3, 2): 0, Fraction(5, 3): _HALF}
+_TAN = {Fraction(0): 0, Fraction(1, 4): 1, Fraction(3, 4): -1, Fraction(1): 0,
+        Fraction(5, 4): 1, Fraction(7, 4): -1}
+
+_PRECEDENCE = {ast.Add: 1, ast.Sub: 1, ast.Mult: 2, ast.Div: 2, ast.Pow: 4}
+_SYMBOLS = {ast.Add: " + ", ast.Sub: " - ", ast.Mult: "×", ast.Div: "/", ast.Pow: "^"}
+
+
+class _Unsupported(Exception):
+    """无法确定精确结果，交给上游"""
+
+
+class _PiMultiple:
+    """π的有理数倍，只作为三角函数的参数使用"""
+
+    def __init__(self, coefficient):
+        self.coefficient = Fraction(coefficient)
+
+
+def evaluate(input_text):
+    """
+    在本地计算纯数值表达式
+
+    Returns:
+        tuple: (Input的纯文本, Result的纯文本)，无法确定精确结果时返回None
+    """
+    text = str(input_text).strip()
+    if not text or not _ALLOWED.match(text) or "**" in text or "//" in text or _IMPLICIT_PRODUCT.search(text):
+        return None
+    try:
+        tree = ast.parse(text.replace("π", "pi").replace("^", "**"), mode="eval")
+        value = _eval(tree.body)
+    except (SyntaxError, ValueError, ZeroDivisionError, RecursionError, _Unsupported):
+        return None
+
+    if not isinstance(value, Fraction):
+        return None
+    result = str(value.numerator) if value.denominator == 1 else f"{value.numerator}/{value.denominator}"
+    if len(result) > MAX_RESULT_DIGITS:
+        return None
+    return _render(tree.body), result
+
+
+def local_result(params):
+    """
+    查询参数可以在本地回答时，返回与上游形状相同的JSON查询结果，否则返回None
+
+    Args:
+        params (dict): 规范化后的上游查询参数
+    """
+    if params.get("output", "xml") != "json" or any(key not in PASSIVE_PARAMS for key in params):
+        return None
+    if "plaintext" not in str(params.get("format", "plaintext")):
+        return None
+
+    pod_ids = LOCAL_PODS
+    if params.get("includepodid"):
+        pod_ids = [pod_id.strip() for pod_id in str(params["includepodid"]).split(",")]
+        if any(pod_id not in LOCAL_PODS for pod_id in pod_ids):
+            return None
+
+    evaluated = evaluate(params.get("input", ""))
+    if evaluated is None:
+        return None
+
+    input_text, result_text = evaluated
+    pods = []
+    if "Input" in pod_ids:
+        pods.append(_pod("Input", "Input", "Identity", 100, input_text))
+    if "Result" in pod_ids:
+        pods.append(dict(_pod("Result", "Result", "Simplification", 200, result_text), primary=True))
+
+    return {
+        "queryresult": {
+            "success": True,
+            "error": False,
+            "numpods": len(pods),
+            "datatypes": "Math",
+            "timedout": "",
+            "timedoutpods": "",
+            "timing": 0.0,
+            "parsetiming": 0.0,
+            "parsetimedout": False,
+            "inputstring": params.get("input", ""),
+            "local": True,
+            "pods": pods,
+        }
+    }
+
+
+def _pod(title, pod_id, scanner, position, plaintext):
+    return {
+        "title": title,
+        "scanner": scanner,
+        "id": pod_id,
+        "position": position,
+        "error": False,
+        "numsubpods": 1,
+        "subpods": [{"title": "", "plaintext": plaintext}],
+    }
+
+
+def _eval(node):
+    if isinstance(node, ast.Constant) and type(node.value) is int:
+        return Fraction(node.value)
+
+    if isinstance(node, ast.Name) and node.id == "pi":
+        return _PiMultiple(1)
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        value = _eval(node.operand)
+        if isinstance(node.op, ast.UAdd):
+            return value
+        return _PiMultiple(-value.coefficient) if isinstance(value, _PiMultiple) else -value
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _PRECEDENCE:
+        return _binop(node.op, _eval(node.left), _eval(node.right))
+
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and len(node.args) == 1 and not node.keywords):
+        function = _FUNCTIONS.get(node.func.id)
+        if function is not None:
+            return function(_eval(node.args[0]))
+
+    raise _Unsupported()
+
+
+def _binop(op, left, right):
+    left_pi = isinstance(left, _PiMultiple)
+    right_pi = isinstance(right, _PiMultiple)
+
+    if isinstance(op, (ast.Add, ast.Sub)):
+        if left_pi and right_pi:
+            sign = 1 if isinstance(op, ast.Add) else -1
+            return _PiMultiple(left.coefficient + sign * right.coefficient)
+        if left_pi or right_pi:
+            raise _Unsupported()
+        return left + right if isinstance(op, ast.Add) else left - right
+
+    if isinstance(op, ast.Mult):
+        if left_pi and right_pi:
+            raise _Unsupported()
+        if left_pi:
+            return _PiMultiple(left.coefficient * right)
+        if right_pi:
+            return _PiMultiple(left * right.coefficient)
+        return left * right
+
+    if isinstance(op, ast.Div):
+        if right_pi:
+            if not left_pi:
+                raise _Unsupported()
+            return left.coefficient / right.coefficient
+        if left_pi:
+            return _PiMultiple(left.coefficient / right)
+        return left / right
+
+    # 幂：只处理有理数的整数次幂
+    if left_pi or right_pi or right.denominator != 1 or abs(right) > MAX_EXPONENT:
+        raise _Unsupported()
+    if left == 0 and right <= 0:
+        raise _Unsupported()
+    magnitude = max(abs(left.numerator), left.denominator)
+    if magnitude > 1 and abs(right) * math.log10(magnitude) > MAX_RESULT_DIGITS:
+        raise _Unsupported()
+    return left ** int(right)
+
+
+def _rational(value):
+    if isinstance(value, _PiMultiple):
+        raise _Unsupported()
+    return value
+
+
+def _sqrt(value):
+    value = _rational(value)
+    if value < 0:
+        raise _Unsupported()
+    numerator, denominator = math.isqrt(value.numerator), math.isqrt(value.denominator)
+    if numerator * numerator != value.numerator or denominator * denominator != value.denominator:
+        raise _Unsupported()
+    return Fraction(numerator, denominator)
+
+
+def _trig(table):
+    def function(value):
+        if isinstance(value, _PiMultiple):
+            angle = value.coefficient % 2
+        elif value == 0:
+            angle = Fraction(0)
+        else:
+            raise _Unsupported()
+        if angle not in table:
+            raise _Unsupported()
+        return Fraction(table[angle])
+    return function
+
+
+def _exact(argument, result):
+    def function(value):
+        if _rational(value) != argument:
+            raise _Unsupported()
+        return Fraction(result)
+    return function
+
+
+_FUNCTIONS = {
+    "sqrt": _sqrt,
+    "abs": lambda value: abs(_rational(value)),
+    "sin": _trig(_SIN),
+    "cos": _trig(_COS),
+    "tan": _trig(_TAN),
+    "exp": _exact(0, 1),
+    "ln": _exact(1, 0),
+    "log": _exact(1, 0),
+}
+
+
+def _render(node, parent=0, right=False):
+    """按上游Input Pod的写法输出表达式：加减号两侧有空格，乘号为×，π代替pi"""
+    if isinstance(node, ast.Constant):
+        return str(node.value)
+    if isinstance(node, ast.Name):
+        return "π"
+    if isinstance(node, ast.Call):
+        return f"{node.func.id}({_render(node.args[0])})"
+    if isinstance(node, ast.UnaryOp):
+        text = ("-" if isinstance(node.op, ast.USub) else "+") + _render(node.operand, 3)
+        return f"({text})" if parent > 2 or (parent and right) else text
+
+    precedence = _PRECEDENCE[type(node.op)]
+    pow_op = isinstance(node.op, ast.Pow)
+    text = (_render(node.left, precedence + pow_op) + _SYMBOLS[type(node.op)]
+            + _render(node.right, precedence, right=not pow_op))
+    if precedence < parent or (right and precedence == parent):
+        return f"({text})"
+    return text
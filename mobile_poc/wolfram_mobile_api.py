@@ -7,45 +7,136 @@ Wolfram|Alpha Mobile API 简化封装
 """
 
 import requests
-from hashlib import md5
-from urllib.parse import urlsplit, urlencode, unquote_plus
 import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+from wolfram_cache import LRUCache, SQLiteCache, SingleFlight, TieredCache, make_cache_key
+from wolfram_breaker import CircuitBreaker
+from wolfram_cassette import Cassette
+from wolfram_limiter import AdaptiveLimiter
+from wolfram_local_eval import local_result
+from wolfram_normalize import QueryNormalizer
+from wolfram_podstore import PodStore, is_full_query
+from wolfram_signing import calc_sig, craft_signed_url, signed_url
+from wolfram_transport import UpstreamTransport
+
+# 结果缓存配置，与增强版服务器使用相同的环境变量
+CACHE_MAX_ENTRIES = int(os.environ.get("WOLFRAM_CACHE_MAX_ENTRIES", 2048))
+CACHE_MAX_BYTES = int(os.environ.get("WOLFRAM_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CACHE_TTL = float(os.environ.get("WOLFRAM_CACHE_TTL", 3600))
+# 查询规范化：统一空白、运算符两侧空格、Unicode数学符号和多值参数的顺序，提高缓存命中率
+NORMALIZE = os.environ.get("WOLFRAM_NORMALIZE", "true").lower() == "true"
+# "2+2"、"sqrt(16)" 这类可以精确计算的纯数值输入在本地计算，不请求上游
+LOCAL_EVAL = os.environ.get("WOLFRAM_LOCAL_EVAL", "true").lower() == "true"
+# 只请求部分Pod（includepodid）的查询从缓存中同一输入的完整结果派生，不再请求上游
+DERIVE_PODS = os.environ.get("WOLFRAM_DERIVE_PODS", "true").lower() == "true"
+# 磁盘缓存(L2)配置，路径设为空字符串时禁用
+L2_CACHE_PATH = os.environ.get("WOLFRAM_L2_CACHE_PATH", "wolfram_cache.db")
+L2_CACHE_MAX_BYTES = int(os.environ.get("WOLFRAM_L2_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+L2_CACHE_TTL = float(os.environ.get("WOLFRAM_L2_CACHE_TTL", 86400))
+# 无法解析的输入（失败的结果）的缓存时间，0表示不缓存
+NEGATIVE_CACHE_TTL = float(os.environ.get("WOLFRAM_NEGATIVE_CACHE_TTL", 300))
+# 过期条目继续保留的时间，上游不可用时返回过期的结果
+CACHE_STALE_TTL = float(os.environ.get("WOLFRAM_CACHE_STALE_TTL", 3600))
+# 上游地址，基准测试时可指向本地的模拟服务器 (benchmarks/stub_upstream.py)
+UPSTREAM_BASE_URL = os.environ.get("WOLFRAM_UPSTREAM_BASE_URL", "https://api.wolframalpha.com").rstrip("/")
+# 上游连接池配置
+UPSTREAM_POOL_SIZE = int(os.environ.get("WOLFRAM_UPSTREAM_POOL_SIZE", 32))
+UPSTREAM_POOL_BLOCK = os.environ.get("WOLFRAM_UPSTREAM_POOL_BLOCK", "false").lower() == "true"
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get("WOLFRAM_UPSTREAM_CONNECT_TIMEOUT", 5))
+UPSTREAM_READ_TIMEOUT = float(os.environ.get("WOLFRAM_UPSTREAM_READ_TIMEOUT", 30))
+# 上游响应的录制/回放：设置路径后按WOLFRAM_CASSETTE_MODE录制(record)、回放(replay)或两者结合(hybrid)
+CASSETTE_PATH = os.environ.get("WOLFRAM_CASSETTE_PATH", "")
+CASSETTE_MODE = os.environ.get("WOLFRAM_CASSETTE_MODE", "replay")
+CASSETTE_LATENCY = os.environ.get("WOLFRAM_CASSETTE_LATENCY", "original")
+# 上游自适应并发限制 (AIMD)：超时、429/5xx或延迟突增时减小上限，超出上限的请求最多排队WOLFRAM_UPSTREAM_QUEUE_TIMEOUT秒
+ADAPTIVE_LIMIT = os.environ.get("WOLFRAM_ADAPTIVE_LIMIT", "true").lower() == "true"
+ADAPTIVE_LIMIT_INITIAL = int(os.environ.get("WOLFRAM_ADAPTIVE_LIMIT_INITIAL", UPSTREAM_POOL_SIZE))
+ADAPTIVE_LIMIT_MIN = int(os.environ.get("WOLFRAM_ADAPTIVE_LIMIT_MIN", 1))
+ADAPTIVE_LIMIT_MAX = int(os.environ.get("WOLFRAM_ADAPTIVE_LIMIT_MAX", 256))
+ADAPTIVE_LIMIT_BACKOFF = float(os.environ.get("WOLFRAM_ADAPTIVE_LIMIT_BACKOFF", 0.7))
+ADAPTIVE_LATENCY_TOLERANCE = float(os.environ.get("WOLFRAM_ADAPTIVE_LATENCY_TOLERANCE", 2.0))
+UPSTREAM_QUEUE_TIMEOUT = float(os.environ.get("WOLFRAM_UPSTREAM_QUEUE_TIMEOUT", 10))
+# 上游熔断：失败率过高时直接拒绝请求，一段时间后放行探测请求
+BREAKER = os.environ.get("WOLFRAM_BREAKER", "true").lower() == "true"
+BREAKER_ERROR_RATE = float(os.environ.get("WOLFRAM_BREAKER_ERROR_RATE", 0.5))
+BREAKER_MIN_REQUESTS = int(os.environ.get("WOLFRAM_BREAKER_MIN_REQUESTS", 20))
+BREAKER_WINDOW = int(os.environ.get("WOLFRAM_BREAKER_WINDOW", 30))
+BREAKER_OPEN_SECONDS = float(os.environ.get("WOLFRAM_BREAKER_OPEN_SECONDS", 15))
 
 class WolframMobileAPI:
     """Wolfram|Alpha Mobile API 客户端"""
     
-    def __init__(self):
+    def __init__(self, cache=None):
         self.headers = {"User-Agent": "Wolfram Android App"}
         self.appid = "3H4296-5YPAGQUJK7"  # Mobile app AppId
-        self.server = "api.wolframalpha.com"
+        self.base_url = UPSTREAM_BASE_URL
+        self.server = urlsplit(self.base_url).netloc
         self.sig_salt = "vFdeaRwBTVqdc5CL"  # Mobile app salt
         
-        self.session = requests.Session()
-        self.session.headers.update(self.headers)
+        # 所有线程共享的上游连接池，带连接/读取超时
+        self.transport = UpstreamTransport(
+            self.headers,
+            pool_size=UPSTREAM_POOL_SIZE,
+            pool_block=UPSTREAM_POOL_BLOCK,
+            connect_timeout=UPSTREAM_CONNECT_TIMEOUT,
+            read_timeout=UPSTREAM_READ_TIMEOUT,
+            cassette=Cassette(CASSETTE_PATH, CASSETTE_MODE, CASSETTE_LATENCY) if CASSETTE_PATH else None,
+            limiter=AdaptiveLimiter(
+                ADAPTIVE_LIMIT_INITIAL,
+                min_limit=ADAPTIVE_LIMIT_MIN,
+                max_limit=ADAPTIVE_LIMIT_MAX,
+                backoff=ADAPTIVE_LIMIT_BACKOFF,
+                latency_tolerance=ADAPTIVE_LATENCY_TOLERANCE
+            ) if ADAPTIVE_LIMIT else None,
+            queue_timeout=UPSTREAM_QUEUE_TIMEOUT,
+            breaker=CircuitBreaker(
+                BREAKER_ERROR_RATE,
+                min_requests=BREAKER_MIN_REQUESTS,
+                window=BREAKER_WINDOW,
+                open_seconds=BREAKER_OPEN_SECONDS
+            ) if BREAKER else None
+        )
+        
+        # query_json结果缓存：进程内LRU缓存 + 多进程共享的SQLite缓存
+        if cache is None:
+            l1 = LRUCache(max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL,
+                          stale_ttl=CACHE_STALE_TTL)
+            l2 = SQLiteCache(L2_CACHE_PATH, ttl=L2_CACHE_TTL, max_bytes=L2_CACHE_MAX_BYTES,
+                             stale_ttl=CACHE_STALE_TTL) if L2_CACHE_PATH else None
+            cache = TieredCache(l1, l2)
+        self.cache = cache
+        # 按Pod ID索引缓存中的完整结果，get_result_text等部分Pod的查询直接从中派生
+        self.pods = PodStore(self.cache, ttl=CACHE_TTL) if DERIVE_PODS else None
+        # 合并相同参数的并发上游请求
+        self.inflight = SingleFlight()
+        # 写法不同、含义相同的查询规范化为同一组参数（同时用于缓存键和上游请求）
+        self.normalizer = QueryNormalizer(NORMALIZE)
+        # 短期缓存的失败结果数，以及上游不可用时返回过期缓存的次数
+        self.fallback_stats = {"negative_cached": 0, "stale_served": 0}
+        # 在本地计算的查询数
+        self.local_stats = {"answered": 0}
+        self._stats_lock = threading.Lock()
+    
+    def _count(self, stats, key):
+        """递增统计计数（并发请求的线程同时更新，需要加锁）"""
+        with self._stats_lock:
+            stats[key] += 1
+    
+    @property
+    def session(self):
+        """当前线程的requests.Session（共享连接池）"""
+        return self.transport.session
     
     def _calc_sig(self, query):
         """计算签名"""
-        params = list(filter(lambda x: len(x) > 1, 
-                    list(map(lambda x: x.split("="), query.split("&")))))
-        params.sort(key=lambda x: x[0])
-        
-        s = self.sig_salt
-        for key, val in params:
-            s += key + val
-        s = s.encode("utf-8")
-        return md5(s).hexdigest().upper()
+        return calc_sig(query, self.sig_salt)
     
     def _craft_signed_url(self, url):
         """构建签名URL"""
-        (scheme, netloc, path, query, _) = urlsplit(url)
-        _query = {"appid": self.appid}
-        
-        _query.update(dict(list(filter(lambda x: len(x) > 1, 
-            list(map(lambda x: list(map(lambda y: unquote_plus(y), x.split("="))), 
-                   query.split("&")))))))
-        query = urlencode(_query)
-        _query.update({"sig": self._calc_sig(query)})
-        return f"{scheme}://{netloc}{path}?{urlencode(_query)}"
+        return craft_signed_url(url, self.appid, self.sig_salt)
     
     def query(self, input_text, format_type="plaintext", output_type="json", **kwargs):
         """
@@ -60,30 +151,78 @@ class WolframMobileAPI:
         Returns:
             str: 查询结果
         """
+        return self._request(self._build_params(input_text, format_type, output_type, kwargs))
+    
+    def _build_params(self, input_text, format_type, output_type, kwargs):
+        """生成规范化后的上游查询参数"""
         params = {
             "input": input_text,
             "format": format_type,
             "output": output_type
         }
         params.update(kwargs)
-        
-        query_string = urlencode(params)
-        url = f"https://{self.server}/v2/query.jsp?{query_string}"
+        return self.normalizer.params(params)
+    
+    def _request(self, params):
+        """请求上游，返回响应文本"""
+        url = signed_url(f"{self.base_url}/v2/query.jsp", params, self.appid, self.sig_salt)
         
         try:
-            response = self.session.get(self._craft_signed_url(url))
-            response.raise_for_status()
+            response = self.transport.get(url)
             return response.text
         except requests.exceptions.RequestException as e:
             raise Exception(f"API请求失败: {e}")
     
     def query_json(self, input_text, **kwargs):
-        """查询并返回JSON格式结果"""
-        result = self.query(input_text, format_type="plaintext", output_type="json", **kwargs)
-        try:
-            return json.loads(result)
-        except json.JSONDecodeError:
-            raise Exception("无法解析JSON结果")
+        """
+        查询并返回JSON格式结果，成功的结果会被缓存
+
+        "2+2" 这类纯数值输入在本地计算（queryresult.local为True）；缓存中有同一输入的完整结果时，
+        带includepodid的查询直接从中取出所需的Pod；
+        失败的结果按NEGATIVE_CACHE_TTL短期缓存；上游请求失败时返回stale_ttl内的过期缓存
+        """
+        params = self._build_params(input_text, "plaintext", "json", kwargs)
+        if LOCAL_EVAL:
+            local = local_result(params)
+            if local is not None:
+                self._count(self.local_stats, 'answered')
+                return local
+        
+        cache_key = make_cache_key(params)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        def load():
+            derived = self.pods.derive(params) if self.pods is not None else None
+            if derived is not None:
+                self.cache.set(cache_key, derived, len(json.dumps(derived, ensure_ascii=False).encode('utf-8')))
+                return derived
+            
+            try:
+                result = self._request(params)
+            except Exception:
+                stale = self.cache.get_stale(cache_key)
+                if stale is None:
+                    raise
+                self._count(self.fallback_stats, 'stale_served')
+                return stale
+            
+            try:
+                parsed = json.loads(result)
+            except json.JSONDecodeError:
+                raise Exception("无法解析JSON结果")
+            
+            if parsed.get('queryresult', {}).get('success'):
+                self.cache.set(cache_key, parsed, len(result))
+                if self.pods is not None and is_full_query(params):
+                    self.pods.add(cache_key, parsed)
+            elif NEGATIVE_CACHE_TTL > 0:
+                self.cache.set(cache_key, parsed, len(result), ttl=NEGATIVE_CACHE_TTL)
+                self._count(self.fallback_stats, 'negative_cached')
+            return parsed
+        
+        return self.inflight.do(cache_key, load)
     
     def query_plaintext(self, input_text, **kwargs):
         """查询并返回纯文本格式结果"""
@@ -142,27 +281,39 @@ class WolframMobileAPI:
             if not query_result.get('success', False):
                 return {"error": f"查询失败: {query_result.get('error', '未知错误')}"}
             
-            pods = query_result.get('pods', [])
-            results = {}
-            
-            for pod in pods:
-                pod_title = pod.get('title', 'Unknown')
-                pod_id = pod.get('id', 'Unknown')
-                subpods = pod.get('subpods', [])
-                
-                pod_results = []
-                for subpod in subpods:
-                    plaintext = subpod.get('plaintext', '')
-                    if plaintext:
-                        pod_results.append(plaintext)
-                
-                if pod_results:
-                    results[f"{pod_title} ({pod_id})"] = pod_results
-            
-            return results
+            return self.pod_texts(query_result.get('pods', []))
             
         except Exception as e:
             return {"error": f"获取结果失败: {e}"}
+    
+    @staticmethod
+    def pod_texts(pods):
+        """
+        将Pod列表整理为 {"标题 (ID)": [纯文本, ...]}，没有纯文本的Pod不包含在内
+        
+        Args:
+            pods (list): queryresult中的pods
+        
+        Returns:
+            dict: 所有pod的结果
+        """
+        results = {}
+        
+        for pod in pods:
+            pod_title = pod.get('title', 'Unknown')
+            pod_id = pod.get('id', 'Unknown')
+            subpods = pod.get('subpods', [])
+            
+            pod_results = []
+            for subpod in subpods:
+                plaintext = subpod.get('plaintext', '')
+                if plaintext:
+                    pod_results.append(plaintext)
+            
+            if pod_results:
+                results[f"{pod_title} ({pod_id})"] = pod_results
+        
+        return results
 
 # 便捷函数
 def quick_query(input_text, format_type="plaintext", output_type="json"):
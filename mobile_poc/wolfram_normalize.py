@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+查询规范化
+在生成缓存键和上游请求之前统一查询文本和参数的写法，使写法不同、含义相同的查询命中同一个缓存条目：
+    - 合并连续空白、去掉首尾空白，全角字符转为半角
+    - 统一Unicode数学符号（× ÷ − ≤ ≥ ≠ 上标数字等）
+    - 数学表达式中去掉二元运算符两侧的空格（两侧都有空格、且两侧不是普通单词时）
+    - 只对已知的命令词和函数名（Solve、Sin、Log等）转为小写；其余单词和全大写的缩写保持原样，
+      避免混淆化学式、单位和缩写（Co/CO、mg/Mg、SEC）
+    - 多值参数（includepodid、format等）去重并排序
+
+可能改变含义的写法保持原样：· 在化学式中表示结晶水（CuSO4·5H2O），– 表示范围（1–5），
+逗号后的空格区分列表和千位分隔（1, 000 与 1,000），只有一侧有空格的运算符（1 -1 1、{1, -2} 中的负号）
+和连接普通单词的运算符（Windows 10 - release date）
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+# 逐字符替换的数学符号
+_SYMBOLS = {
+    "×": "*", "∗": "*",
+    "÷": "/", "∕": "/",
+    "−": "-", "‐": "-", "‑": "-",
+    "≤": "<=", "≦": "<=", "≥": ">=", "≧": ">=", "≠": "!=",
+    "　": " ", " ": " ",
+}
+# 全角ASCII (！-～) 转为半角
+_SYMBOLS.update({chr(code): chr(code - 0xFEE0) for code in range(0xFF01, 0xFF5F)})
+_TRANSLATION = str.maketrans(_SYMBOLS)
+
+_SUPERSCRIPTS = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹", "0123456789")
+_SUPERSCRIPT_RUN = re.compile("[⁰¹²³⁴⁵⁶⁷⁸⁹]+")
+
+_WHITESPACE = re.compile(r"\s+")
+# 两侧都有空格的单个二元运算符（不处理 ++、-> 等多字符运算符）；空白已合并为单个空格
+_OPERATOR_SPACING = re.compile(r"(?<![+\-*/^=<>!\s]) ([+\-*/^=]|<=|>=|!=|<|>) (?![\s+\-*/^=<>])")
+_WORD_BEFORE = re.compile(r"[A-Za-z]{2,}$")
+_WORD_AFTER = re.compile(r"[A-Za-z]{2,}")
+_PAREN_SPACING = re.compile(r"\(\s+|\s+\)")
+_WORD = re.compile(r"[A-Za-z]+")
+# 含有数字或这些符号时视为数学表达式，才调整运算符两侧的空格
+_MATH_HINT = re.compile(r"[0-9=^]")
+
+# 可以安全地忽略大小写的命令词、函数名和虚词
+CASE_FOLD_WORDS = frozenset("""
+    solve integrate integral derivative differentiate plot graph factor expand simplify
+    limit lim sum product series taylor roots zeros minimize maximize evaluate calculate
+    compute find convert what how many much is of from to for with respect approaches
+    sin cos tan cot sec csc arcsin arccos arctan sinh cosh tanh log ln exp sqrt pi
+""".split())
+
+# 顺序无关的多值参数
+MULTI_VALUE_PARAMS = ("includepodid", "excludepodid", "podtitle", "podindex", "scanner", "format")
+
+
+def normalize_input(text):
+    """返回规范化后的查询文本"""
+    text = str(text).translate(_TRANSLATION)
+    text = _SUPERSCRIPT_RUN.sub(lambda m: "^" + m.group(0).translate(_SUPERSCRIPTS), text)
+    text = _WHITESPACE.sub(" ", text).strip()
+    if _MATH_HINT.search(text):
+        text = _OPERATOR_SPACING.sub(_join_operator, text)
+        text = _PAREN_SPACING.sub(lambda m: m.group(0).strip(), text)
+    return _WORD.sub(_fold_word, text)
+
+
+def _join_operator(match):
+    # 运算符连接的是普通单词时（Windows 10 - release date、Mg + O）保持原样
+    text = match.string
+    for word in (_WORD_BEFORE.search(text, 0, match.start()), _WORD_AFTER.match(text, match.end())):
+        if word is not None and word.group(0).lower() not in CASE_FOLD_WORDS:
+            return match.group(0)
+    return match.group(1)
+
+
+def _fold_word(match):
+    word = match.group(0)
+    lower = word.lower()
+    if lower in CASE_FOLD_WORDS and (word.islower() or word.istitle()):
+        return lower
+    return word
+
+
+def normalize_value(value):
+    """多值参数：列表或逗号分隔的字符串去重排序后以逗号连接"""
+    if isinstance(value, (list, tuple, set)):
+        parts = [str(part) for part in value]
+    else:
+        parts = str(value).split(",")
+    parts = {part.strip() for part in parts if part.strip()}
+    if all(part.isdigit() for part in parts):
+        return ",".join(sorted(parts, key=int))
+    return ",".join(sorted(parts))
+
+
+class QueryNormalizer:
+    """
+    规范化查询参数，并统计把不同写法的输入合并为同一个查询的次数
+
+    每个规范化结果记录最近见过的若干种原始写法（有界），新写法出现时计为一次合并
+    """
+
+    def __init__(self, enabled=True, max_tracked=10000, max_variants=8):
+        self.enabled = enabled
+        self.max_tracked = max_tracked
+        self.max_variants = max_variants
+
+        self._variants = OrderedDict()  # 规范化后的输入 -> 见过的原始写法
+        self._lock = threading.Lock()
+
+        self.normalized = 0
+        self.rewritten = 0
+        self.merged = 0
+
+    def params(self, params):
+        """
+        返回规范化后的参数副本
+
+        Args:
+            params (dict): 包含input的查询参数
+        """
+        if not self.enabled:
+            return params
+
+        params = dict(params)
+        for name in MULTI_VALUE_PARAMS:
+            if params.get(name) is not None:
+                params[name] = normalize_value(params[name])
+
+        raw = params.get("input")
+        if raw is None:
+            return params
+        raw = str(raw)
+        params["input"] = normalized = normalize_input(raw)
+        self._track(raw, normalized)
+        return params
+
+    def _track(self, raw, normalized):
+        with self._lock:
+            self.normalized += 1
+            if raw != normalized:
+                self.rewritten += 1
+
+            variants = self._variants.get(normalized)
+            if variants is None:
+                self._variants[normalized] = variants = set()
+                if len(self._variants) > self.max_tracked:
+                    self._variants.popitem(last=False)
+            else:
+                self._variants.move_to_end(normalized)
+
+            if raw not in variants:
+                if variants:
+                    self.merged += 1
+                if len(variants) < self.max_variants:
+                    variants.add(raw)
+
+    def stats(self):
+        """返回规范化统计信息"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "normalized": self.normalized,
+                "rewritten": self.rewritten,
+                "merged": self.merged,
+                "tracked_inputs": len(self._variants),
+            }
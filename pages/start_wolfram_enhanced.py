@@ -4,16 +4,28 @@
 """
 Wolfram|Alpha Enhanced 启动脚本
 一键启动增强版API服务器和客户端
+
+用法:
+    python start_wolfram_enhanced.py [--warmup 查询日志] [--warmup-top 1000] [--warmup-rate 5]
+
+指定 --warmup 时服务器启动后先在后台预热缓存，预热达到就绪比例后再打开客户端
 """
 
+import argparse
+import json
 import os
 import sys
+import tempfile
 import time
 import webbrowser
 import threading
 import subprocess
+import urllib.error
+import urllib.request
 from pathlib import Path
 
+HEALTH_URL = "http://localhost:5000/health"
+
 def print_banner():
     """打印启动横幅"""
     banner = """
@@ -51,7 +63,7 @@ def check_dependencies():
     print("[OK] 所有依赖项已安装")
     return True
 
-def start_api_server():
+def start_api_server(env=None):
     """启动API服务器"""
     print("\n启动API服务器...")
     
@@ -62,10 +74,11 @@ def start_api_server():
         return None
     
     try:
-        # 启动API服务器进程
+        # 服务器输出写入临时文件：写入不读取的管道会在缓冲区满后阻塞服务器
+        output = tempfile.TemporaryFile()
         process = subprocess.Popen([
             sys.executable, "wolfram_enhanced_api.py"
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8', errors='ignore')
+        ], stdout=output, stderr=subprocess.STDOUT, env=env)
         
         # 等待服务器启动
         time.sleep(3)
@@ -76,16 +89,36 @@ def start_api_server():
             print("服务地址: http://localhost:5000")
             return process
         else:
-            stdout, stderr = process.communicate()
+            output.seek(0)
             print("[ERROR] API服务器启动失败")
-            print(f"标准输出: {stdout}")
-            print(f"错误信息: {stderr}")
+            print(f"服务器输出: {output.read().decode('utf-8', errors='ignore')}")
             return None
             
     except Exception as e:
         print(f"[ERROR] 启动API服务器时出错: {e}")
         return None
 
+def wait_for_warmup(process, interval=2):
+    """轮询健康检查直到缓存预热就绪（/health 返回200），显示预热进度"""
+    print("\n等待缓存预热...")
+    while process.poll() is None:
+        try:
+            with urllib.request.urlopen(HEALTH_URL, timeout=5) as response:
+                warmup = json.load(response).get("warmup") or {}
+            print(f"[OK] 缓存预热就绪: {warmup.get('warmed', 0)}/{warmup.get('total', 0)}")
+            return True
+        except urllib.error.HTTPError as e:
+            if e.code != 503:
+                print(f"[WARNING] 健康检查返回 {e.code}，跳过等待")
+                return True
+            warmup = json.load(e).get("warmup") or {}
+            print(f"  预热中: {warmup.get('warmed', 0)}/{warmup.get('total', 0)} "
+                  f"(失败 {warmup.get('failed', 0)}，已用 {warmup.get('elapsed_seconds', 0)} 秒)")
+        except (urllib.error.URLError, OSError, ValueError):
+            pass
+        time.sleep(interval)
+    return False
+
 def start_client():
     """启动客户端"""
     print("\n启动客户端...")
@@ -160,20 +193,41 @@ def show_usage_info():
     print("   - Enter: 执行查询")
     print("="*60)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="启动Wolfram|Alpha Enhanced API服务器和客户端")
+    parser.add_argument("--warmup", metavar="FILE", help="缓存预热使用的查询日志或热门查询列表")
+    parser.add_argument("--warmup-top", type=int, default=None, help="预热出现次数最多的前N个查询")
+    parser.add_argument("--warmup-rate", type=float, default=None, help="每秒最多发往上游的预热查询数")
+    return parser.parse_args()
+
 def main():
     """主函数"""
+    args = parse_args()
     print_banner()
     
     # 检查依赖项
     if not check_dependencies():
         sys.exit(1)
     
+    # 缓存预热配置通过环境变量传给服务器
+    env = dict(os.environ)
+    if args.warmup:
+        env["WOLFRAM_WARMUP_FILE"] = os.path.abspath(args.warmup)
+        if args.warmup_top is not None:
+            env["WOLFRAM_WARMUP_TOP_N"] = str(args.warmup_top)
+        if args.warmup_rate is not None:
+            env["WOLFRAM_WARMUP_RATE"] = str(args.warmup_rate)
+    
     # 启动API服务器
-    api_process = start_api_server()
+    api_process = start_api_server(env)
     if not api_process:
         print("[ERROR] 无法启动API服务器，程序退出")
         sys.exit(1)
     
+    if env.get("WOLFRAM_WARMUP_FILE") and not wait_for_warmup(api_process):
+        print("[ERROR] API服务器在缓存预热期间退出")
+        sys.exit(1)
+    
     # 启动客户端
     client_process = start_client()
     if not client_process:
@@ -0,0 +1,1293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Wolfram|Alpha Enhanced API Server 的公共部分
+配置、WolframAlphaAPI封装和路由辅助函数，Flask版本 (wolfram_enhanced_api.py) 和
+ASGI版本 (wolfram_async_api.py) 共用；导入时只读取配置，不创建API实例、连接池和缓存文件
+"""
+
+import requests
+import json
+import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import os
+import re
+import threading
+from urllib.parse import urlsplit
+
+from wolfram_cache import LRUCache, SQLiteCache, SingleFlight, TieredCache, make_cache_key
+from wolfram_cassette import Cassette
+from wolfram_breaker import CircuitBreaker
+from wolfram_limiter import AdaptiveLimiter
+from wolfram_images import ImageProxy, ImageStore
+from wolfram_local_eval import local_result
+from wolfram_normalize import QueryNormalizer
+from wolfram_podstore import PodStore, is_full_query
+from wolfram_projection import parse_fields, upstream_params
+from wolfram_signing import calc_sig, craft_signed_url, signed_url
+from wolfram_symbolic import create_engine
+from wolfram_transport import UpstreamTransport
+from wolfram_warmup import create_warmer
+
+# 结果缓存配置
+CACHE_MAX_ENTRIES = int(os.environ.get("WOLFRAM_CACHE_MAX_ENTRIES", 2048))
+CACHE_MAX_BYTES = int(os.environ.get("WOLFRAM_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CACHE_TTL = float(os.environ.get("WOLFRAM_CACHE_TTL", 3600))
+# 查询规范化：统一空白、运算符两侧空格、Unicode数学符号和多值参数的顺序，提高缓存命中率
+NORMALIZE = os.environ.get("WOLFRAM_NORMALIZE", "true").lower() == "true"
+# "2+2"、"sqrt(16)" 这类可以精确计算的纯数值输入在本地计算，不请求上游
+LOCAL_EVAL = os.environ.get("WOLFRAM_LOCAL_EVAL", "true").lower() == "true"
+# 只请求部分Pod（includepodid）的查询从缓存中同一输入的完整结果派生，不再请求上游
+DERIVE_PODS = os.environ.get("WOLFRAM_DERIVE_PODS", "true").lower() == "true"
+# 磁盘缓存(L2)配置，路径设为空字符串时禁用
+L2_CACHE_PATH = os.environ.get("WOLFRAM_L2_CACHE_PATH", "wolfram_cache.db")
+L2_CACHE_MAX_BYTES = int(os.environ.get("WOLFRAM_L2_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+L2_CACHE_TTL = float(os.environ.get("WOLFRAM_L2_CACHE_TTL", 86400))
+# 无法解析的输入（失败或无Pod）的缓存时间，0表示不缓存
+NEGATIVE_CACHE_TTL = float(os.environ.get("WOLFRAM_NEGATIVE_CACHE_TTL", 300))
+# 过期条目继续保留的时间，上游不可用时返回过期的结果
+CACHE_STALE_TTL = float(os.environ.get("WOLFRAM_CACHE_STALE_TTL", 3600))
+# 上游地址，基准测试时可指向本地的模拟服务器 (benchmarks/stub_upstream.py)
+UPSTREAM_BASE_URL = os.environ.get("WOLFRAM_UPSTREAM_BASE_URL", "https://api.wolframalpha.com").rstrip("/")
+# 上游连接池配置
+UPSTREAM_POOL_SIZE = int(os.environ.get("WOLFRAM_UPSTREAM_POOL_SIZE", 32))
+UPSTREAM_POOL_BLOCK = os.environ.get("WOLFRAM_UPSTREAM_POOL_BLOCK", "false").lower() == "true"
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get("WOLFRAM_UPSTREAM_CONNECT_TIMEOUT", 5))
+UPSTREAM_READ_TIMEOUT = float(os.environ.get("WOLFRAM_UPSTREAM_READ_TIMEOUT", 30))
+# 上游响应的录制/回放：设置路径后按WOLFRAM_CASSETTE_MODE录制(record)、回放(replay)或两者结合(hybrid)
+CASSETTE_PATH = os.environ.get("WOLFRAM_CASSETTE_PATH", "")
+CASSETTE_MODE = os.environ.get("WOLFRAM_CASSETTE_MODE", "replay")
+CASSETTE_LATENCY = os.environ.get("WOLFRAM_CASSETTE_LATENCY", "original")
+# 上游自适应并发限制 (AIMD)：超时、429/5xx或延迟突增时减小上限，超出上限的请求最多排队WOLFRAM_UPSTREAM_QUEUE_TIMEOUT秒
+ADAPTIVE_LIMIT = os.environ.get("WOLFRAM_ADAPTIVE_LIMIT", "true").lower() == "true"
+ADAPTIVE_LIMIT_INITIAL = int(os.environ.get("WOLFRAM_ADAPTIVE_LIMIT_INITIAL", UPSTREAM_POOL_SIZE))
+ADAPTIVE_LIMIT_MIN = int(os.environ.get("WOLFRAM_ADAPTIVE_LIMIT_MIN", 1))
+ADAPTIVE_LIMIT_MAX = int(os.environ.get("WOLFRAM_ADAPTIVE_LIMIT_MAX", 256))
+ADAPTIVE_LIMIT_BACKOFF = float(os.environ.get("WOLFRAM_ADAPTIVE_LIMIT_BACKOFF", 0.7))
+ADAPTIVE_LATENCY_TOLERANCE = float(os.environ.get("WOLFRAM_ADAPTIVE_LATENCY_TOLERANCE", 2.0))
+UPSTREAM_QUEUE_TIMEOUT = float(os.environ.get("WOLFRAM_UPSTREAM_QUEUE_TIMEOUT", 10))
+# 上游熔断：WOLFRAM_BREAKER_WINDOW秒内失败率达到阈值时打开，打开期间直接拒绝请求，
+# WOLFRAM_BREAKER_OPEN_SECONDS秒后放行一个探测请求
+BREAKER = os.environ.get("WOLFRAM_BREAKER", "true").lower() == "true"
+BREAKER_ERROR_RATE = float(os.environ.get("WOLFRAM_BREAKER_ERROR_RATE", 0.5))
+BREAKER_MIN_REQUESTS = int(os.environ.get("WOLFRAM_BREAKER_MIN_REQUESTS", 20))
+BREAKER_WINDOW = int(os.environ.get("WOLFRAM_BREAKER_WINDOW", 30))
+BREAKER_OPEN_SECONDS = float(os.environ.get("WOLFRAM_BREAKER_OPEN_SECONDS", 15))
+# 对冲重试配置：首次请求超过WOLFRAM_HEDGE_DELAY秒未返回时并行发出重试请求，负数表示关闭
+HEDGE_DELAY = float(os.environ.get("WOLFRAM_HEDGE_DELAY", -1))
+HEDGE_WORKERS = int(os.environ.get("WOLFRAM_HEDGE_WORKERS", 64))
+# 匹配该正则的输入立即并行发出重试请求
+HEDGE_PATTERNS = re.compile(os.environ["WOLFRAM_HEDGE_PATTERNS"]) if os.environ.get("WOLFRAM_HEDGE_PATTERNS") else None
+# 批量查询配置
+BATCH_CONCURRENCY = int(os.environ.get("WOLFRAM_BATCH_CONCURRENCY", 16))
+BATCH_MAX_ITEMS = int(os.environ.get("WOLFRAM_BATCH_MAX_ITEMS", 500))
+# 流式查询配置：并发获取异步Pod的线程数，以及等待所有异步Pod的总超时（秒）
+STREAM_WORKERS = int(os.environ.get("WOLFRAM_STREAM_WORKERS", 16))
+ASYNC_POD_TIMEOUT = float(os.environ.get("WOLFRAM_ASYNC_POD_TIMEOUT", 20))
+# 直通模式：output=json时不解析上游响应，原始字节直接拼接到响应中
+PASSTHROUGH = os.environ.get("WOLFRAM_PASSTHROUGH", "true").lower() == "true"
+# 响应压缩和JSON序列化配置
+COMPRESS = os.environ.get("WOLFRAM_COMPRESS", "true").lower() == "true"
+COMPRESS_MIN_SIZE = int(os.environ.get("WOLFRAM_COMPRESS_MIN_SIZE", 1024))
+COMPRESS_LEVEL = int(os.environ.get("WOLFRAM_COMPRESS_LEVEL", 6))
+BROTLI_LEVEL = int(os.environ.get("WOLFRAM_BROTLI_LEVEL", 4))
+JSON_BACKEND = os.environ.get("WOLFRAM_JSON_BACKEND", "auto")
+# GET查询接口的HTTP缓存配置
+HTTP_MAX_AGE = int(os.environ.get("WOLFRAM_HTTP_MAX_AGE", 300))
+HTTP_STALE_WHILE_REVALIDATE = int(os.environ.get("WOLFRAM_HTTP_STALE_WHILE_REVALIDATE", 3600))
+# 启动时的缓存预热：从查询日志或热门列表中读取前WOLFRAM_WARMUP_TOP_N个输入在后台重新查询，
+# 预热成功的比例达到WOLFRAM_WARMUP_READY_FRACTION之前 /health 返回503
+WARMUP_FILE = os.environ.get("WOLFRAM_WARMUP_FILE", "")
+WARMUP_TOP_N = int(os.environ.get("WOLFRAM_WARMUP_TOP_N", 1000))
+WARMUP_ENDPOINTS = os.environ.get("WOLFRAM_WARMUP_ENDPOINTS", "query,query.raw" if PASSTHROUGH else "query").split(",")
+WARMUP_RATE = float(os.environ.get("WOLFRAM_WARMUP_RATE", 5))
+WARMUP_CONCURRENCY = int(os.environ.get("WOLFRAM_WARMUP_CONCURRENCY", 4))
+WARMUP_READY_FRACTION = float(os.environ.get("WOLFRAM_WARMUP_READY_FRACTION", 0.9))
+WARMUP_TIMEOUT = float(os.environ.get("WOLFRAM_WARMUP_TIMEOUT", 600))
+# 符号计算降级模式：auto（已安装SymPy时启用）、true 或 false
+# 逐步解决方案的上游超过延迟预算仍未返回时开始本地计算，熔断器打开时直接使用本地结果
+SYMBOLIC = os.environ.get("WOLFRAM_SYMBOLIC", "auto")
+SYMBOLIC_BUDGET = float(os.environ.get("WOLFRAM_SYMBOLIC_BUDGET", 3))
+SYMBOLIC_WORKERS = int(os.environ.get("WOLFRAM_SYMBOLIC_WORKERS", 2))
+SYMBOLIC_TIMEOUT = float(os.environ.get("WOLFRAM_SYMBOLIC_TIMEOUT", 10))
+# Pod图片代理（默认关闭）：设置存储目录后，/api/query、/api/plot结果中的图片在后台下载并按内容保存到该目录，
+# 已保存的图片img.src改写为 /api/image/<sha256>；只下载WOLFRAM_IMAGE_PROXY_HOSTS中的域名（含子域名）上的图片
+IMAGE_PROXY_PATH = os.environ.get("WOLFRAM_IMAGE_PROXY_PATH", "")
+IMAGE_PROXY_MAX_BYTES = int(os.environ.get("WOLFRAM_IMAGE_PROXY_MAX_BYTES", 1024 * 1024 * 1024))
+IMAGE_PROXY_WORKERS = int(os.environ.get("WOLFRAM_IMAGE_PROXY_WORKERS", 16))
+IMAGE_PROXY_HOSTS = os.environ.get("WOLFRAM_IMAGE_PROXY_HOSTS", "wolframalpha.com,wolframcdn.com").split(",")
+# 改写后的图片地址前缀，默认使用请求的地址；位于反向代理或CDN之后时设为对外地址，如 https://cdn.example.com/api/image/
+IMAGE_PROXY_BASE_URL = os.environ.get("WOLFRAM_IMAGE_PROXY_BASE_URL", "")
+
+
+_NUMPODS_PATTERN = re.compile(rb'"numpods"\s*:\s*(\d+)')
+_SUCCESS_PATTERN = re.compile(rb'"success"\s*:\s*(true|false)')
+
+class RawJSON(bytes):
+    """
+    未解析的上游JSON响应体
+    
+    queryresult的success和numpods属性位于响应开头，通过扫描第一个匹配获得，不需要解析整个响应
+    """
+    
+    @property
+    def numpods(self):
+        match = _NUMPODS_PATTERN.search(self)
+        return int(match.group(1)) if match else 0
+    
+    @property
+    def success(self):
+        match = _SUCCESS_PATTERN.search(self)
+        return match is not None and match.group(1) == b'true'
+
+class WolframAlphaAPI:
+    """Wolfram|Alpha API 完整封装"""
+    
+    def __init__(self, cache=None):
+        self.headers = {"User-Agent": "Wolfram Android App"}
+        self.appid = "3H4296-5YPAGQUJK7"  # Mobile app AppId
+        self.base_url = UPSTREAM_BASE_URL
+        self.server = urlsplit(self.base_url).netloc
+        self.sig_salt = "vFdeaRwBTVqdc5CL"  # Mobile app salt
+        
+        # 所有线程共享的上游连接池，带连接/读取超时
+        self.transport = UpstreamTransport(
+            self.headers,
+            pool_size=UPSTREAM_POOL_SIZE,
+            pool_block=UPSTREAM_POOL_BLOCK,
+            connect_timeout=UPSTREAM_CONNECT_TIMEOUT,
+            read_timeout=UPSTREAM_READ_TIMEOUT,
+            cassette=Cassette(CASSETTE_PATH, CASSETTE_MODE, CASSETTE_LATENCY) if CASSETTE_PATH else None,
+            limiter=AdaptiveLimiter(
+                ADAPTIVE_LIMIT_INITIAL,
+                min_limit=ADAPTIVE_LIMIT_MIN,
+                max_limit=ADAPTIVE_LIMIT_MAX,
+                backoff=ADAPTIVE_LIMIT_BACKOFF,
+                latency_tolerance=ADAPTIVE_LATENCY_TOLERANCE
+            ) if ADAPTIVE_LIMIT else None,
+            queue_timeout=UPSTREAM_QUEUE_TIMEOUT,
+            breaker=CircuitBreaker(
+                BREAKER_ERROR_RATE,
+                min_requests=BREAKER_MIN_REQUESTS,
+                window=BREAKER_WINDOW,
+                open_seconds=BREAKER_OPEN_SECONDS
+            ) if BREAKER else None
+        )
+        
+        # 查询结果缓存，相同参数的重复查询不再请求上游
+        self.cache = cache if cache is not None else self._create_cache()
+        # 按Pod ID索引缓存中的完整结果，部分Pod的查询直接从中派生
+        self.pods = PodStore(self.cache, endpoints=("query", "query.raw"), ttl=CACHE_TTL) if DERIVE_PODS else None
+        # 写法不同、含义相同的查询规范化为同一组参数（同时用于缓存键和上游请求）
+        self.normalizer = QueryNormalizer(NORMALIZE)
+        # 合并相同参数的并发上游请求
+        self.inflight = SingleFlight()
+        # 批量查询共用的有界线程池，限制同时发往上游的请求数
+        self._batch_executor = None
+        # 流式查询获取异步Pod的线程池
+        self._stream_executor = None
+        
+        # 对冲重试：hedge_delay为None时使用顺序重试
+        self.hedge_delay = HEDGE_DELAY if HEDGE_DELAY >= 0 else None
+        self._hedge_executor = None
+        self._hedge_known = LRUCache(max_entries=4096, ttl=86400)
+        self.hedge_stats = {"started": 0, "primary_wins": 0, "hedge_wins": 0}
+        # 顺序模式下因无Pod数据发出的重试次数，以及重试后获得Pod数据的次数
+        self.retry_stats = {"zero_pods": 0, "recovered": 0}
+        # 短期缓存的失败结果数，以及上游不可用时返回过期缓存的次数
+        self.fallback_stats = {"negative_cached": 0, "stale_served": 0}
+        # 在本地计算的查询数
+        self.local_stats = {"answered": 0}
+        self._stats_lock = threading.Lock()
+    
+    def _count(self, stats, key):
+        """递增统计计数（并发请求的线程同时更新，需要加锁）"""
+        with self._stats_lock:
+            stats[key] += 1
+    
+    def _create_cache(self):
+        """创建默认的两级缓存：进程内LRU缓存 + 多worker共享的SQLite缓存"""
+        l1 = LRUCache(
+            max_entries=CACHE_MAX_ENTRIES,
+            max_bytes=CACHE_MAX_BYTES,
+            ttl=CACHE_TTL,
+            stale_ttl=CACHE_STALE_TTL
+        )
+        l2 = None
+        if L2_CACHE_PATH:
+            l2 = SQLiteCache(
+                L2_CACHE_PATH,
+                ttl=L2_CACHE_TTL,
+                max_bytes=L2_CACHE_MAX_BYTES,
+                stale_ttl=CACHE_STALE_TTL
+            )
+        return TieredCache(l1, l2)
+    
+    def _calc_sig(self, query):
+        """计算签名 - 基于官方文档的签名算法"""
+        return calc_sig(query, self.sig_salt)
+    
+    def _craft_signed_url(self, url):
+        """构建签名URL"""
+        return craft_signed_url(url, self.appid, self.sig_salt)
+    
+    def query(self, input_text, **kwargs):
+        """
+        执行Wolfram|Alpha查询 - 支持官方API的所有参数
+        
+        Args:
+            input_text (str): 查询文本
+            **kwargs: API参数，支持：
+                - format: 输出格式 (plaintext, image, html, mathml, sound, wav)
+                - output: 输出类型 (xml, json)
+                - includepodid: 包含特定pod ID
+                - excludepodid: 排除特定pod ID
+                - podtitle: 包含特定pod标题
+                - podindex: 包含特定pod索引
+                - scanner: 指定扫描器
+                - async: 异步查询
+                - podtimeout: pod超时时间
+                - scantimeout: 扫描超时时间
+                - podstate: pod状态
+                - assumption: 假设
+                - reinterpret: 重新解释
+                - translation: 翻译
+                - ignorecase: 忽略大小写
+                - sig: 签名（自动计算）
+                - ip: IP地址
+                - latlong: 经纬度
+                - location: 位置
+                - countrycode: 国家代码
+                - units: 单位系统
+                - width: 图像宽度
+                - maxwidth: 最大图像宽度
+                - plotwidth: 图表宽度
+                - mag: 放大倍数
+                - fontsize: 字体大小
+        
+        Returns:
+            dict: 查询结果
+        """
+        return self._query_params(self._build_params(input_text, kwargs))
+    
+    def _query_params(self, params, cache_key=None):
+        """使用已规范化的上游参数执行查询（params由_build_params生成）"""
+        local = self._local_result(params)
+        if local is not None:
+            return local
+        
+        if cache_key is None:
+            cache_key = make_cache_key(params)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # 同一时刻相同参数的查询只请求一次上游（包括无Pod时的重试），其余请求共享结果
+        return self.inflight.do(cache_key, lambda: self._load(cache_key, params))
+    
+    def _load(self, cache_key, params, raw=False):
+        """
+        请求上游并写入缓存
+        
+        失败或无Pod的结果按NEGATIVE_CACHE_TTL短期缓存，避免无法解析的输入每次都请求上游两次；
+        上游请求失败（包括熔断器打开）时，返回stale_ttl内的过期缓存，没有时抛出原异常；
+        缓存中有同一输入的完整结果时，只请求部分Pod的查询直接从中派生
+        """
+        derived = self._derived_result(cache_key, params, raw)
+        if derived is not None:
+            return derived
+        
+        try:
+            result, size = self._fetch(params, raw)
+        except Exception:
+            stale = self.cache.get_stale(cache_key)
+            if stale is None:
+                raise
+            self._count(self.fallback_stats, 'stale_served')
+            return stale
+        
+        self._store_result(cache_key, params, result, size)
+        return result
+    
+    def _store_result(self, cache_key, params, result, size):
+        """写入上游结果，失败或无Pod的结果按NEGATIVE_CACHE_TTL短期缓存"""
+        if self._is_cacheable(params, result):
+            self.cache.set(cache_key, result, size)
+            self._index_pods(cache_key, params, result)
+        elif NEGATIVE_CACHE_TTL > 0:
+            self.cache.set(cache_key, result, size, ttl=NEGATIVE_CACHE_TTL)
+            self._count(self.fallback_stats, 'negative_cached')
+    
+    def _derived_result(self, cache_key, params, raw=False):
+        """只请求部分Pod的查询从缓存的完整结果派生并写入缓存，不能派生时返回None"""
+        if self.pods is None:
+            return None
+        result = self.pods.derive(params)
+        if result is None:
+            return None
+        body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        if raw:
+            result = RawJSON(body)
+        self.cache.set(cache_key, result, len(body))
+        return result
+    
+    def _index_pods(self, cache_key, params, result):
+        """记录新缓存的完整结果包含的Pod ID"""
+        if self.pods is not None and is_full_query(params):
+            self.pods.add(cache_key, result)
+    
+    def is_cached(self, input_text, raw=False, **kwargs):
+        """判断query()（raw为True时为query_raw()）的结果是否已在缓存中，L2命中的结果同时回填到L1"""
+        params = self._build_params(input_text, dict(kwargs, output='json') if raw else kwargs)
+        # 在本地计算的输入不需要预热
+        if LOCAL_EVAL and local_result(params) is not None:
+            return True
+        cache_key = make_cache_key(params, endpoint="query.raw" if raw else "query")
+        return self.cache.get(cache_key) is not None
+    
+    def _local_result(self, params, raw=False):
+        """
+        纯数值输入在本地计算并返回与上游形状相同的结果（queryresult.local为True），否则返回None
+        
+        raw为True时返回序列化后的RawJSON，与query_raw()的返回值相同
+        """
+        if not LOCAL_EVAL:
+            return None
+        result = local_result(params)
+        if result is None:
+            return None
+        self._count(self.local_stats, 'answered')
+        if raw:
+            return RawJSON(json.dumps(result, ensure_ascii=False).encode('utf-8'))
+        return result
+    
+    def _build_params(self, input_text, kwargs):
+        """合并默认参数和调用方参数，生成规范化后的上游查询参数"""
+        # 默认参数 - 确保获取Pod数据
+        params = {
+            "input": input_text,
+            "format": kwargs.get('format', 'plaintext,image'),
+            "output": kwargs.get('output', 'json'),
+            "podtimeout": kwargs.get('podtimeout', 10),  # 增加Pod超时时间
+            "scantimeout": kwargs.get('scantimeout', 5),  # 增加扫描超时时间
+            "reinterpret": kwargs.get('reinterpret', 'true'),  # 启用重新解释
+        }
+        
+        # 添加其他参数
+        for key, value in kwargs.items():
+            if key not in ['format', 'output', 'podtimeout', 'scantimeout', 'reinterpret'] and value is not None:
+                params[key] = value
+        return self.normalizer.params(params)
+    
+    def _retry_params(self, params):
+        """无Pod数据时使用的重试参数：更长的超时并启用翻译"""
+        retry_params = params.copy()
+        retry_params.update({
+            'podtimeout': 15,
+            'scantimeout': 10,
+            'format': 'plaintext',
+            'reinterpret': 'true',
+            'translation': 'true'
+        })
+        return retry_params
+    
+    def _signed_url(self, params, endpoint="query"):
+        """构建上游接口的签名URL，直接基于参数字典签名并缓存重复的参数组合"""
+        return signed_url(f"{self.base_url}/v2/{endpoint}.jsp", params, self.appid, self.sig_salt)
+    
+    def _numpods(self, result):
+        """结果中的Pod数量，RawJSON通过扫描获得"""
+        if isinstance(result, RawJSON):
+            return result.numpods
+        return result.get('queryresult', {}).get('numpods', 0)
+    
+    def _needs_retry(self, result):
+        """判断结果是否没有Pod数据，需要调整参数重试"""
+        return self._numpods(result) == 0
+    
+    def _is_cacheable(self, params, result):
+        """判断结果是否按正常TTL缓存，失败或无Pod的结果只短期缓存"""
+        if params['output'] != 'json':
+            return True
+        if isinstance(result, RawJSON):
+            return result.success and result.numpods > 0
+        query_result = result.get('queryresult', {})
+        return bool(query_result.get('success')) and query_result.get('numpods', 0) > 0
+    
+    def _fetch(self, params, raw=False):
+        """
+        请求上游并解析结果
+        
+        Args:
+            params (dict): 查询参数
+            raw (bool): 为True时JSON结果不解析，返回RawJSON
+        
+        Returns:
+            tuple: (查询结果, 响应字节数)
+        """
+        try:
+            if params['output'] != 'json':
+                response = self._get(self._signed_url(params))
+                return response.text, len(response.content)
+            
+            hedge_delay = self._hedge_delay_for(params)
+            if hedge_delay is not None:
+                return self._fetch_hedged(params, hedge_delay, raw)
+            
+            result, size = self._fetch_json(params, raw)
+            
+            # 如果没有Pod数据，尝试不同的参数组合
+            if self._needs_retry(result):
+                print(f"首次查询无Pod数据，尝试调整参数...")
+                self._remember_zero_pods(params)
+                self._count(self.retry_stats, 'zero_pods')
+                
+                retry_result, retry_size = self._fetch_json(self._retry_params(params), raw)
+                if not self._needs_retry(retry_result):
+                    self._count(self.retry_stats, 'recovered')
+                    print(f"重试成功，获得 {self._numpods(retry_result)} 个Pod")
+                    return retry_result, retry_size
+                else:
+                    print(f"重试仍无Pod数据，返回原始结果")
+            
+            return result, size
+                
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"API请求失败: {e}")
+        except json.JSONDecodeError as e:
+            raise Exception(f"JSON解析失败: {e}")
+    
+    @property
+    def session(self):
+        """当前线程的requests.Session（共享连接池）"""
+        return self.transport.session
+    
+    def _get(self, url):
+        """发送上游请求"""
+        return self.transport.get(url)
+    
+    def _fetch_json(self, params, raw=False):
+        """请求上游并解析JSON，返回 (结果, 响应字节数)；raw为True时返回未解析的RawJSON"""
+        response = self._get(self._signed_url(params))
+        if raw:
+            return self._raw_json(response.content), len(response.content)
+        return response.json(), len(response.content)
+    
+    def _raw_json(self, content):
+        """包装原始响应体，扫描不到success字段时完整解析一次以校验是否为JSON"""
+        body = RawJSON(content)
+        if _SUCCESS_PATTERN.search(body) is None:
+            json.loads(body)
+        return body
+    
+    def _hedge_delay_for(self, params):
+        """
+        返回对冲重试的启动延迟（秒），不需要对冲时返回None
+        
+        已知会返回无Pod结果的查询（之前出现过，或匹配HEDGE_PATTERNS）立即并行发出重试请求
+        """
+        if self.hedge_delay is None:
+            return None
+        if self._hedge_known.get(make_cache_key(params)) is not None:
+            return 0
+        if HEDGE_PATTERNS is not None and HEDGE_PATTERNS.search(str(params['input'])):
+            return 0
+        return self.hedge_delay
+    
+    def _remember_zero_pods(self, params):
+        """记录首次查询无Pod数据的输入，下次直接对冲"""
+        self._hedge_known.set(make_cache_key(params), True, 1)
+    
+    def _fetch_hedged(self, params, delay, raw=False):
+        """
+        对冲模式：首次请求超过delay秒仍未返回时，并行发出重试参数的请求，
+        采用最先返回且有Pod数据的结果，另一个请求的结果被忽略
+        """
+        if self._hedge_executor is None:
+            self._hedge_executor = ThreadPoolExecutor(
+                max_workers=HEDGE_WORKERS,
+                thread_name_prefix="wolfram-hedge"
+            )
+        
+        primary = self._hedge_executor.submit(self._fetch_json, params, raw)
+        hedge = None
+        if delay > 0:
+            wait([primary], timeout=delay)
+        
+        pending = {primary}
+        while True:
+            if hedge is None and (not primary.done() or self._primary_needs_retry(primary)):
+                self._count(self.hedge_stats, 'started')
+                hedge = self._hedge_executor.submit(self._fetch_json, self._retry_params(params), raw)
+                pending.add(hedge)
+            
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            
+            if primary in done and primary.exception() is None and not self._needs_retry(primary.result()[0]):
+                if hedge is not None:
+                    self._count(self.hedge_stats, 'primary_wins')
+                return primary.result()
+            
+            if hedge in done and hedge.exception() is None and not self._needs_retry(hedge.result()[0]):
+                self._count(self.hedge_stats, 'hedge_wins')
+                self._remember_zero_pods(params)
+                return hedge.result()
+            
+            if not pending:
+                break
+        
+        # 两个请求都没有Pod数据（或出错）：与顺序模式一致，优先返回原始结果
+        if primary.exception() is None:
+            self._remember_zero_pods(params)
+            return primary.result()
+        raise primary.exception()
+    
+    def _primary_needs_retry(self, primary):
+        """首次请求已完成但出错或无Pod数据"""
+        return primary.exception() is not None or self._needs_retry(primary.result()[0])
+    
+    def validate_query(self, input_text):
+        """
+        验证查询 - 使用validatequery功能
+        快速检查输入是否可以被Wolfram|Alpha理解
+        """
+        params = {
+            "input": input_text,
+            "output": "json"
+        }
+        
+        try:
+            response = self._get(self._signed_url(params, "validatequery"))
+            return response.json()
+        except Exception as e:
+            raise Exception(f"查询验证失败: {e}")
+    
+    def get_simple_result(self, input_text):
+        """
+        获取简单结果 - 仅返回主要结果
+        
+        Raises:
+            QueryNotFound: 没有结果
+            Exception: 上游请求失败或返回错误
+        """
+        result = self.query(input_text, includepodid="Result")
+        return self._extract_simple_result(result)
+    
+    def _extract_simple_result(self, result):
+        """从查询结果中提取第一个Pod的纯文本，异常与get_simple_result相同"""
+        pods = check_result(result)['queryresult'].get('pods', [])
+        subpods = pods[0].get('subpods', []) if pods else []
+        text = subpods[0].get('plaintext') if subpods else None
+        if not text:
+            raise QueryNotFound("未找到结果")
+        return text
+    
+    def get_step_by_step(self, input_text):
+        """获取逐步解决方案"""
+        return self.query(
+            input_text, 
+            podstate="Solution__Step-by-step solution",
+            includepodid="Solution"
+        )
+    
+    def get_plot(self, input_text, width=400, height=300):
+        """获取图表"""
+        return self.query(
+            input_text,
+            includepodid="Plot",
+            width=width,
+            plotwidth=width
+        )
+    
+    def query_raw(self, input_text, **kwargs):
+        """
+        执行JSON查询并返回未解析的上游响应体，参数与query()相同（output固定为json）
+        
+        流程与query()相同（缓存、合并并发请求、无Pod时重试），但不解析和重新序列化响应，
+        缓存中保存的也是原始字节，使用独立的缓存键
+        
+        Returns:
+            bytes: 上游返回的JSON
+        """
+        params = self._build_params(input_text, dict(kwargs, output='json'))
+        local = self._local_result(params, raw=True)
+        if local is not None:
+            return local
+        
+        cache_key = make_cache_key(params, endpoint="query.raw")
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        return self.inflight.do(cache_key, lambda: self._load(cache_key, params, raw=True))
+    
+    def query_stream(self, input_text, **kwargs):
+        """
+        流式查询：使用async=true请求上游，先返回已完成的Pod，再并发获取异步Pod并逐个返回
+        
+        缓存命中或在本地计算时直接返回全部Pod；所有Pod获取成功后，完整结果写入与query()相同的缓存键
+        
+        Yields:
+            tuple: (事件名, 数据)，事件依次为
+                - meta: 不含pods的queryresult
+                - pod: {"index": Pod序号, "pod": Pod数据}
+                - pod_error: {"index": Pod序号, "id": Pod ID, "error": 错误信息}
+                - done: {"numpods": Pod数量, "cached": 是否来自缓存}
+        """
+        kwargs = self._stream_kwargs(kwargs)
+        params = self._build_params(input_text, kwargs)
+        cache_key = make_cache_key(params)
+        
+        result = self._local_result(params) or self.cache.get(cache_key)
+        cached = result is not None
+        store = not cached
+        if not cached:
+            try:
+                result, _ = self._fetch_json(dict(params, **{'async': 'true'}))
+            except requests.exceptions.RequestException as e:
+                # 上游不可用时返回过期缓存
+                result = self.cache.get_stale(cache_key)
+                if result is None:
+                    raise Exception(f"API请求失败: {e}")
+                self._count(self.fallback_stats, 'stale_served')
+                store = False
+            except json.JSONDecodeError as e:
+                raise Exception(f"JSON解析失败: {e}")
+            
+            # 无Pod数据时走普通查询的重试流程（由query()负责缓存）
+            if store and self._needs_retry(result):
+                result = self.query(input_text, **kwargs)
+                store = False
+        
+        query_result = result.get('queryresult', {})
+        pods = list(query_result.get('pods', []))
+        yield 'meta', {key: value for key, value in query_result.items() if key != 'pods'}
+        
+        pending = {}
+        for index, pod in enumerate(pods):
+            if pod.get('async'):
+                if self._stream_executor is None:
+                    self._stream_executor = ThreadPoolExecutor(
+                        max_workers=STREAM_WORKERS,
+                        thread_name_prefix="wolfram-stream"
+                    )
+                pending[self._stream_executor.submit(self._fetch_async_pod, pod['async'])] = index
+            else:
+                yield 'pod', {"index": index, "pod": pod}
+        
+        failed = 0
+        try:
+            for future in as_completed(pending, timeout=ASYNC_POD_TIMEOUT):
+                index = pending.pop(future)
+                try:
+                    pods[index] = future.result()
+                except Exception as e:
+                    failed += 1
+                    yield 'pod_error', {"index": index, "id": pods[index].get('id'), "error": str(e)}
+                else:
+                    yield 'pod', {"index": index, "pod": pods[index]}
+        except FutureTimeoutError:
+            for future, index in pending.items():
+                future.cancel()
+                failed += 1
+                yield 'pod_error', {"index": index, "id": pods[index].get('id'), "error": "异步Pod获取超时"}
+        
+        if store and not failed:
+            self._store_streamed(params, cache_key, result, pods)
+        
+        yield 'done', {"numpods": len(pods), "cached": cached}
+    
+    def _stream_kwargs(self, kwargs):
+        """流式查询固定使用JSON输出，async参数由query_stream自行添加"""
+        kwargs = {key: value for key, value in kwargs.items() if key != 'async'}
+        kwargs['output'] = 'json'
+        return kwargs
+    
+    def _store_streamed(self, params, cache_key, result, pods):
+        """将异步Pod全部获取后的完整结果写入缓存"""
+        full_result = dict(result, queryresult=dict(result['queryresult'], pods=pods))
+        if self._is_cacheable(params, full_result):
+            size = len(json.dumps(full_result, ensure_ascii=False).encode('utf-8'))
+            self.cache.set(cache_key, full_result, size)
+            self._index_pods(cache_key, params, full_result)
+    
+    def _fetch_async_pod(self, url):
+        """获取异步Pod"""
+        return self._parse_async_pod(self._get(url).text)
+    
+    def _parse_async_pod(self, text):
+        """解析异步Pod响应，上游按请求时的output返回JSON或XML"""
+        text = text.lstrip()
+        if text.startswith('{'):
+            data = json.loads(text)
+            return data.get('pod', data)
+        
+        root = ET.fromstring(text)
+        element = root if root.tag == 'pod' else root.find('.//pod')
+        if element is None:
+            raise Exception("异步Pod响应中没有pod元素")
+        return xml_pod_to_dict(element)
+    
+    def query_batch(self, items):
+        """
+        并发执行一批查询
+        
+        相同参数的条目只查询一次，所有批量请求共用一个大小为BATCH_CONCURRENCY的线程池，
+        总耗时接近最慢的单个查询而不是所有查询之和
+        
+        Args:
+            items (list): [(input_text, params), ...]
+        
+        Returns:
+            list: 与items顺序一致的查询结果，失败的条目为对应的异常对象
+        """
+        if self._batch_executor is None:
+            self._batch_executor = ThreadPoolExecutor(
+                max_workers=BATCH_CONCURRENCY,
+                thread_name_prefix="wolfram-batch"
+            )
+        
+        futures = {}
+        keys = []
+        for input_text, kwargs in items:
+            # 每个条目只生成一次参数和缓存键，查询时直接使用
+            params = self._build_params(input_text, kwargs)
+            key = make_cache_key(params)
+            keys.append(key)
+            if key not in futures:
+                futures[key] = self._batch_executor.submit(self._query_params, params, key)
+        
+        results = []
+        for key in keys:
+            try:
+                results.append(futures[key].result())
+            except Exception as e:
+                results.append(e)
+        return results
+    
+    def get_related_queries(self, input_text):
+        """获取相关查询建议"""
+        # 这个功能需要特殊的API端点，这里提供模拟实现
+        common_prefixes = [
+            "solve", "derivative of", "integral of", "graph", 
+            "factor", "simplify", "expand", "limit of"
+        ]
+        
+        suggestions = []
+        for prefix in common_prefixes:
+            if not input_text.lower().startswith(prefix):
+                suggestions.append(f"{prefix} {input_text}")
+        
+        return suggestions[:5]
+
+class QueryNotFound(Exception):
+    """上游正常返回但没有所需的结果"""
+
+def check_result(result):
+    """
+    检查上游的JSON查询结果，只有成功的结果可以按HTTP_MAX_AGE缓存（Flask和ASGI服务器共用）
+    
+    Returns:
+        dict: 成功的结果
+    
+    Raises:
+        QueryNotFound: Wolfram|Alpha无法理解输入（success=false且没有错误）
+        Exception: 上游返回错误（如 Invalid appid）
+    """
+    query_result = result.get('queryresult', {})
+    if query_result.get('success', False):
+        return result
+    error = query_result.get('error')
+    if error:
+        message = error.get('msg', '未知错误') if isinstance(error, dict) else '未知错误'
+        raise Exception(f"查询失败: {message}")
+    raise QueryNotFound("未找到结果")
+
+def create_symbolic_engine():
+    """按WOLFRAM_SYMBOLIC_*配置创建符号计算降级模式"""
+    return create_engine(SYMBOLIC, workers=SYMBOLIC_WORKERS, budget=SYMBOLIC_BUDGET, timeout=SYMBOLIC_TIMEOUT)
+
+def create_image_proxy(headers):
+    """
+    按WOLFRAM_IMAGE_PROXY_*配置创建图片代理，未配置路径时返回None
+    
+    Args:
+        headers (dict): 下载图片使用的请求头，与查询接口相同
+    """
+    if not IMAGE_PROXY_PATH:
+        return None
+    # 图片服务器与查询接口不同，使用单独的连接池，下载失败不计入查询的熔断器
+    transport = UpstreamTransport(
+        headers,
+        pool_size=IMAGE_PROXY_WORKERS,
+        connect_timeout=UPSTREAM_CONNECT_TIMEOUT,
+        read_timeout=UPSTREAM_READ_TIMEOUT
+    )
+    return ImageProxy(
+        ImageStore(IMAGE_PROXY_PATH, IMAGE_PROXY_MAX_BYTES),
+        transport,
+        allowed_hosts=[host.strip() for host in IMAGE_PROXY_HOSTS if host.strip()],
+        workers=IMAGE_PROXY_WORKERS
+    )
+
+def proxy_images(image_proxy, result, host_url):
+    """
+    将结果中已保存的图片地址改写为图片代理的地址，其余图片在后台下载（Flask和ASGI服务器共用）
+    
+    Args:
+        image_proxy (ImageProxy): 图片代理，为None时不改写
+        result: 查询结果，直通模式下为未解析的JSON
+        host_url (str): 请求的根地址，配置了IMAGE_PROXY_BASE_URL时不使用
+    """
+    if image_proxy is None:
+        return result
+    base_url = IMAGE_PROXY_BASE_URL or host_url.rstrip('/') + '/api/image/'
+    if isinstance(result, bytes):
+        return image_proxy.rewrite_raw(result, base_url)
+    return image_proxy.rewrite(result, base_url)
+
+def create_api_warmer(api, **kwargs):
+    """按WOLFRAM_WARMUP_*配置创建缓存预热，未配置预热文件时返回None"""
+    if not WARMUP_FILE:
+        return None
+    return create_warmer(
+        api,
+        WARMUP_FILE,
+        top_n=WARMUP_TOP_N,
+        endpoints=[name.strip() for name in WARMUP_ENDPOINTS if name.strip()],
+        rate=WARMUP_RATE,
+        concurrency=WARMUP_CONCURRENCY,
+        ready_fraction=WARMUP_READY_FRACTION,
+        timeout=WARMUP_TIMEOUT,
+        **kwargs
+    )
+
+def health_status(warmer):
+    """健康检查的状态和HTTP状态码：缓存预热未达到就绪比例时返回503"""
+    if warmer is not None and not warmer.ready:
+        return "warming", 503
+    return "healthy", 200
+
+# /api/query 接受的官方API参数
+SUPPORTED_QUERY_PARAMS = [
+    'format', 'output', 'includepodid', 'excludepodid', 'podtitle', 
+    'podindex', 'scanner', 'async', 'podtimeout', 'scantimeout', 
+    'podstate', 'assumption', 'reinterpret', 'translation', 
+    'ignorecase', 'ip', 'latlong', 'location', 'countrycode', 
+    'units', 'width', 'maxwidth', 'plotwidth', 'mag', 'fontsize'
+]
+
+def query_projection(data, api_params):
+    """
+    解析/api/query的fields（或projection）参数，并把推导出的上游参数合并到api_params中
+    
+    Returns:
+        Projection: 未指定fields时返回None
+    
+    Raises:
+        ValueError: 字段格式不正确或output不是json
+    """
+    fields = data.get('fields', data.get('projection'))
+    if not fields:
+        return None
+    if api_params.get('output', 'json') != 'json':
+        raise ValueError("fields 只支持JSON输出")
+    projection = parse_fields(fields)
+    # 调用方显式指定的format/includepodid优先
+    for key, value in upstream_params(projection).items():
+        api_params.setdefault(key, value)
+    return projection
+
+def parse_batch_items(data):
+    """
+    解析批量查询请求体（Flask和ASGI服务器共用）
+    
+    请求体格式:
+        {"items": ["2+2", {"input": "H2O", "includepodid": "Result"}, ...],
+         "params": {公共参数}}
+    
+    Returns:
+        list: [(input_text, params), ...]
+    
+    Raises:
+        ValueError: 请求体格式错误
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('items'), list) or not data['items']:
+        raise ValueError("缺少必需参数 'items'")
+    if len(data['items']) > BATCH_MAX_ITEMS:
+        raise ValueError(f"单次批量查询最多 {BATCH_MAX_ITEMS} 条")
+    
+    common = data.get('params') or {}
+    if not isinstance(common, dict):
+        raise ValueError("参数 'params' 必须是对象")
+    
+    items = []
+    for index, item in enumerate(data['items']):
+        if isinstance(item, str):
+            item = {'input': item}
+        if not isinstance(item, dict) or not item.get('input'):
+            raise ValueError(f"第 {index} 条缺少 'input'")
+        
+        merged = dict(common)
+        merged.update(item)
+        params = {param: merged[param] for param in SUPPORTED_QUERY_PARAMS if param in merged}
+        items.append((item['input'], params))
+    return items
+
+def xml_pod_to_dict(element):
+    """将XML格式的<pod>元素转换为与JSON输出相同结构的字典"""
+    pod = {key: _xml_value(value) for key, value in element.attrib.items()}
+    
+    subpods = []
+    for subpod_element in element.findall('subpod'):
+        subpod = {key: _xml_value(value) for key, value in subpod_element.attrib.items()}
+        plaintext = subpod_element.find('plaintext')
+        if plaintext is not None:
+            subpod['plaintext'] = plaintext.text or ''
+        img = subpod_element.find('img')
+        if img is not None:
+            subpod['img'] = {key: _xml_value(value) for key, value in img.attrib.items()}
+        subpods.append(subpod)
+    pod['subpods'] = subpods
+    
+    states = element.find('states')
+    if states is not None:
+        pod['states'] = [dict(state.attrib) for state in states.findall('state')]
+    return pod
+
+def _xml_value(value):
+    """XML属性值转换为JSON输出中对应的类型"""
+    if value in ('true', 'false'):
+        return value == 'true'
+    if re.fullmatch(r'-?\d+', value):
+        return int(value)
+    return value
+
+def raw_envelope(raw, **fields):
+    """将未解析的上游JSON作为data字段拼接到响应信封中（Flask和ASGI服务器共用）"""
+    head = json.dumps(fields, ensure_ascii=False).encode('utf-8')
+    return head[:-1] + b', "data": ' + raw + b'}'
+
+def format_sse(event, data):
+    """格式化一条SSE事件（Flask和ASGI服务器共用）"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# SSE响应头：禁止缓存，并关闭nginx等反向代理的缓冲
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+def batch_item_result(result):
+    """将单条批量查询结果转换为响应格式"""
+    if isinstance(result, Exception):
+        return {"success": False, "error": str(result)}
+    return {"success": True, "data": result}
+
+# 首页模板（Flask和ASGI服务器共用）
+HOME_PAGE_TEMPLATE = """
+    <!DOCTYPE html>
+    <html lang="zh-CN">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Wolfram|Alpha Enhanced API Server</title>
+        <script src="https://cdn.tailwindcss.com"></script>
+        <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css">
+    </head>
+    <body class="bg-gray-50 min-h-screen">
+        <div class="max-w-6xl mx-auto px-4 py-8">
+            <div class="bg-white rounded-lg shadow-lg p-8 mb-8">
+                <h1 class="text-3xl font-bold text-orange-600 mb-4">
+                    <i class="fas fa-calculator mr-3"></i>
+                    Wolfram|Alpha Enhanced API Server
+                </h1>
+                <p class="text-gray-600 text-lg mb-6">
+                    基于官方Wolfram|Alpha API文档实现的完整功能服务器，支持所有官方API参数和功能。
+                </p>
+                
+                <div class="grid grid-cols-1 md:grid-cols-2 gap-6">
+                    <div class="bg-blue-50 p-6 rounded-lg">
+                        <h3 class="text-xl font-semibold text-blue-800 mb-3">
+                            <i class="fas fa-rocket mr-2"></i>主要功能
+                        </h3>
+                        <ul class="space-y-2 text-blue-700">
+                            <li><i class="fas fa-check mr-2"></i>完整的Full Results API支持</li>
+                            <li><i class="fas fa-check mr-2"></i>所有官方API参数支持</li>
+                            <li><i class="fas fa-check mr-2"></i>查询验证功能</li>
+                            <li><i class="fas fa-check mr-2"></i>Step-by-step解决方案</li>
+                            <li><i class="fas fa-check mr-2"></i>图表和可视化</li>
+                            <li><i class="fas fa-check mr-2"></i>Assumptions处理</li>
+                        </ul>
+                    </div>
+                    
+                    <div class="bg-green-50 p-6 rounded-lg">
+                        <h3 class="text-xl font-semibold text-green-800 mb-3">
+                            <i class="fas fa-code mr-2"></i>API端点
+                        </h3>
+                        <ul class="space-y-2 text-green-700 text-sm">
+                            <li><code class="bg-green-100 px-2 py-1 rounded">POST /api/query</code> - 完整查询</li>
+                            <li><code class="bg-green-100 px-2 py-1 rounded">GET /api/query/stream</code> - 流式查询(SSE)</li>
+                            <li><code class="bg-green-100 px-2 py-1 rounded">GET /api/simple/{query}</code> - 简单结果</li>
+                            <li><code class="bg-green-100 px-2 py-1 rounded">POST /api/validate</code> - 查询验证</li>
+                            <li><code class="bg-green-100 px-2 py-1 rounded">POST /api/stepbystep</code> - 逐步解决</li>
+                            <li><code class="bg-green-100 px-2 py-1 rounded">POST /api/plot</code> - 图表生成</li>
+                            <li><code class="bg-green-100 px-2 py-1 rounded">POST /api/batch</code> - 批量查询</li>
+                            <li><code class="bg-green-100 px-2 py-1 rounded">GET /api/suggestions/{query}</code> - 查询建议</li>
+                        </ul>
+                    </div>
+                </div>
+            </div>
+            
+            <div class="bg-white rounded-lg shadow-lg p-8">
+                <h2 class="text-2xl font-bold text-gray-800 mb-6">
+                    <i class="fas fa-flask mr-3"></i>API测试
+                </h2>
+                
+                <div class="mb-6">
+                    <label class="block text-sm font-medium text-gray-700 mb-2">查询输入</label>
+                    <input type="text" id="testQuery" placeholder="例如: solve x^2 + 3x + 2 = 0" 
+                           class="w-full px-4 py-2 border border-gray-300 rounded-md focus:ring-2 focus:ring-orange-500 focus:border-orange-500">
+                </div>
+                
+                <div class="grid grid-cols-1 md:grid-cols-3 gap-4 mb-6">
+                    <div>
+                        <label class="block text-sm font-medium text-gray-700 mb-2">API端点</label>
+                        <select id="testEndpoint" class="w-full px-3 py-2 border border-gray-300 rounded-md focus:ring-2 focus:ring-orange-500">
+                            <option value="query">完整查询</option>
+                            <option value="simple">简单结果</option>
+                            <option value="validate">查询验证</option>
+                            <option value="stepbystep">逐步解决</option>
+                            <option value="suggestions">查询建议</option>
+                        </select>
+                    </div>
+                    
+                    <div>
+                        <label class="block text-sm font-medium text-gray-700 mb-2">输出格式</label>
+                        <select id="testFormat" class="w-full px-3 py-2 border border-gray-300 rounded-md focus:ring-2 focus:ring-orange-500">
+                            <option value="json">JSON</option>
+                            <option value="xml">XML</option>
+                        </select>
+                    </div>
+                    
+                    <div class="flex items-end">
+                        <button onclick="testAPI()" class="w-full bg-orange-600 text-white px-4 py-2 rounded-md hover:bg-orange-700 transition-colors">
+                            <i class="fas fa-play mr-2"></i>测试API
+                        </button>
+                    </div>
+                </div>
+                
+                <div id="testResult" class="hidden">
+                    <h3 class="text-lg font-semibold text-gray-800 mb-3">测试结果</h3>
+                    <pre id="testOutput" class="bg-gray-100 p-4 rounded-md overflow-auto text-sm"></pre>
+                </div>
+            </div>
+        </div>
+        
+        <script>
+            async function testAPI() {
+                const query = document.getElementById('testQuery').value;
+                const endpoint = document.getElementById('testEndpoint').value;
+                const format = document.getElementById('testFormat').value;
+                
+                if (!query.trim()) {
+                    alert('请输入查询内容');
+                    return;
+                }
+                
+                const resultDiv = document.getElementById('testResult');
+                const outputPre = document.getElementById('testOutput');
+                
+                resultDiv.classList.remove('hidden');
+                outputPre.textContent = '正在查询...';
+                
+                try {
+                    let url, options;
+                    
+                    switch(endpoint) {
+                        case 'query':
+                            url = '/api/query';
+                            options = {
+                                method: 'POST',
+                                headers: { 'Content-Type': 'application/json' },
+                                body: JSON.stringify({ input: query, output: format })
+                            };
+                            break;
+                        case 'simple':
+                            url = `/api/simple/${encodeURIComponent(query)}`;
+                            options = { method: 'GET' };
+                            break;
+                        case 'validate':
+                            url = '/api/validate';
+                            options = {
+                                method: 'POST',
+                                headers: { 'Content-Type': 'application/json' },
+                                body: JSON.stringify({ input: query })
+                            };
+                            break;
+                        case 'stepbystep':
+                            url = '/api/stepbystep';
+                            options = {
+                                method: 'POST',
+                                headers: { 'Content-Type': 'application/json' },
+                                body: JSON.stringify({ input: query })
+                            };
+                            break;
+                        case 'suggestions':
+                            url = `/api/suggestions/${encodeURIComponent(query)}`;
+                            options = { method: 'GET' };
+                            break;
+                    }
+                    
+                    const response = await fetch(url, options);
+                    const result = await response.json();
+                    
+                    outputPre.textContent = JSON.stringify(result, null, 2);
+                } catch (error) {
+                    outputPre.textContent = `错误: ${error.message}`;
+                }
+            }
+            
+            // 回车键触发测试
+            document.getElementById('testQuery').addEventListener('keypress', function(e) {
+                if (e.key === 'Enter') {
+                    testAPI();
+                }
+            });
+        </script>
+    </body>
+    </html>
+    """
+
+def build_api_docs(base_url):
+    """构建API文档（Flask和ASGI服务器共用）"""
+    docs = {
+        "service": "Wolfram|Alpha Enhanced API Server",
+        "version": "2.0.0",
+        "description": "基于官方Wolfram|Alpha API文档实现的完整功能服务器",
+        "base_url": base_url,
+        "endpoints": {
+            "/": {
+                "method": "GET",
+                "description": "首页和API测试界面"
+            },
+            "/health": {
+                "method": "GET", 
+                "description": "健康检查"
+            },
+            "/metrics": {
+                "method": "GET",
+                "description": "Prometheus格式的服务指标"
+            },
+            "/api/query": {
+                "method": "POST",
+                "description": "完整查询API，支持所有官方参数",
+                "parameters": {
+                    "input": "查询文本 (必需)",
+                    "format": "输出格式 (plaintext, image, html, mathml, sound, wav)",
+                    "output": "输出类型 (xml, json)",
+                    "includepodid": "包含特定pod ID",
+                    "excludepodid": "排除特定pod ID",
+                    "podtitle": "包含特定pod标题",
+                    "podindex": "包含特定pod索引",
+                    "scanner": "指定扫描器",
+                    "podstate": "pod状态",
+                    "assumption": "假设",
+                    "units": "单位系统",
+                    "width": "图像宽度",
+                    "location": "位置信息",
+                    "fields": "只返回指定字段，如 pods.id,pods.subpods.plaintext；pods[Result,Input] 只保留指定ID的Pod（别名 projection）"
+                }
+            },
+            "/api/query/stream": {
+                "method": "GET",
+                "description": "流式查询API (SSE)，先推送已完成的Pod，异步Pod完成后逐个推送",
+                "parameters": {
+                    "input": "查询文本 (必需)",
+                    "其他": "与/api/query相同的API参数 (output和async除外)"
+                },
+                "events": {
+                    "meta": "不含pods的queryresult",
+                    "pod": "{index, pod}",
+                    "pod_error": "{index, id, error}",
+                    "done": "{numpods, cached}",
+                    "error": "{success: false, error}"
+                }
+            },
+            "/api/simple/{query}": {
+                "method": "GET",
+                "description": "简单结果API，仅返回主要结果"
+            },
+            "/api/validate": {
+                "method": "POST",
+                "description": "查询验证API",
+                "parameters": {
+                    "input": "查询文本 (必需)"
+                }
+            },
+            "/api/stepbystep": {
+                "method": "POST",
+                "description": "逐步解决方案API",
+                "parameters": {
+                    "input": "查询文本 (必需)"
+                }
+            },
+            "/api/plot": {
+                "method": "POST",
+                "description": "图表生成API",
+                "parameters": {
+                    "input": "查询文本 (必需)",
+                    "width": "图表宽度 (可选)",
+                    "height": "图表高度 (可选)"
+                }
+            },
+            "/api/image/{name}": {
+                "method": "GET",
+                "description": "Pod图片，/api/query和/api/plot结果中的img.src改写为该地址（可以永久缓存）"
+            },
+            "/api/batch": {
+                "method": "POST",
+                "description": "批量查询API，并发查询并按输入顺序返回结果",
+                "parameters": {
+                    "items": f"查询列表 (必需，最多{BATCH_MAX_ITEMS}条)，元素为查询文本或包含input及API参数的对象",
+                    "params": "所有条目共用的API参数 (可选)"
+                }
+            },
+            "/api/suggestions/{query}": {
+                "method": "GET",
+                "description": "查询建议API"
+            }
+        },
+        "examples": {
+            "basic_query": {
+                "url": "/api/query",
+                "method": "POST",
+                "body": {
+                    "input": "2+2",
+                    "format": "plaintext",
+                    "output": "json"
+                }
+            },
+            "math_query": {
+                "url": "/api/query", 
+                "method": "POST",
+                "body": {
+                    "input": "solve x^2 + 3x + 2 = 0",
+                    "format": "plaintext,image",
+                    "output": "json",
+                    "includepodid": "Result,Solution"
+                }
+            },
+            "step_by_step": {
+                "url": "/api/stepbystep",
+                "method": "POST", 
+                "body": {
+                    "input": "derivative of x^2 + 3x + 1"
+                }
+            }
+        }
+    }
+    
+    return docs
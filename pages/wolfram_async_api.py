@@ -0,0 +1,885 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Wolfram|Alpha Enhanced API Server - ASGI版本
+基于asyncio和httpx连接池实现，单个进程即可同时保持大量上游查询
+提供与Flask版本 (wolfram_enhanced_api.py) 相同的路由
+
+运行方式:
+    uvicorn wolfram_async_api:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import time
+import traceback
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import httpx
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import FileResponse, HTMLResponse, Response, StreamingResponse
+from starlette.responses import JSONResponse as StarletteJSONResponse
+from starlette.routing import Route
+
+from wolfram_breaker import CircuitOpen
+from wolfram_cache import TieredCache, make_cache_key
+from wolfram_limiter import LimiterTimeout
+from wolfram_api_core import (
+    ASYNC_POD_TIMEOUT,
+    BATCH_CONCURRENCY,
+    CACHE_STALE_TTL,
+    LOCAL_EVAL,
+    COMPRESS,
+    COMPRESS_LEVEL,
+    COMPRESS_MIN_SIZE,
+    HOME_PAGE_TEMPLATE,
+    HTTP_MAX_AGE,
+    HTTP_STALE_WHILE_REVALIDATE,
+    JSON_BACKEND,
+    NEGATIVE_CACHE_TTL,
+    PASSTHROUGH,
+    SSE_HEADERS,
+    SUPPORTED_QUERY_PARAMS,
+    UPSTREAM_CONNECT_TIMEOUT,
+    UPSTREAM_READ_TIMEOUT,
+    QueryNotFound,
+    WolframAlphaAPI,
+    batch_item_result,
+    build_api_docs,
+    create_api_warmer,
+    create_image_proxy,
+    create_symbolic_engine,
+    format_sse,
+    health_status,
+    parse_batch_items,
+    proxy_images,
+    query_projection,
+    raw_envelope,
+)
+from wolfram_http import (
+    cache_control,
+    content_etag,
+    etag_matches,
+    orjson,
+    select_json_backend,
+    splice_json,
+    split_volatile,
+)
+from wolfram_images import IMMUTABLE_CACHE_CONTROL, image_mimetype
+from wolfram_projection import project_result
+
+# 上游连接池配置（超时配置与Flask版本共用）
+ASYNC_MAX_CONNECTIONS = int(os.environ.get("WOLFRAM_ASYNC_MAX_CONNECTIONS", 500))
+ASYNC_MAX_KEEPALIVE = int(os.environ.get("WOLFRAM_ASYNC_MAX_KEEPALIVE", 100))
+
+json_backend = select_json_backend(JSON_BACKEND)
+
+
+class JSONResponse(StarletteJSONResponse):
+    """与Flask版本使用相同的JSON后端，orjson不支持的值回退到标准库"""
+
+    def render(self, content):
+        if json_backend == "orjson":
+            try:
+                return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                pass
+        return super().render(content)
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight的asyncio版本：相同键的并发协程共享同一个Task
+
+    coro_fn()在单独的Task中执行，发起调用的协程被取消（例如客户端断开）时不影响其他等待者，
+    Task继续执行并写入缓存
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> asyncio.Task
+
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, coro_fn):
+        """执行coro_fn()，若相同key的调用正在进行则等待其结果"""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._calls[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        # shield: 某个等待者被取消时不取消共享的Task
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 所有等待者都已取消时避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        """返回合并统计信息"""
+        return {
+            "in_flight": len(self._calls),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
+
+
+class AsyncWolframAlphaAPI(WolframAlphaAPI):
+    """
+    WolframAlphaAPI的异步版本
+
+    参数构建、签名和缓存与同步版本共用，上游请求通过共享的httpx.AsyncClient连接池发送；
+    进程内L1缓存在事件循环中直接读取，SQLite L2缓存和录制文件的读写在线程池中执行
+    """
+
+    def __init__(self, cache=None, max_connections=ASYNC_MAX_CONNECTIONS,
+                 max_keepalive=ASYNC_MAX_KEEPALIVE):
+        super().__init__(cache)
+        self.inflight = AsyncSingleFlight()
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive
+        )
+        self.timeout = httpx.Timeout(UPSTREAM_READ_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT)
+        self._client = None
+        self._batch_semaphore = None
+
+    @property
+    def client(self):
+        """共享的异步HTTP客户端，首次使用时创建"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                limits=self.limits,
+                timeout=self.timeout
+            )
+        return self._client
+
+    async def aclose(self):
+        """关闭连接池"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def query(self, input_text, **kwargs):
+        """执行Wolfram|Alpha查询，参数与WolframAlphaAPI.query相同"""
+        return await self._query_params(self._build_params(input_text, kwargs))
+
+    async def _query_params(self, params, cache_key=None):
+        """使用已规范化的上游参数执行查询，与同步版本相同"""
+        local = self._local_result(params)
+        if local is not None:
+            return local
+
+        if cache_key is None:
+            cache_key = make_cache_key(params)
+        cached = await self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        return await self.inflight.do(cache_key, lambda: self._load(cache_key, params))
+
+    async def query_raw(self, input_text, **kwargs):
+        """执行JSON查询并返回未解析的上游响应体，参数与WolframAlphaAPI.query_raw相同"""
+        params = self._build_params(input_text, dict(kwargs, output='json'))
+        local = self._local_result(params, raw=True)
+        if local is not None:
+            return local
+
+        cache_key = make_cache_key(params, endpoint="query.raw")
+        cached = await self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        return await self.inflight.do(cache_key, lambda: self._load(cache_key, params, raw=True))
+
+    async def _load(self, cache_key, params, raw=False):
+        """请求上游并写入缓存，失败结果短期缓存、上游不可用时返回过期缓存，与同步版本相同"""
+        derived = await self._blocking(self._derived_result, cache_key, params, raw)
+        if derived is not None:
+            return derived
+
+        try:
+            result, size = await self._fetch(params, raw)
+        except Exception:
+            stale = await self._blocking(self.cache.get_stale, cache_key)
+            if stale is None:
+                raise
+            self._count(self.fallback_stats, 'stale_served')
+            return stale
+
+        await self._blocking(self._store_result, cache_key, params, result, size)
+        return result
+
+    async def _cache_get(self, cache_key):
+        """读取缓存：L1命中时不切换线程，未命中时在线程池中查询L2"""
+        l1 = getattr(self.cache, 'l1', None)
+        if l1 is not None:
+            cached = l1.get(cache_key)
+            if cached is not None:
+                return cached
+        return await self._blocking(self.cache.get, cache_key)
+
+    async def _blocking(self, fn, *args):
+        """调用可能读写SQLite L2缓存的同步方法，只有进程内缓存时直接调用"""
+        if isinstance(self.cache, TieredCache) and self.cache.l2 is None:
+            return fn(*args)
+        return await run_in_threadpool(fn, *args)
+
+    async def _get(self, url):
+        """发送上游请求，与同步版本共用录制/回放、熔断器、自适应并发限制和延迟观察者"""
+        transport = self.transport
+        endpoint = urlsplit(url).path.rsplit("/", 1)[-1]
+        # 只回放录制时不访问上游，不需要熔断和并发名额
+        upstream = transport.cassette is None or transport.cassette.mode != "replay"
+        breaker = transport.breaker if upstream else None
+        limiter = transport.limiter if upstream else None
+
+        if breaker is not None:
+            try:
+                probe = breaker.allow()
+            except CircuitOpen as e:
+                raise httpx.ConnectError(str(e), request=httpx.Request("GET", url)) from None
+        if limiter is not None:
+            try:
+                token = await limiter.acquire_async(transport.queue_timeout)
+            except LimiterTimeout as e:
+                if breaker is not None:
+                    breaker.record(probe, None)
+                raise httpx.ConnectError(str(e), request=httpx.Request("GET", url)) from None
+            except asyncio.CancelledError:
+                if breaker is not None:
+                    breaker.record(probe, None)
+                raise
+
+        start = time.perf_counter()
+        throttled = True
+        failed = True
+        try:
+            response = await self._send(url)
+            throttled = failed = False
+            return response
+        except httpx.HTTPStatusError as e:
+            # 4xx是请求本身的问题，不计入上游失败
+            status = e.response.status_code
+            throttled = status == 429 or status >= 500
+            raise
+        except asyncio.CancelledError:
+            # 请求被取消（如对冲请求中落后的一方），不是上游的问题，只释放名额
+            throttled = None
+            raise
+        finally:
+            if limiter is not None:
+                limiter.release(token, throttled)
+            if breaker is not None:
+                breaker.record(probe, throttled)
+            if throttled is not None:
+                elapsed = time.perf_counter() - start
+                for observer in transport.observers:
+                    observer(endpoint, elapsed, failed)
+
+    async def _send(self, url):
+        cassette = self.transport.cassette
+        if cassette is not None and cassette.replaying:
+            # 录制文件的读写在线程池中执行
+            entry = await run_in_threadpool(cassette.play, url)
+            if entry is not None:
+                delay = cassette.delay(entry)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                headers = {"Content-Type": entry.content_type} if entry.content_type else None
+                response = httpx.Response(entry.status, content=entry.content, headers=headers,
+                                          request=httpx.Request("GET", url))
+                response.raise_for_status()
+                return response
+            if not cassette.recording:
+                raise httpx.ConnectError(f"录制中没有该请求: {url}", request=httpx.Request("GET", url))
+
+        response = await self.client.get(url)
+        if cassette is not None and cassette.recording:
+            await run_in_threadpool(cassette.record, url, response.status_code, response.content,
+                                    response.headers.get("Content-Type"), response.elapsed.total_seconds())
+        response.raise_for_status()
+        return response
+
+    async def _fetch(self, params, raw=False):
+        """
+        请求上游并解析结果
+
+        Returns:
+            tuple: (查询结果, 响应字节数)
+        """
+        try:
+            if params['output'] != 'json':
+                response = await self._get(self._signed_url(params))
+                return response.text, len(response.content)
+
+            hedge_delay = self._hedge_delay_for(params)
+            if hedge_delay is not None:
+                return await self._fetch_hedged(params, hedge_delay, raw)
+
+            result, size = await self._fetch_json(params, raw)
+            if not self._needs_retry(result):
+                return result, size
+
+            # 无Pod数据时使用更长的超时重试
+            self._remember_zero_pods(params)
+            self._count(self.retry_stats, 'zero_pods')
+            retry_result, retry_size = await self._fetch_json(self._retry_params(params), raw)
+            if not self._needs_retry(retry_result):
+                self._count(self.retry_stats, 'recovered')
+                return retry_result, retry_size
+            return result, size
+
+        except httpx.HTTPError as e:
+            raise Exception(f"API请求失败: {e}")
+        except json.JSONDecodeError as e:
+            raise Exception(f"JSON解析失败: {e}")
+
+    async def _fetch_json(self, params, raw=False):
+        """请求上游并解析JSON，返回 (结果, 响应字节数)；raw为True时返回未解析的RawJSON"""
+        response = await self._get(self._signed_url(params))
+        if raw:
+            return self._raw_json(response.content), len(response.content)
+        return response.json(), len(response.content)
+
+    async def _fetch_hedged(self, params, delay, raw=False):
+        """对冲模式，逻辑与同步版本相同，未被采用的请求会被取消"""
+        primary = asyncio.ensure_future(self._fetch_json(params, raw))
+        hedge = None
+        if delay > 0:
+            await asyncio.wait({primary}, timeout=delay)
+
+        pending = {primary}
+        try:
+            while True:
+                if hedge is None and (not primary.done() or self._primary_needs_retry(primary)):
+                    self._count(self.hedge_stats, 'started')
+                    hedge = asyncio.ensure_future(self._fetch_json(self._retry_params(params), raw))
+                    pending.add(hedge)
+
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+                if primary in done and primary.exception() is None and not self._needs_retry(primary.result()[0]):
+                    if hedge is not None:
+                        self._count(self.hedge_stats, 'primary_wins')
+                    return primary.result()
+
+                if hedge in done and hedge.exception() is None and not self._needs_retry(hedge.result()[0]):
+                    self._count(self.hedge_stats, 'hedge_wins')
+                    self._remember_zero_pods(params)
+                    return hedge.result()
+
+                if not pending:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if primary.exception() is None:
+            self._remember_zero_pods(params)
+            return primary.result()
+        raise primary.exception()
+
+    async def validate_query(self, input_text):
+        """验证查询 - 使用validatequery功能"""
+        params = {
+            "input": input_text,
+            "output": "json"
+        }
+        try:
+            response = await self._get(self._signed_url(params, "validatequery"))
+            return response.json()
+        except Exception as e:
+            raise Exception(f"查询验证失败: {e}")
+
+    async def get_simple_result(self, input_text):
+        """获取简单结果 - 仅返回主要结果，异常与WolframAlphaAPI.get_simple_result相同"""
+        result = await self.query(input_text, includepodid="Result")
+        return self._extract_simple_result(result)
+
+    async def get_step_by_step(self, input_text):
+        """获取逐步解决方案"""
+        return await self.query(
+            input_text,
+            podstate="Solution__Step-by-step solution",
+            includepodid="Solution"
+        )
+
+    async def get_plot(self, input_text, width=400, height=300):
+        """获取图表"""
+        return await self.query(
+            input_text,
+            includepodid="Plot",
+            width=width,
+            plotwidth=width
+        )
+
+    async def query_stream(self, input_text, **kwargs):
+        """流式查询，事件与WolframAlphaAPI.query_stream相同，异步Pod以协程并发获取"""
+        kwargs = self._stream_kwargs(kwargs)
+        params = self._build_params(input_text, kwargs)
+        cache_key = make_cache_key(params)
+
+        result = self._local_result(params) or await self._cache_get(cache_key)
+        cached = result is not None
+        store = not cached
+        if not cached:
+            try:
+                result, _ = await self._fetch_json(dict(params, **{'async': 'true'}))
+            except httpx.HTTPError as e:
+                # 上游不可用时返回过期缓存
+                result = await self._blocking(self.cache.get_stale, cache_key)
+                if result is None:
+                    raise Exception(f"API请求失败: {e}")
+                self._count(self.fallback_stats, 'stale_served')
+                store = False
+            except json.JSONDecodeError as e:
+                raise Exception(f"JSON解析失败: {e}")
+
+            if store and self._needs_retry(result):
+                result = await self.query(input_text, **kwargs)
+                store = False
+
+        query_result = result.get('queryresult', {})
+        pods = list(query_result.get('pods', []))
+        yield 'meta', {key: value for key, value in query_result.items() if key != 'pods'}
+
+        async def fetch(index, url):
+            try:
+                return index, await self._fetch_async_pod(url), None
+            except Exception as e:
+                return index, None, e
+
+        pending = {}
+        for index, pod in enumerate(pods):
+            if pod.get('async'):
+                pending[index] = asyncio.ensure_future(fetch(index, pod['async']))
+            else:
+                yield 'pod', {"index": index, "pod": pod}
+
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(list(pending.values()), timeout=ASYNC_POD_TIMEOUT):
+                index, pod, error = await next_done
+                del pending[index]
+                if error is not None:
+                    failed += 1
+                    yield 'pod_error', {"index": index, "id": pods[index].get('id'), "error": str(error)}
+                else:
+                    pods[index] = pod
+                    yield 'pod', {"index": index, "pod": pod}
+        except asyncio.TimeoutError:
+            for index in pending:
+                failed += 1
+                yield 'pod_error', {"index": index, "id": pods[index].get('id'), "error": "异步Pod获取超时"}
+        finally:
+            # 客户端断开或超时时取消尚未完成的请求
+            for task in pending.values():
+                task.cancel()
+
+        if store and not failed:
+            await self._blocking(self._store_streamed, params, cache_key, result, pods)
+
+        yield 'done', {"numpods": len(pods), "cached": cached}
+
+    async def _fetch_async_pod(self, url):
+        """获取异步Pod"""
+        response = await self._get(url)
+        return self._parse_async_pod(response.text)
+
+    async def query_batch(self, items):
+        """
+        并发执行一批查询，语义与WolframAlphaAPI.query_batch相同
+
+        所有批量请求共用一个大小为BATCH_CONCURRENCY的信号量
+        """
+        if self._batch_semaphore is None:
+            self._batch_semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+        async def run(params, key):
+            async with self._batch_semaphore:
+                return await self._query_params(params, key)
+
+        tasks = {}
+        keys = []
+        for input_text, kwargs in items:
+            # 每个条目只生成一次参数和缓存键，查询时直接使用
+            params = self._build_params(input_text, kwargs)
+            key = make_cache_key(params)
+            keys.append(key)
+            if key not in tasks:
+                tasks[key] = asyncio.ensure_future(run(params, key))
+
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return [tasks[key].exception() or tasks[key].result() for key in keys]
+
+
+# 创建API实例（只创建ASGI服务器使用的实例，不导入Flask版本的模块）
+async_wolfram_api = AsyncWolframAlphaAPI()
+symbolic = create_symbolic_engine()
+image_proxy = create_image_proxy(async_wolfram_api.headers)
+# 缓存预热在启动时(lifespan)开始
+async_warmer = None
+
+
+async def _read_json(request):
+    """读取JSON请求体，格式错误时返回None"""
+    try:
+        return await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+
+def _missing_input():
+    return JSONResponse({
+        "success": False,
+        "error": "缺少必需参数 'input'"
+    }, status_code=400)
+
+
+def _server_error(e):
+    return JSONResponse({
+        "success": False,
+        "error": str(e),
+        "traceback": traceback.format_exc()
+    }, status_code=500)
+
+
+def _error_json(message, status, **extra):
+    """失败的响应，禁止浏览器和CDN缓存，与wolfram_http.error_json相同"""
+    return JSONResponse(dict({"success": False, "error": message}, **extra),
+                        status_code=status, headers={"Cache-Control": "no-store"})
+
+
+def _conditional_json(request, payload):
+    """带ETag和Cache-Control的JSON响应，逻辑与wolfram_http.conditional_json相同"""
+    stable, extra = split_volatile(payload)
+    body = JSONResponse(stable).body
+    etag = content_etag(body)
+    headers = {"ETag": etag, "Cache-Control": cache_control(HTTP_MAX_AGE, HTTP_STALE_WHILE_REVALIDATE)}
+
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+
+    body = splice_json(body, JSONResponse(extra).body)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+async def home(request):
+    """首页 - API文档和测试界面"""
+    return HTMLResponse(HOME_PAGE_TEMPLATE)
+
+
+async def health_check(request):
+    """健康检查，缓存预热完成之前返回503"""
+    status, code = health_status(async_warmer)
+    return JSONResponse({
+        "status": status,
+        "service": "Wolfram|Alpha Enhanced API Server",
+        "version": "2.0.0",
+        "mode": "asgi",
+        "timestamp": datetime.now().isoformat(),
+        "cache": async_wolfram_api.cache.stats(),
+        "inflight": async_wolfram_api.inflight.stats(),
+        "normalization": async_wolfram_api.normalizer.stats(),
+        "local_eval": dict(async_wolfram_api.local_stats, enabled=LOCAL_EVAL),
+        "derived_pods": async_wolfram_api.pods.stats if async_wolfram_api.pods is not None else None,
+        "hedge": dict(async_wolfram_api.hedge_stats, delay=async_wolfram_api.hedge_delay),
+        "fallback": dict(async_wolfram_api.fallback_stats, negative_ttl=NEGATIVE_CACHE_TTL, stale_ttl=CACHE_STALE_TTL),
+        "symbolic": symbolic.stats(),
+        "images": image_proxy.stats() if image_proxy is not None else None,
+        "breaker": async_wolfram_api.transport.breaker.stats() if async_wolfram_api.transport.breaker is not None else None,
+        "warmup": async_warmer.stats() if async_warmer is not None else None
+    }, status_code=code)
+
+
+async def api_query(request):
+    """完整查询API - 支持所有官方参数"""
+    data = await _read_json(request)
+    if not data or 'input' not in data:
+        return _missing_input()
+
+    try:
+        input_text = data['input']
+        api_params = {param: data[param] for param in SUPPORTED_QUERY_PARAMS if param in data}
+        try:
+            projection = query_projection(data, api_params)
+        except ValueError as e:
+            return JSONResponse({"success": False, "error": str(e)}, status_code=400)
+
+        # output=json时直通上游响应，不解析再序列化（投影需要解析后的结果）
+        if PASSTHROUGH and projection is None and api_params.get('output', 'json') == 'json':
+            raw = await _proxy_images(await async_wolfram_api.query_raw(input_text, **api_params), request)
+            return Response(raw_envelope(
+                raw,
+                success=True,
+                query=input_text,
+                params=api_params,
+                timestamp=datetime.now().isoformat()
+            ), media_type='application/json')
+
+        result = await async_wolfram_api.query(input_text, **api_params)
+        if projection is not None:
+            result = project_result(result, projection)
+        result = await _proxy_images(result, request)
+
+        return JSONResponse({
+            "success": True,
+            "data": result,
+            "query": input_text,
+            "params": api_params,
+            "timestamp": datetime.now().isoformat()
+        })
+    except Exception as e:
+        return _server_error(e)
+
+
+async def api_query_stream(request):
+    """流式查询API - 通过SSE先推送已完成的Pod，异步Pod完成后逐个推送"""
+    input_text = request.query_params.get('input')
+    if not input_text:
+        return _missing_input()
+
+    api_params = {
+        param: request.query_params[param]
+        for param in SUPPORTED_QUERY_PARAMS
+        if param in request.query_params and param not in ('output', 'async')
+    }
+
+    async def generate():
+        try:
+            async for event, data in async_wolfram_api.query_stream(input_text, **api_params):
+                yield format_sse(event, data)
+        except Exception as e:
+            yield format_sse('error', {"success": False, "error": str(e)})
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+
+async def api_simple(request):
+    """简单结果API - 仅返回主要结果"""
+    query_text = request.path_params['query_text']
+    try:
+        result = await async_wolfram_api.get_simple_result(query_text)
+        return _conditional_json(request, {
+            "success": True,
+            "query": query_text,
+            "result": result,
+            "timestamp": datetime.now().isoformat()
+        })
+    except QueryNotFound as e:
+        return _error_json(str(e), 404, query=query_text)
+    except Exception as e:
+        return _error_json(str(e), 502, query=query_text)
+
+
+async def api_validate(request):
+    """查询验证API"""
+    data = await _read_json(request)
+    if not data or 'input' not in data:
+        return _missing_input()
+
+    try:
+        input_text = data['input']
+        result = await async_wolfram_api.validate_query(input_text)
+        return JSONResponse({
+            "success": True,
+            "data": result,
+            "query": input_text,
+            "timestamp": datetime.now().isoformat()
+        })
+    except Exception as e:
+        return _server_error(e)
+
+
+async def api_step_by_step(request):
+    """逐步解决方案API"""
+    data = await _read_json(request)
+    if not data or 'input' not in data:
+        return _missing_input()
+
+    try:
+        input_text = data['input']
+        result = await symbolic.arace(
+            input_text,
+            lambda: async_wolfram_api.get_step_by_step(input_text),
+            async_wolfram_api.transport.breaker
+        )
+        return JSONResponse({
+            "success": True,
+            "data": result,
+            "query": input_text,
+            "type": "step-by-step",
+            "timestamp": datetime.now().isoformat()
+        })
+    except Exception as e:
+        return _server_error(e)
+
+
+async def api_plot(request):
+    """图表生成API"""
+    data = await _read_json(request)
+    if not data or 'input' not in data:
+        return _missing_input()
+
+    try:
+        input_text = data['input']
+        width = data.get('width', 400)
+        height = data.get('height', 300)
+        result = await _proxy_images(await async_wolfram_api.get_plot(input_text, width, height), request)
+        return JSONResponse({
+            "success": True,
+            "data": result,
+            "query": input_text,
+            "type": "plot",
+            "width": width,
+            "height": height,
+            "timestamp": datetime.now().isoformat()
+        })
+    except Exception as e:
+        return _server_error(e)
+
+
+async def api_image(request):
+    """Pod图片 - 图片代理保存的图片，地址由内容决定，可以永久缓存"""
+    name = request.path_params['name']
+    path = image_proxy.store.get(name) if image_proxy is not None else None
+    if path is None:
+        return JSONResponse({"success": False, "error": "图片不存在"}, status_code=404)
+
+    headers = {"ETag": f'"{name.split(".")[0]}"', "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if etag_matches(request.headers.get('if-none-match'), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    # 服务器支持http.response.zerocopysend扩展时，FileResponse使用sendfile发送
+    return FileResponse(path, media_type=image_mimetype(name), headers=headers)
+
+
+async def _proxy_images(result, request):
+    """改写结果中已保存的图片地址，地址映射可能读取SQLite，在线程池中执行"""
+    if image_proxy is None:
+        return result
+    return await run_in_threadpool(proxy_images, image_proxy, result, str(request.base_url))
+
+
+async def api_batch(request):
+    """批量查询API - 并发查询多条输入，按输入顺序返回结果"""
+    try:
+        items = parse_batch_items(await _read_json(request))
+    except ValueError as e:
+        return JSONResponse({
+            "success": False,
+            "error": str(e)
+        }, status_code=400)
+
+    try:
+        results = await async_wolfram_api.query_batch(items)
+        return JSONResponse({
+            "success": True,
+            "count": len(results),
+            "results": [batch_item_result(result) for result in results],
+            "timestamp": datetime.now().isoformat()
+        })
+    except Exception as e:
+        return _server_error(e)
+
+
+async def api_suggestions(request):
+    """查询建议API"""
+    query_text = request.path_params['query_text']
+    return _conditional_json(request, {
+        "success": True,
+        "query": query_text,
+        "suggestions": async_wolfram_api.get_related_queries(query_text),
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+async def api_docs(request):
+    """API文档"""
+    return JSONResponse(build_api_docs(str(request.base_url)))
+
+
+async def not_found(request, exc):
+    return JSONResponse({
+        "success": False,
+        "error": "接口不存在",
+        "available_endpoints": [
+            "/", "/health", "/api/docs", "/api/query", "/api/query/stream", "/api/simple/<query>",
+            "/api/validate", "/api/stepbystep", "/api/plot", "/api/image/<name>", "/api/batch", "/api/suggestions/<query>"
+        ]
+    }, status_code=404)
+
+
+async def internal_error(request, exc):
+    return JSONResponse({
+        "success": False,
+        "error": "服务器内部错误",
+        "message": "请检查请求参数或联系管理员"
+    }, status_code=500)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global async_warmer
+    async_warmer = create_api_warmer(async_wolfram_api, loop=asyncio.get_running_loop())
+    if async_warmer is not None:
+        async_warmer.start()
+    yield
+    await async_wolfram_api.aclose()
+
+
+routes = [
+    Route('/', home),
+    Route('/health', health_check),
+    Route('/api/query', api_query, methods=['POST']),
+    Route('/api/query/stream', api_query_stream),
+    Route('/api/simple/{query_text:path}', api_simple),
+    Route('/api/validate', api_validate, methods=['POST']),
+    Route('/api/stepbystep', api_step_by_step, methods=['POST']),
+    Route('/api/plot', api_plot, methods=['POST']),
+    Route('/api/image/{name}', api_image),
+    Route('/api/batch', api_batch, methods=['POST']),
+    Route('/api/suggestions/{query_text:path}', api_suggestions),
+    Route('/api/docs', api_docs),
+]
+
+middleware = [Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])]
+if COMPRESS:
+    # Starlette内置的压缩中间件只支持gzip，不压缩SSE响应
+    middleware.append(Middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE, compresslevel=COMPRESS_LEVEL))
+
+app = Starlette(
+    routes=routes,
+    middleware=middleware,
+    exception_handlers={404: not_found, 500: internal_error},
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("=" * 60)
+    print("Wolfram|Alpha Enhanced API Server (ASGI) 启动中...")
+    print("=" * 60)
+    print("服务地址: http://localhost:5000")
+    print("API文档: http://localhost:5000/api/docs")
+    print("健康检查: http://localhost:5000/health")
+    print("=" * 60)
+
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+上游请求的熔断器
+最近一段时间内上游的失败率超过阈值时进入打开状态，直接拒绝请求（快速失败或由调用方返回过期缓存），
+打开一段时间后进入半开状态，只放行少量探测请求，探测成功则恢复，失败则重新打开
+"""
+
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """熔断器打开，请求没有发出"""
+
+
+class CircuitBreaker:
+    """
+    按时间窗口统计失败率的熔断器
+
+    窗口按秒分桶，每个桶记录 [秒, 请求数, 失败数]，只保留最近window秒的桶；
+    请求数达到min_requests且失败率达到failure_threshold时打开
+    """
+
+    def __init__(self, failure_threshold=0.5, min_requests=20, window=30, open_seconds=15, half_open_probes=1):
+        """
+        Args:
+            failure_threshold (float): 打开熔断器的失败率 (0-1)
+            min_requests (int): 窗口内请求数少于该值时不打开
+            window (int): 统计失败率的时间窗口（秒）
+            open_seconds (float): 打开后多久进入半开状态（秒）
+            half_open_probes (int): 半开状态下同时放行的探测请求数
+        """
+        self.failure_threshold = failure_threshold
+        self.min_requests = min_requests
+        self.window = int(window)
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self._lock = threading.Lock()
+        self._buckets = []
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+
+        self.opened = 0
+        self.short_circuited = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now):
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def allow(self):
+        """
+        判断是否可以发出请求
+
+        Returns:
+            bool: 是否为半开状态下的探测请求，请求结束后传给record
+
+        Raises:
+            CircuitOpen: 熔断器打开，或半开状态下探测名额已满
+        """
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == CLOSED:
+                return False
+            if state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self.short_circuited += 1
+            retry_in = max(0.0, self.open_seconds - (now - self._opened_at))
+            raise CircuitOpen(f"上游暂时不可用，{retry_in:.0f} 秒后重试")
+
+    def record(self, probe, failed):
+        """
+        记录请求结果
+
+        Args:
+            probe (bool): allow返回的探测标记
+            failed: 上游是否失败（超时、连接失败、429/5xx），None表示请求没有发出
+        """
+        with self._lock:
+            now = time.monotonic()
+            if probe:
+                self._probes -= 1
+                if self._state != HALF_OPEN or failed is None:
+                    return
+                if failed:
+                    self._open(now)
+                else:
+                    self._state = CLOSED
+                    self._buckets = []
+                return
+
+            if failed is None:
+                return
+            second = int(now)
+            if self._buckets and self._buckets[-1][0] == second:
+                bucket = self._buckets[-1]
+            else:
+                bucket = [second, 0, 0]
+                self._buckets.append(bucket)
+                while self._buckets[0][0] <= second - self.window:
+                    self._buckets.pop(0)
+            bucket[1] += 1
+            if failed:
+                bucket[2] += 1
+
+            if self._state == CLOSED:
+                total, failures = self._totals()
+                if total >= self.min_requests and failures >= total * self.failure_threshold:
+                    self._open(now)
+
+    def _totals(self):
+        total = sum(bucket[1] for bucket in self._buckets)
+        failures = sum(bucket[2] for bucket in self._buckets)
+        return total, failures
+
+    def _open(self, now):
+        self._state = OPEN
+        self._opened_at = now
+        self._buckets = []
+        self.opened += 1
+
+    def stats(self):
+        """返回熔断器统计信息"""
+        with self._lock:
+            now = time.monotonic()
+            second = int(now)
+            self._buckets = [bucket for bucket in self._buckets if bucket[0] > second - self.window]
+            total, failures = self._totals()
+            return {
+                "state": self._current_state(now),
+                "failure_threshold": self.failure_threshold,
+                "window_seconds": self.window,
+                "window_requests": total,
+                "window_failures": failures,
+                "error_rate": round(failures / total, 4) if total else 0.0,
+                "opened": self.opened,
+                "short_circuited": self.short_circuited,
+            }
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Flask服务器的HTTP响应辅助
+按Accept-Encoding协商gzip/brotli压缩响应体，可选使用orjson序列化jsonify的响应，
+并为可缓存的GET接口生成ETag和Cache-Control
+"""
+
+import gzip
+import hashlib
+import threading
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:  # Flask < 2.2 没有可替换的JSON provider
+    DefaultJSONProvider = None
+
+# 值得压缩的响应类型
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+}
+
+
+class ResponseCompressor:
+    """
+    按客户端的Accept-Encoding压缩响应，优先brotli（需安装brotli包），其次gzip
+
+    小于min_size的响应、流式响应(SSE)、send_file响应和已经编码过的响应保持原样
+    """
+
+    def __init__(self, min_size=1024, level=6, brotli_level=4):
+        """
+        Args:
+            min_size (int): 压缩的最小响应字节数
+            level (int): gzip压缩级别 (1-9)
+            brotli_level (int): brotli压缩级别 (0-11)
+        """
+        self.min_size = min_size
+        self.level = level
+        self.brotli_level = brotli_level
+        self.encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def init_app(self, app):
+        """注册到Flask应用"""
+        app.after_request(self.after_request)
+        return self
+
+    def after_request(self, response):
+        response.vary.add("Accept-Encoding")
+        if not self._should_compress(response):
+            return response
+
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        compressed = self.compress(data, encoding)
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+
+        with self._lock:
+            self.responses += 1
+            self.bytes_in += len(data)
+            self.bytes_out += len(compressed)
+        return response
+
+    def _should_compress(self, response):
+        if response.direct_passthrough or response.is_streamed:
+            return False
+        if response.status_code < 200 or response.status_code in (204, 304):
+            return False
+        if "Content-Encoding" in response.headers:
+            return False
+        mimetype = response.mimetype or ""
+        if not (mimetype.startswith("text/") or mimetype in COMPRESSIBLE_MIMETYPES):
+            return False
+        return (response.content_length or 0) >= self.min_size
+
+    def compress(self, data, encoding):
+        """使用指定编码压缩数据"""
+        if encoding == "br":
+            return brotli.compress(data, quality=self.brotli_level)
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def stats(self):
+        """返回压缩统计信息"""
+        with self._lock:
+            return {
+                "encodings": list(self.encodings),
+                "min_size": self.min_size,
+                "responses": self.responses,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else 0.0,
+            }
+
+
+if DefaultJSONProvider is not None:
+
+    class OrjsonProvider(DefaultJSONProvider):
+        """
+        使用orjson序列化的JSON provider，输出UTF-8且不排序键
+
+        调试模式（缩进输出）和orjson不支持的值（如超过64位的整数）回退到标准库实现
+        """
+
+        def dumps(self, obj, **kwargs):
+            if kwargs:
+                return super().dumps(obj, **kwargs)
+            try:
+                return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+            except TypeError:
+                return super().dumps(obj)
+
+        def loads(self, s, **kwargs):
+            if kwargs:
+                return super().loads(s, **kwargs)
+            return orjson.loads(s)
+
+        def response(self, *args, **kwargs):
+            if (self.compact is None and self._app.debug) or self.compact is False:
+                return super().response(*args, **kwargs)
+
+            obj = self._prepare_response_obj(args, kwargs)
+            try:
+                body = orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+            except TypeError:
+                return super().response(*args, **kwargs)
+            return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def select_json_backend(backend="auto"):
+    """
+    按配置和orjson是否安装选择JSON序列化后端（不依赖Flask应用，ASGI服务器同样使用）
+
+    Args:
+        backend (str): auto（已安装orjson时使用）、orjson 或 stdlib
+
+    Returns:
+        str: orjson 或 stdlib
+    """
+    if backend == "stdlib":
+        return "stdlib"
+    if orjson is None:
+        if backend == "orjson":
+            raise ImportError("WOLFRAM_JSON_BACKEND=orjson 需要安装orjson")
+        return "stdlib"
+    return "orjson"
+
+
+def init_json(app, backend="auto"):
+    """
+    设置Flask应用的JSON序列化后端
+
+    Args:
+        app: Flask应用
+        backend (str): auto（已安装orjson时使用）、orjson 或 stdlib
+
+    Returns:
+        str: 实际使用的后端
+    """
+    if DefaultJSONProvider is None or select_json_backend(backend) == "stdlib":
+        return "stdlib"
+
+    app.json_provider_class = OrjsonProvider
+    app.json = OrjsonProvider(app)
+    return "orjson"
+
+
+def error_json(message, status, **extra):
+    """失败的响应，禁止浏览器和CDN缓存"""
+    response = current_app.json.response(dict({"success": False, "error": message}, **extra))
+    response.status_code = status
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+def cache_control(max_age, stale_while_revalidate=0):
+    """生成可被CDN和浏览器缓存的Cache-Control头"""
+    value = f"public, max-age={max_age}"
+    if stale_while_revalidate > 0:
+        value += f", stale-while-revalidate={stale_while_revalidate}"
+    return value
+
+
+def content_etag(data):
+    """根据内容生成弱ETag（响应体中的时间戳等字段不参与计算，因此是弱校验）"""
+    return 'W/"%s"' % hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match是否匹配etag（弱比较）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == opaque:
+            return True
+    return False
+
+
+def split_volatile(payload, volatile=("timestamp",)):
+    """拆分出不参与ETag计算的字段，返回 (稳定部分, 易变部分)"""
+    stable = {key: value for key, value in payload.items() if key not in volatile}
+    extra = {key: payload[key] for key in volatile if key in payload}
+    return stable, extra
+
+
+def splice_json(stable_body, extra_body):
+    """将两个序列化后的JSON对象合并为一个（只拼接字符串，不重新序列化）"""
+    if extra_body in ("{}", b"{}"):
+        return stable_body
+    if stable_body in ("{}", b"{}"):
+        return extra_body
+    separator = b"," if isinstance(stable_body, bytes) else ","
+    return stable_body.rstrip()[:-1] + separator + extra_body.lstrip()[1:]
+
+
+def conditional_json(payload, max_age=300, stale_while_revalidate=3600, volatile=("timestamp",)):
+    """
+    返回带ETag和Cache-Control的JSON响应，请求的If-None-Match匹配时返回不带响应体的304
+
+    只用于成功的结果：上游失败或无结果时使用error_json，避免CDN和浏览器缓存失败的响应
+
+    响应体只序列化一次：先序列化不含volatile字段的部分并计算ETag，再拼接上volatile字段
+
+    Args:
+        payload (dict): 响应数据
+        max_age (int): 缓存有效期（秒）
+        stale_while_revalidate (int): 过期后仍可直接使用并在后台重新验证的时间（秒）
+        volatile (tuple): 每次请求都会变化、不参与ETag计算的字段
+
+    Returns:
+        flask.Response
+    """
+    stable, extra = split_volatile(payload, volatile)
+    body = current_app.json.dumps(stable)
+    etag = content_etag(body.encode("utf-8"))
+    headers = {"ETag": etag, "Cache-Control": cache_control(max_age, stale_while_revalidate)}
+
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return current_app.response_class(status=304, headers=headers)
+
+    body = splice_json(body, current_app.json.dumps(extra))
+    return current_app.response_class(body + "\n", mimetype=current_app.json.mimetype, headers=headers)
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Pod图片代理
+查询结果中 img.src 指向Wolfram的图片服务器，这些地址一段时间后失效，缓存中的结果会出现破图。
+结果中的图片在后台并发下载，按内容的SHA-256保存到磁盘；已保存的图片在返回结果时把 img.src 改写为
+本服务的 /api/image/<sha256>.<扩展名>，地址由内容决定，可以被浏览器和CDN永久缓存
+
+磁盘存储超过max_bytes时删除最久未访问的图片；上游地址 -> 文件名的映射保存在同目录的SQLite中，
+多个worker共享，上游地址失效后已下载的图片依然可用
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from wolfram_cache import LRUCache, SQLiteCache, TieredCache
+
+# 图片的Content-Type -> 文件扩展名
+IMAGE_TYPES = {
+    "image/gif": "gif",
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/webp": "webp",
+    "image/svg+xml": "svg",
+}
+MIMETYPES = {extension: mimetype for mimetype, extension in IMAGE_TYPES.items()}
+# 只下载这些域名（及其子域名）上的图片
+DEFAULT_ALLOWED_HOSTS = ("wolframalpha.com", "wolframcdn.com")
+# 地址由内容决定，内容不会变化
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_NAME = re.compile(r"^[0-9a-f]{64}\.(%s)$" % "|".join(MIMETYPES))
+# 未解析的JSON中的 "src": "http..."（值可能含有 \/ 等转义）
+_RAW_SRC = re.compile(rb'("src"\s*:\s*")(https?:(?:[^"\\]|\\.)*)(")')
+
+
+class ImageStore:
+    """
+    按内容寻址的磁盘图片存储
+
+    文件保存为 <directory>/<sha256前两位>/<sha256>.<扩展名>；进程内按访问顺序记录所有文件，
+    总字节数超过max_bytes时删除最久未访问的文件。多个worker各自统计，启动时按修改时间重建
+    """
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._files = OrderedDict()  # name -> 字节数，按访问顺序
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.writes = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """扫描已有文件，按修改时间恢复访问顺序"""
+        entries = []
+        for prefix in os.listdir(self.directory):
+            folder = os.path.join(self.directory, prefix)
+            if len(prefix) != 2 or not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if _NAME.match(name):
+                    stat = os.stat(os.path.join(folder, name))
+                    entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self.bytes += size
+        self._evict()
+
+    def path(self, name):
+        return os.path.join(self.directory, name[:2], name)
+
+    def put(self, content, content_type):
+        """
+        保存图片
+
+        Returns:
+            str: 文件名，Content-Type不是支持的图片格式时返回None
+        """
+        extension = IMAGE_TYPES.get((content_type or "").split(";")[0].strip().lower())
+        if extension is None:
+            return None
+        name = f"{hashlib.sha256(content).hexdigest()}.{extension}"
+        path = self.path(name)
+
+        with self._lock:
+            if name in self._files and os.path.exists(path):
+                self._files.move_to_end(name)
+                return name
+
+        # 先写入临时文件再重命名，读取方不会看到写了一半的文件
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as temp:
+                temp.write(content)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        with self._lock:
+            self.bytes += len(content) - self._files.pop(name, 0)
+            self._files[name] = len(content)
+            self.writes += 1
+            self._evict(keep=name)
+        return name
+
+    def get(self, name):
+        """返回图片文件的路径，不存在时返回None"""
+        if not _NAME.match(name):
+            return None
+        path = self.path(name)
+        if not os.path.exists(path):
+            with self._lock:
+                self.bytes -= self._files.pop(name, 0)
+            return None
+        with self._lock:
+            if name in self._files:
+                self._files.move_to_end(name)
+            else:
+                # 其他worker下载的图片
+                size = os.path.getsize(path)
+                self._files[name] = size
+                self.bytes += size
+                self._evict(keep=name)
+        return path
+
+    def _evict(self, keep=None):
+        while self.bytes > self.max_bytes and self._files:
+            name, size = next(iter(self._files.items()))
+            if name == keep:
+                break
+            del self._files[name]
+            self.bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "path": self.directory,
+                "entries": len(self._files),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
+
+
+class ImageProxy:
+    """
+    改写查询结果中的图片地址
+
+    只改写已经保存的图片，其余图片在后台下载，不阻塞请求，下载完成后的响应才使用代理地址
+
+    Args:
+        store (ImageStore): 图片存储
+        transport (UpstreamTransport): 下载图片使用的传输（与查询的上游连接池、熔断器分开）
+        allowed_hosts (tuple): 允许下载的图片域名（包括其子域名）
+        workers (int): 后台下载的线程数
+        url_ttl (float): 上游地址 -> 文件名映射的保存时间（秒）
+        failure_ttl (float): 下载失败的地址在这段时间内不再重试（秒），只记录在进程内
+    """
+
+    def __init__(self, store, transport, allowed_hosts=DEFAULT_ALLOWED_HOSTS, workers=16,
+                 url_ttl=30 * 86400, failure_ttl=300):
+        self.store = store
+        self.transport = transport
+        self.allowed_hosts = tuple(host.lower().lstrip(".") for host in allowed_hosts)
+        self.workers = workers
+        self.failure_ttl = failure_ttl
+        self.urls = TieredCache(
+            LRUCache(max_entries=65536, max_bytes=32 * 1024 * 1024, ttl=url_ttl),
+            SQLiteCache(os.path.join(store.directory, "urls.db"), ttl=url_ttl, max_bytes=64 * 1024 * 1024)
+        )
+        self._failures = LRUCache(max_entries=16384, ttl=failure_ttl)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = None
+        self.fetched = 0
+        self.fetch_errors = 0
+        self.rewritten = 0
+
+    def rewrite(self, result, base_url):
+        """
+        返回 img.src 改写为 base_url + 文件名 的结果副本，原结果（可能来自缓存）不修改
+
+        Args:
+            result (dict): 查询结果
+            base_url (str): 图片接口的地址前缀，如 "http://host/api/image/"
+        """
+        urls = set()
+        _collect(result, urls)
+        names = self.resolve(urls)
+        if not names:
+            return result
+        return _replace(result, {url: base_url + name for url, name in names.items()})
+
+    def rewrite_raw(self, body, base_url):
+        """改写未解析的JSON中的图片地址，返回bytes"""
+        urls = {_unescape(match.group(2)) for match in _RAW_SRC.finditer(body)}
+        names = self.resolve(urls)
+        if not names:
+            return body
+
+        def replace(match):
+            name = names.get(_unescape(match.group(2)))
+            if name is None:
+                return match.group(0)
+            return match.group(1) + (base_url + name).encode("utf-8") + match.group(3)
+
+        return _RAW_SRC.sub(replace, body)
+
+    def resolve(self, urls):
+        """
+        返回已保存图片的 {上游地址: 文件名}，其余允许的地址提交到后台下载
+        """
+        names = {}
+        for url in urls:
+            if not self.allowed(url):
+                continue
+            name = self.urls.get(url)
+            if name is not None and os.path.exists(self.store.path(name)):
+                names[url] = name
+            elif self._failures.get(url) is None:
+                self._schedule(url)
+        if names:
+            self._count("rewritten", len(names))
+        return names
+
+    def allowed(self, url):
+        """只下载Wolfram图片服务器上的图片"""
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        return parts.scheme in ("http", "https") and any(
+            host == allowed or host.endswith("." + allowed) for allowed in self.allowed_hosts
+        )
+
+    def _schedule(self, url):
+        with self._lock:
+            if url in self._pending:
+                return
+            self._pending.add(url)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="wolfram-image")
+        self._executor.submit(self._fetch, url)
+
+    def _fetch(self, url):
+        """下载并保存图片；失败时在进程内短期记录，failure_ttl内不再重试"""
+        try:
+            try:
+                response = self.transport.get(url)
+                name = self.store.put(response.content, response.headers.get("Content-Type"))
+            except Exception:
+                name = None
+            if name is None:
+                self._count("fetch_errors")
+                self._failures.set(url, True, 1)
+                return
+            self.urls.set(url, name, len(url) + len(name))
+            self._count("fetched")
+        finally:
+            with self._lock:
+                self._pending.discard(url)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def stats(self):
+        with self._lock:
+            counts = {
+                "fetched": self.fetched,
+                "fetch_errors": self.fetch_errors,
+                "rewritten": self.rewritten,
+                "pending": len(self._pending),
+            }
+        return dict(counts, store=self.store.stats(), allowed_hosts=list(self.allowed_hosts))
+
+
+def image_mimetype(name):
+    """图片文件名对应的Content-Type"""
+    return MIMETYPES.get(name.rsplit(".", 1)[-1], "application/octet-stream")
+
+
+def _collect(value, urls):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == "src" and isinstance(item, str) and item.startswith(("http://", "https://")):
+                urls.add(item)
+            else:
+                _collect(item, urls)
+    elif isinstance(value, list):
+        for item in value:
+            _collect(item, urls)
+
+
+def _replace(value, mapping):
+    if isinstance(value, dict):
+        return {
+            key: mapping.get(item, item) if key == "src" and isinstance(item, str) else _replace(item, mapping)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_replace(item, mapping) for item in value]
+    return value
+
+
+def _unescape(raw_url):
+    return json.loads(b'"' + raw_url + b'"')
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+从缓存的完整结果派生只含部分Pod的结果
+/api/simple (includepodid=Result)、get_result_text 等只请求部分Pod的查询，与同一输入的完整查询
+（参数相同、只是没有includepodid）相比只是少了一些Pod。缓存中已有完整结果且包含所有请求的Pod时，
+直接从完整结果中取出这些Pod，不再请求上游
+
+每个完整结果包含哪些Pod ID记录在进程内的索引中，不包含所需Pod的完整结果不需要再次读取和解析
+"""
+
+import json
+import threading
+
+from wolfram_cache import LRUCache, make_cache_key
+
+# 只影响返回哪些Pod的参数，去掉后即为完整查询的参数
+SUBSET_PARAMS = ("includepodid",)
+
+
+class PodStore:
+    """
+    按Pod ID索引缓存中的完整queryresult
+
+    Args:
+        cache: 查询结果缓存（与查询共用）
+        endpoints (tuple): 依次查找的完整结果缓存键前缀，"query.raw" 中保存的是未解析的JSON
+        max_entries (int): 索引最多记录的完整结果数
+        ttl (float): 索引条目的有效期（秒），与结果缓存的TTL一致
+    """
+
+    def __init__(self, cache, endpoints=("query",), max_entries=4096, ttl=3600):
+        self.cache = cache
+        self.endpoints = endpoints
+        self.index = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.stats = {"derived": 0, "missing_pods": 0}
+        self._lock = threading.Lock()
+
+    def derive(self, params):
+        """
+        从缓存的完整结果派生params请求的结果
+
+        Args:
+            params (dict): 规范化后的上游查询参数
+
+        Returns:
+            dict: 与带includepodid的上游响应形状相同的结果，完整结果不在缓存中或缺少所需Pod时返回None
+        """
+        pod_ids = _pod_ids(params.get("includepodid"))
+        if not pod_ids or params.get("output") != "json":
+            return None
+
+        full_params = {key: value for key, value in params.items() if key not in SUBSET_PARAMS}
+        missing = False
+        for endpoint in self.endpoints:
+            key = make_cache_key(full_params, endpoint=endpoint)
+            known = self.index.get(key)
+            if known is not None and not pod_ids <= known:
+                missing = True
+                continue
+
+            document = self.cache.get(key)
+            if document is None:
+                continue
+            if isinstance(document, (bytes, str)):
+                try:
+                    document = json.loads(document)
+                except ValueError:
+                    continue
+
+            available = self.add(key, document)
+            if available is None:
+                continue
+            if not pod_ids <= available:
+                missing = True
+                continue
+
+            self._count("derived")
+            return subset(document, pod_ids)
+
+        if missing:
+            # 完整结果中没有所需的Pod（例如超时或上游只在单独请求时计算），交给上游
+            self._count("missing_pods")
+        return None
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def add(self, key, result):
+        """
+        记录完整结果包含的Pod ID，结果失败或没有Pod时不记录
+
+        Returns:
+            frozenset: 结果中的Pod ID，未记录时返回None
+        """
+        if not isinstance(result, dict):
+            # 未解析的结果在派生时才解析，丢弃可能过时的索引
+            self.index.delete(key)
+            return None
+        query_result = result.get("queryresult", {})
+        pods = query_result.get("pods") or []
+        if not query_result.get("success") or not pods:
+            self.index.delete(key)
+            return None
+
+        pod_ids = frozenset(pod.get("id") for pod in pods if pod.get("id"))
+        self.index.set(key, pod_ids, 64 + sum(len(pod_id) for pod_id in pod_ids))
+        return pod_ids
+
+
+def is_full_query(params):
+    """查询是否返回全部Pod（其结果可以用于派生）"""
+    return not any(params.get(name) for name in SUBSET_PARAMS)
+
+
+def subset(result, pod_ids):
+    """保留指定ID的Pod（保持原有顺序），numpods随之更新"""
+    query_result = result["queryresult"]
+    pods = [pod for pod in query_result.get("pods", []) if pod.get("id") in pod_ids]
+    return {"queryresult": dict(query_result, pods=pods, numpods=len(pods))}
+
+
+def _pod_ids(value):
+    if not value:
+        return frozenset()
+    if isinstance(value, (list, tuple)):
+        value = ",".join(str(item) for item in value)
+    return frozenset(pod_id.strip() for pod_id in str(value).split(",") if pod_id.strip())
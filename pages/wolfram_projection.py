@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+查询结果的字段投影
+/api/query 的 fields 参数只返回客户端需要的字段，例如 "pods.id,pods.subpods.plaintext"，
+路径相对于queryresult，列表按元素逐个投影；"pods[Result,Input]" 只保留指定ID的Pod。
+
+同时从投影推导最小的上游参数：只需要plaintext时请求 format=plaintext（上游不再生成图片），
+所有Pod路径都指定了ID时请求 includepodid，上游只计算这些Pod
+"""
+
+import re
+
+# 子Pod字段 -> 上游format
+SUBPOD_FORMATS = {
+    "plaintext": "plaintext",
+    "img": "image",
+    "imagemap": "imagemap",
+    "mathml": "mathml",
+    "minput": "minput",
+    "moutput": "moutput",
+    "sound": "sound",
+    "cell": "cell",
+}
+# 无论是否投影都保留的字段，客户端据此判断查询是否成功
+ALWAYS_INCLUDED = ("success", "error")
+
+MAX_FIELDS = 50
+_SEGMENT = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*)(?:\[([^\[\]]*)\])?$")
+
+
+class Projection:
+    """字段投影树的节点：leaf为True时返回整个值，否则只保留children中的子字段；ids为Pod ID过滤，None表示不过滤"""
+
+    def __init__(self):
+        self.children = {}
+        self.leaf = False
+        self.ids = None
+        self.unfiltered = False
+
+    def child(self, name, ids):
+        node = self.children.get(name)
+        if node is None:
+            node = self.children[name] = Projection()
+        if ids is None:
+            # 同一字段既有不带过滤的路径时，不过滤
+            node.unfiltered = True
+            node.ids = None
+        elif not node.unfiltered:
+            node.ids = (node.ids or set()) | ids
+        return node
+
+
+def parse_fields(fields):
+    """
+    解析字段列表
+
+    Args:
+        fields (str | list): 逗号分隔的路径或路径列表，可以带 "queryresult." 前缀
+
+    Returns:
+        Projection: 投影树的根节点（对应queryresult）
+
+    Raises:
+        ValueError: 字段格式不正确
+    """
+    paths = _split(fields) if isinstance(fields, str) else [str(path).strip() for path in fields]
+    paths = [path for path in paths if path]
+    if not paths:
+        raise ValueError("fields 不能为空")
+    if len(paths) > MAX_FIELDS:
+        raise ValueError(f"fields 最多 {MAX_FIELDS} 个路径")
+
+    root = Projection()
+    for path in paths:
+        segments = path.split(".")
+        if segments[0] == "queryresult" and len(segments) > 1:
+            segments = segments[1:]
+        node = root
+        for segment in segments:
+            match = _SEGMENT.match(segment.strip())
+            if match is None:
+                raise ValueError(f"无效的字段路径: {path}")
+            name, ids = match.groups()
+            if ids is not None:
+                ids = {pod_id.strip() for pod_id in ids.split(",") if pod_id.strip()}
+                if not ids:
+                    raise ValueError(f"无效的字段路径: {path}")
+            node = node.child(name, ids)
+        node.leaf = True
+    return root
+
+
+def _split(fields):
+    """按逗号拆分路径，忽略方括号中的逗号"""
+    paths, depth, current = [], 0, []
+    for char in fields:
+        if char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+        if char == "," and depth == 0:
+            paths.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    paths.append("".join(current).strip())
+    return paths
+
+
+def project(value, node):
+    """按投影树裁剪值，列表按元素逐个投影"""
+    if node.leaf:
+        return value
+    if isinstance(value, list):
+        return [project(item, node) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    projected = {}
+    for name, child in node.children.items():
+        if name not in value:
+            continue
+        item = value[name]
+        if child.ids is not None and isinstance(item, list):
+            item = [element for element in item if isinstance(element, dict) and element.get("id") in child.ids]
+        projected[name] = project(item, child)
+    return projected
+
+
+def project_result(result, projection):
+    """投影上游的JSON查询结果，始终保留queryresult的success和error"""
+    query_result = result.get("queryresult", {})
+    projected = project(query_result, projection)
+    for name in ALWAYS_INCLUDED:
+        if name in query_result:
+            projected.setdefault(name, query_result[name])
+    return {"queryresult": projected}
+
+
+def upstream_params(projection):
+    """
+    从投影推导上游参数（format、includepodid），调用方显式指定的参数优先
+
+    Returns:
+        dict
+    """
+    pods = projection.children.get("pods")
+    if pods is None:
+        return {"format": "plaintext"}
+
+    params = {}
+    if pods.ids:
+        params["includepodid"] = ",".join(sorted(pods.ids))
+
+    subpods = pods.children.get("subpods")
+    if pods.leaf or (subpods is not None and subpods.leaf):
+        # 需要完整的Pod或子Pod，不限制格式
+        return params
+    formats = {SUBPOD_FORMATS[name] for name in (subpods.children if subpods is not None else ()) if name in SUBPOD_FORMATS}
+    params["format"] = ",".join(sorted(formats)) or "plaintext"
+    return params
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Wolfram|Alpha Mobile API 签名
+签名为 md5(salt + 按键排序后拼接的 "键值")，键和值均为URL编码后的形式
+
+craft_signed_url 是最初的实现：先编码成查询字符串，再拆分、解码、重新编码后计算签名；
+sign_params 直接基于参数字典一次完成编码和签名，结果与前者逐字节一致，并缓存重复的参数组合
+"""
+
+from functools import lru_cache
+from hashlib import md5
+from urllib.parse import quote_plus, unquote_plus, urlencode, urlsplit
+
+
+def calc_sig(query, salt):
+    """
+    计算签名（原始实现）
+
+    @query
+    In format of "input=...&arg1=...&arg2=..."
+    """
+    params = list(filter(lambda x: len(x) > 1,
+                  list(map(lambda x: x.split("="), query.split("&")))))
+    params.sort(key=lambda x: x[0])
+
+    s = salt
+    for key, val in params:
+        s += key + val
+    s = s.encode("utf-8")
+    return md5(s).hexdigest().upper()
+
+
+def craft_signed_url(url, appid, salt):
+    """
+    构建签名URL（原始实现）
+
+    @url
+    In format of "https://server/path?input=...&arg1=...&arg2=..."
+    """
+    (scheme, netloc, path, query, _) = urlsplit(url)
+    _query = {"appid": appid}
+
+    _query.update(dict(list(filter(lambda x: len(x) > 1,
+        list(map(lambda x: list(map(lambda y: unquote_plus(y), x.split("="))),
+               query.split("&")))))))
+    query = urlencode(_query)
+    _query.update({"sig": calc_sig(query, salt)})
+    return f"{scheme}://{netloc}{path}?{urlencode(_query)}"
+
+
+def sign_params(params, appid, salt):
+    """
+    直接根据参数字典生成带签名的查询字符串
+
+    Args:
+        params (dict): 查询参数（不含appid和sig）
+        appid (str): AppId
+        salt (str): 签名盐
+
+    Returns:
+        str: "appid=...&input=...&sig=..."
+    """
+    items = tuple((str(key), str(value)) for key, value in params.items())
+    return _sign_items(items, appid, salt)
+
+
+@lru_cache(maxsize=4096)
+def _sign_items(items, appid, salt):
+    # appid放在首位，与原始实现的参数顺序一致
+    query = {"appid": appid}
+    query.update(items)
+
+    encoded = {quote_plus(key): quote_plus(value) for key, value in query.items()}
+    s = salt + "".join(key + encoded[key] for key in sorted(encoded))
+    encoded["sig"] = md5(s.encode("utf-8")).hexdigest().upper()
+
+    return "&".join(f"{key}={value}" for key, value in encoded.items())
+
+
+def signed_url(base_url, params, appid, salt):
+    """构建签名URL，结果与 craft_signed_url(f"{base_url}?{urlencode(params)}", ...) 相同"""
+    return f"{base_url}?{sign_params(params, appid, salt)}"
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Wolfram|Alpha 上游HTTP传输层
+所有线程共享同一个urllib3连接池，连接保持keep-alive复用（复用连接即复用TLS会话），
+每次请求都带有明确的连接/读取超时，并统计连接池的饱和情况；
+设置录制(Cassette)后可以录制上游响应，或直接回放录制的响应而不访问上游；
+设置自适应并发限制(AdaptiveLimiter)后，超出上限的请求排队等待；
+设置熔断器(CircuitBreaker)后，上游失败率过高时直接拒绝请求，不再等待上游超时
+"""
+
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import get_encoding_from_headers
+
+from wolfram_breaker import CircuitOpen
+from wolfram_limiter import LimiterTimeout
+
+
+class UpstreamOverloaded(requests.exceptions.ConnectionError):
+    """等待上游并发名额超时，请求没有发出"""
+
+
+class UpstreamUnavailable(requests.exceptions.ConnectionError):
+    """熔断器打开，请求没有发出"""
+
+
+class UpstreamTransport:
+    """
+    线程安全的上游传输
+
+    requests.Session本身不保证线程安全，因此每个线程使用自己的Session，
+    但所有Session挂载同一个HTTPAdapter，共享底层连接池
+    """
+
+    def __init__(self, headers=None, pool_size=32, pool_block=False,
+                 connect_timeout=5, read_timeout=30, cassette=None, limiter=None, queue_timeout=10,
+                 breaker=None):
+        """
+        Args:
+            headers (dict): 每个请求附带的请求头
+            pool_size (int): 每个上游主机保持的最大连接数
+            pool_block (bool): 连接数达到上限时是否等待空闲连接（否则临时新建连接，用完即关闭）
+            connect_timeout (float): 连接超时（秒）
+            read_timeout (float): 读取超时（秒）
+            cassette (Cassette): 上游响应的录制/回放，None表示直接访问上游
+            limiter (AdaptiveLimiter): 自适应并发限制，None表示不限制
+            queue_timeout (float): 超出并发上限时最长的排队时间（秒）
+            breaker (CircuitBreaker): 熔断器，None表示不熔断
+        """
+        self.headers = dict(headers or {})
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.cassette = cassette
+        self.limiter = limiter
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker
+
+        self._adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=pool_size,
+            pool_block=pool_block,
+            max_retries=0
+        )
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.saturated = 0  # 发出时已有pool_size个请求在进行中的请求数
+        self.endpoints = {}  # 上游接口 -> 请求数
+        # 每个请求结束后调用 observer(上游接口, 耗时秒数, 是否失败)，用于采集延迟指标
+        self.observers = []
+
+    @property
+    def session(self):
+        """当前线程的Session，挂载共享的连接池"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            self._local.session = session
+        return session
+
+    def get(self, url):
+        """
+        发送GET请求并检查状态码
+
+        Returns:
+            requests.Response
+
+        Raises:
+            requests.exceptions.RequestException: 请求失败、超时或状态码不是2xx
+        """
+        endpoint = urlsplit(url).path.rsplit("/", 1)[-1]
+        # 只回放录制时不访问上游，不需要熔断和并发名额
+        upstream = self.cassette is None or self.cassette.mode != "replay"
+        guarded = self.breaker is not None and upstream
+        if guarded:
+            try:
+                probe = self.breaker.allow()
+            except CircuitOpen as e:
+                self._count("errors")
+                raise UpstreamUnavailable(str(e)) from None
+
+        limited = self.limiter is not None and upstream
+        if limited:
+            try:
+                token = self.limiter.acquire(self.queue_timeout)
+            except LimiterTimeout as e:
+                self._count("errors")
+                if guarded:
+                    self.breaker.record(probe, None)
+                raise UpstreamOverloaded(str(e)) from None
+        throttled = True
+
+        with self._lock:
+            self.requests += 1
+            self.endpoints[endpoint] = self.endpoints.get(endpoint, 0) + 1
+            if self.in_flight >= self.pool_size:
+                self.saturated += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self._replay(url) if self.cassette is not None and self.cassette.replaying else None
+            if response is None:
+                response = self.session.get(url, timeout=self.timeout)
+                if self.cassette is not None and self.cassette.recording:
+                    self.cassette.record(url, response.status_code, response.content,
+                                         response.headers.get("Content-Type"), time.perf_counter() - start)
+            throttled = response.status_code == 429 or response.status_code >= 500
+            response.raise_for_status()
+            failed = False
+            return response
+        except requests.exceptions.Timeout:
+            self._count("timeouts")
+            self._count("errors")
+            raise
+        except requests.exceptions.RequestException:
+            self._count("errors")
+            raise
+        finally:
+            # 超时、连接失败、429和5xx都视为上游过载，4xx是请求本身的问题
+            if limited:
+                self.limiter.release(token, throttled)
+            if guarded:
+                self.breaker.record(probe, throttled)
+            with self._lock:
+                self.in_flight -= 1
+            elapsed = time.perf_counter() - start
+            for observer in self.observers:
+                observer(endpoint, elapsed, failed)
+
+    def _replay(self, url):
+        """
+        返回录制的响应，按录制时的耗时等待；未录制时返回None（hybrid模式）
+
+        Raises:
+            requests.exceptions.ConnectionError: replay模式下请求未录制
+        """
+        entry = self.cassette.play(url)
+        if entry is None:
+            if self.cassette.recording:
+                return None
+            raise requests.exceptions.ConnectionError(f"录制中没有该请求: {url}")
+
+        delay = self.cassette.delay(entry)
+        if delay > 0:
+            time.sleep(delay)
+
+        response = requests.Response()
+        response.status_code = entry.status
+        response.reason = http.client.responses.get(entry.status, "")
+        response._content = entry.content
+        if entry.content_type:
+            response.headers["Content-Type"] = entry.content_type
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = url
+        return response
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def close(self):
+        """关闭连接池"""
+        self._adapter.close()
+
+    def stats(self):
+        """返回传输层统计信息"""
+        connections = 0
+        pooled_requests = 0
+        try:
+            pools = self._adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                connections += pool.num_connections
+                pooled_requests += pool.num_requests
+        except (AttributeError, KeyError):
+            pass
+
+        with self._lock:
+            return {
+                "pool_size": self.pool_size,
+                "connect_timeout": self.timeout[0],
+                "read_timeout": self.timeout[1],
+                "requests": self.requests,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "saturated": self.saturated,
+                "endpoints": dict(self.endpoints),
+                "connections_opened": connections,
+                "requests_per_connection": round(pooled_requests / connections, 2) if connections else 0.0,
+                "cassette": self.cassette.stats() if self.cassette is not None else None,
+                "limiter": self.limiter.stats() if self.limiter is not None else None,
+                "breaker": self.breaker.stats() if self.breaker is not None else None,
+            }
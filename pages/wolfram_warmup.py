@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+启动时的缓存预热
+从查询日志或热门查询列表中读取出现次数最多的输入，在后台按限定速率重新查询一遍，
+预热完成的比例达到阈值之前 /health 返回503，负载均衡器在缓存命中率足够高之后才转发流量
+
+预热文件格式（按扩展名区分）:
+    .json   输入列表 ["2+2", ...]、{输入: 次数} 或对象列表 [{"input": ..., "count": ..., "params": {...}}, ...]
+    其他    每行一条：JSON对象（查询日志，字段同上，每行计一次）、"次数<TAB>输入"（热门列表）或输入本身；
+            空行和以 # 开头的行忽略
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import Counter, namedtuple
+
+# 预热接口 -> (WolframAlphaAPI的方法, 附加参数, 是否为原始JSON缓存)
+# query.raw 对应直通模式下的 /api/query，simple 对应 /api/simple
+ENDPOINTS = {
+    "query": ("query", {}, False),
+    "query.raw": ("query_raw", {}, True),
+    "simple": ("query", {"includepodid": "Result"}, False),
+}
+
+WarmupItem = namedtuple("WarmupItem", ["endpoint", "input", "params", "count"])
+
+
+def load_warmup_items(path, top_n=1000, endpoints=("query",)):
+    """
+    读取预热文件，按出现次数从多到少返回前top_n个输入
+
+    没有指定endpoint的输入对endpoints中的每个接口各预热一次
+
+    Returns:
+        list[WarmupItem]
+
+    Raises:
+        OSError: 文件无法读取
+        ValueError: 格式不正确或接口未知
+    """
+    counts = Counter()
+
+    def add(entry, count=1):
+        if isinstance(entry, str):
+            entry = {"input": entry}
+        input_text = str(entry.get("input", "")).strip()
+        if not input_text:
+            return
+        params = entry.get("params") or {}
+        names = [entry["endpoint"]] if entry.get("endpoint") else endpoints
+        for name in names:
+            if name not in ENDPOINTS:
+                raise ValueError(f"未知的预热接口: {name}（可选 {', '.join(ENDPOINTS)}）")
+            key = (name, input_text, json.dumps(params, sort_keys=True, ensure_ascii=False))
+            counts[key] += int(entry.get("count", count))
+
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            data = json.load(f)
+            if isinstance(data, dict):
+                for input_text, count in data.items():
+                    add(input_text, count)
+            else:
+                for entry in data:
+                    add(entry)
+        else:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("{"):
+                    add(json.loads(line))
+                    continue
+                count, tab, input_text = line.partition("\t")
+                if tab and count.isdigit():
+                    add(input_text, int(count))
+                else:
+                    add(line)
+
+    return [
+        WarmupItem(endpoint, input_text, json.loads(params), count)
+        for (endpoint, input_text, params), count in counts.most_common(top_n)
+    ]
+
+
+class CacheWarmer:
+    """
+    在后台线程中按限定速率重新查询热门输入
+
+    已在缓存中的输入（例如磁盘缓存L2中已有的结果）直接计为已预热，不占用速率；查询后只有成功且写入了缓存的
+    结果计为已预热，上游不可用（或熔断器打开）时预热失败，直到timeout才视为就绪。
+    异步API的查询提交到其事件循环中执行
+    """
+
+    def __init__(self, api, items, rate=5, concurrency=4, ready_fraction=0.9, timeout=600, loop=None):
+        """
+        Args:
+            api (WolframAlphaAPI): 查询接口，AsyncWolframAlphaAPI需同时传入loop
+            items (list[WarmupItem]): 预热的输入，按优先级排序
+            rate (float): 每秒最多发往上游的预热查询数
+            concurrency (int): 预热线程数
+            ready_fraction (float): 预热成功（结果已在缓存中）的比例达到该值时视为就绪
+            timeout (float): 开始预热后超过该秒数时无论进度如何都视为就绪（上游持续失败时的唯一出口）
+            loop: 异步API所在的事件循环
+        """
+        self.api = api
+        self.items = list(items)
+        self.interval = 1 / rate if rate > 0 else 0
+        self.concurrency = max(1, concurrency)
+        self.ready_fraction = ready_fraction
+        self.timeout = timeout
+        self.loop = loop
+
+        self._lock = threading.Lock()
+        self._next = 0
+        self._next_slot = 0.0
+        self._threads = []
+        self.started_at = None
+        self.finished_at = None
+
+        self.warmed = 0
+        self.cached = 0
+        self.failed = 0
+
+    def start(self):
+        """开始预热，重复调用无效"""
+        with self._lock:
+            if self.started_at is not None:
+                return
+            self.started_at = time.monotonic()
+            if not self.items:
+                self.finished_at = self.started_at
+                return
+            for index in range(min(self.concurrency, len(self.items))):
+                thread = threading.Thread(target=self._worker, name=f"wolfram-warmup-{index}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def _take(self):
+        with self._lock:
+            if self._next >= len(self.items):
+                return None
+            item = self.items[self._next]
+            self._next += 1
+            return item
+
+    def _wait_slot(self):
+        """按速率限制等待下一个上游查询的时间片"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _worker(self):
+        while True:
+            item = self._take()
+            if item is None:
+                break
+            method, extra, raw = ENDPOINTS[item.endpoint]
+            params = dict(item.params, **extra)
+            try:
+                if self.api.is_cached(item.input, raw=raw, **params):
+                    self._count("cached")
+                else:
+                    self._wait_slot()
+                    result = getattr(self.api, method)(item.input, **params)
+                    if asyncio.iscoroutine(result):
+                        result = asyncio.run_coroutine_threadsafe(result, self.loop).result()
+                    if not (_succeeded(result) and self.api.is_cached(item.input, raw=raw, **params)):
+                        # 失败的结果没有写入缓存或只短期缓存
+                        self._count("failed")
+                        continue
+                self._count("warmed")
+            except Exception:
+                self._count("failed")
+
+        with self._lock:
+            if self.warmed + self.failed >= len(self.items) and self.finished_at is None:
+                self.finished_at = time.monotonic()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @property
+    def ready(self):
+        """预热成功的比例达到阈值或超过timeout时为True"""
+        with self._lock:
+            return self._ready()
+
+    def _ready(self):
+        if self.started_at is None:
+            return False
+        if self.warmed >= len(self.items) * self.ready_fraction:
+            return True
+        return time.monotonic() - self.started_at >= self.timeout
+
+    def stats(self):
+        """返回预热进度"""
+        with self._lock:
+            total = len(self.items)
+            if self.started_at is None:
+                state = "pending"
+            elif self.finished_at is not None:
+                state = "done"
+            else:
+                state = "running"
+            end = self.finished_at or time.monotonic()
+            return {
+                "state": state,
+                "ready": self._ready(),
+                "total": total,
+                "warmed": self.warmed,
+                "already_cached": self.cached,
+                "failed": self.failed,
+                "progress": round(self.warmed / total, 4) if total else 1.0,
+                "ready_fraction": self.ready_fraction,
+                "elapsed_seconds": round(end - self.started_at, 1) if self.started_at is not None else 0.0,
+            }
+
+
+def _succeeded(result):
+    """查询结果是否成功：dict为解析后的结果，RawJSON(query_raw)提供success属性"""
+    if isinstance(result, dict):
+        return bool(result.get("queryresult", {}).get("success"))
+    return bool(getattr(result, "success", False))
+
+
+def create_warmer(api, path, top_n=1000, endpoints=("query",), **kwargs):
+    """读取预热文件并创建CacheWarmer，文件无法读取时打印错误并返回None"""
+    try:
+        items = load_warmup_items(path, top_n, endpoints)
+    except (OSError, ValueError) as e:
+        print(f"[WARNING] 无法读取预热文件 {path}: {e}")
+        return None
+    print(f"缓存预热: 从 {os.path.basename(path)} 读取 {len(items)} 个查询")
+    return CacheWarmer(api, items, **kwargs)
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+
+"""测试直接导入 pages/ 中的模块（共享模块的源文件），副本由 tools/shared_modules.py 检查"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "pages"))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+# 导入服务器模块时不创建磁盘缓存文件
+os.environ.setdefault("WOLFRAM_L2_CACHE_PATH", "")
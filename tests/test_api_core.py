@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+
+from wolfram_api_core import WolframAlphaAPI
+from wolfram_cache import LRUCache, TieredCache
+
+
+def make_api():
+    return WolframAlphaAPI(cache=TieredCache(LRUCache(ttl=60), None))
+
+
+def test_stats_counters_are_exact_under_concurrency():
+    api = make_api()
+
+    def bump(_):
+        for _ in range(1000):
+            api._count(api.hedge_stats, "started")
+            api._count(api.fallback_stats, "stale_served")
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(bump, range(8)))
+    assert api.hedge_stats["started"] == 8000
+    assert api.fallback_stats["stale_served"] == 8000
+
+
+def test_query_batch_builds_params_once_per_item():
+    api = make_api()
+    fetched = []
+
+    def fetch(params, raw=False):
+        fetched.append(params["input"])
+        return {"queryresult": {"success": True, "numpods": 1, "pods": [{"id": "Result"}]}}, 100
+
+    api._fetch = fetch
+    results = api.query_batch([("population of France", {}), ("population  of France", {}), ("H2O", {})])
+    assert [result["queryresult"]["success"] for result in results] == [True, True, True]
+    assert sorted(fetched) == ["H2O", "population of France"]
+    # 每个条目只规范化一次参数
+    assert api.normalizer.stats()["normalized"] == 3
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+
+import httpx
+import pytest
+
+from wolfram_async_api import AsyncSingleFlight, AsyncWolframAlphaAPI
+from wolfram_cache import LRUCache, SQLiteCache, TieredCache, make_cache_key
+from wolfram_limiter import AdaptiveLimiter
+
+from conftest import ROOT
+
+RESULT = {"queryresult": {"success": True, "error": False, "numpods": 1,
+                          "pods": [{"id": "Result", "subpods": [{"plaintext": "x"}]}]}}
+
+
+class ThreadRecordingSQLiteCache(SQLiteCache):
+    """记录读写L2时所在的线程"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = []
+
+    def get_entry(self, key):
+        self.threads.append(threading.current_thread())
+        return super().get_entry(key)
+
+    def set(self, *args, **kwargs):
+        self.threads.append(threading.current_thread())
+        return super().set(*args, **kwargs)
+
+
+def test_l2_io_runs_off_the_event_loop(tmp_path):
+    l2 = ThreadRecordingSQLiteCache(str(tmp_path / "cache.db"), ttl=60)
+    api = AsyncWolframAlphaAPI(cache=TieredCache(LRUCache(ttl=60), l2))
+
+    async def fetch(params, raw=False):
+        return RESULT, 100
+
+    api._fetch = fetch
+
+    assert asyncio.run(api.query("distance to the moon")) == RESULT
+    assert l2.threads and threading.main_thread() not in l2.threads
+
+    # 另一个worker：L1为空，L2命中
+    other = AsyncWolframAlphaAPI(cache=TieredCache(LRUCache(ttl=60), l2))
+    l2.threads.clear()
+    assert asyncio.run(other.query("distance to the moon")) == RESULT
+    assert l2.threads and threading.main_thread() not in l2.threads
+    key = make_cache_key(other._build_params("distance to the moon", {}))
+    assert other.cache.l1.get(key) == RESULT
+
+
+def test_singleflight_leader_cancellation_does_not_fail_waiters():
+    async def main():
+        flight = AsyncSingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await release.wait()
+            return "result"
+
+        leader = asyncio.ensure_future(flight.do("key", load))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do("key", load))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await waiter == "result"
+        assert leader.cancelled()
+        assert calls == [1]
+        assert flight.stats() == {"in_flight": 0, "executions": 1, "coalesced": 1}
+
+    asyncio.run(main())
+
+
+def test_singleflight_shares_exceptions():
+    async def main():
+        flight = AsyncSingleFlight()
+
+        async def load():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream")
+
+        results = await asyncio.gather(flight.do("key", load), flight.do("key", load), return_exceptions=True)
+        assert [type(result) for result in results] == [ValueError, ValueError]
+        # 失败后不保留，下一次调用重新执行
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(main())
+
+
+def test_import_does_not_build_the_flask_server(tmp_path):
+    code = "import sys, wolfram_async_api; print('wolfram_enhanced_api' in sys.modules, 'flask_cors' in sys.modules)"
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT, "pages"))
+    output = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.split() == ["False", "False"]
+
+
+def test_query_batch_builds_params_once_per_item():
+    api = AsyncWolframAlphaAPI(cache=TieredCache(LRUCache(ttl=60), None))
+    fetched = []
+
+    async def fetch(params, raw=False):
+        fetched.append(params["input"])
+        return RESULT, 100
+
+    api._fetch = fetch
+    results = asyncio.run(api.query_batch([("2 × 3 apples", {}), ("2*3 apples", {}), ("H2O", {})]))
+    assert results == [RESULT, RESULT, RESULT]
+    assert sorted(fetched) == ["2*3 apples", "H2O"]
+    assert api.normalizer.stats()["normalized"] == 3
+
+
+URL = "https://api.wolframalpha.com/v2/query?input=x"
+
+
+def upstream_api(limiter, send):
+    """上游请求由send代替，只保留自适应并发限制"""
+    api = AsyncWolframAlphaAPI(cache=TieredCache(LRUCache(ttl=60), None))
+    api.transport.cassette = None
+    api.transport.breaker = None
+    api.transport.limiter = limiter
+    api._send = send
+    return api
+
+
+def test_async_requests_share_the_adaptive_limit():
+    limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+    active = []
+
+    async def send(url):
+        active.append(limiter.in_flight)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, request=httpx.Request("GET", url))
+
+    api = upstream_api(limiter, send)
+
+    async def main():
+        return await asyncio.gather(*(api._get(URL) for _ in range(3)))
+
+    assert [response.status_code for response in asyncio.run(main())] == [200] * 3
+    stats = limiter.stats()
+    assert active == [1, 1, 1]
+    assert (stats["in_flight"], stats["queued"], stats["peak_queued"]) == (0, 0, 2)
+
+
+def test_async_throttled_response_lowers_the_limit():
+    limiter = AdaptiveLimiter(initial_limit=4)
+
+    async def send(url):
+        response = httpx.Response(503, request=httpx.Request("GET", url))
+        response.raise_for_status()
+
+    api = upstream_api(limiter, send)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(api._get(URL))
+    assert (limiter.limit, limiter.decreases, limiter.in_flight) == (2, 1, 0)
+
+
+def test_async_queue_timeout_and_cancellation_release_the_slot():
+    limiter = AdaptiveLimiter(initial_limit=1)
+    release = asyncio.Event()
+
+    async def send(url):
+        await release.wait()
+        return httpx.Response(200, request=httpx.Request("GET", url))
+
+    api = upstream_api(limiter, send)
+    api.transport.queue_timeout = 0.05
+
+    async def main():
+        first = asyncio.ensure_future(api._get(URL))
+        await asyncio.sleep(0)
+        with pytest.raises(httpx.ConnectError):
+            await api._get(URL)
+        assert limiter.rejected == 1
+
+        # 被取消的请求只释放名额，不减小上限
+        first.cancel()
+        await asyncio.sleep(0)
+        assert first.cancelled() and limiter.in_flight == 0
+        release.set()
+        return await api._get(URL)
+
+    assert asyncio.run(main()).status_code == 200
+    assert (limiter.decreases, limiter.in_flight) == (0, 0)
+
+
+def test_async_requests_feed_the_observers():
+    statuses = [200, 404, 429]
+
+    async def send(url):
+        response = httpx.Response(statuses.pop(0), request=httpx.Request("GET", url))
+        response.raise_for_status()
+        return response
+
+    api = upstream_api(AdaptiveLimiter(), send)
+    observed = []
+    api.transport.observers.append(lambda endpoint, elapsed, failed: observed.append((endpoint, failed)))
+
+    async def main():
+        await api._get(URL)
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await api._get(URL)
+
+    asyncio.run(main())
+    assert observed == [("query", False), ("query", True), ("query", True)]
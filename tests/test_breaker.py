@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import wolfram_breaker
+from wolfram_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(wolfram_breaker, "time", clock)
+    return clock
+
+
+def fail(breaker, count, failed=True):
+    for _ in range(count):
+        breaker.record(breaker.allow(), failed)
+
+
+def test_opens_at_failure_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=0.5, min_requests=4, window=10, open_seconds=5)
+    fail(breaker, 2, failed=False)
+    fail(breaker, 1)
+    assert breaker.state == CLOSED
+    fail(breaker, 1)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    assert breaker.stats()["short_circuited"] == 1
+    assert breaker.stats()["opened"] == 1
+
+
+def test_stays_closed_below_min_requests(clock):
+    breaker = CircuitBreaker(failure_threshold=0.5, min_requests=4, window=10)
+    fail(breaker, 3)
+    assert breaker.state == CLOSED
+
+
+def test_requests_not_sent_are_not_counted(clock):
+    breaker = CircuitBreaker(failure_threshold=0.5, min_requests=2, window=10)
+    for _ in range(5):
+        breaker.record(breaker.allow(), None)
+    assert breaker.stats()["window_requests"] == 0
+
+
+def test_failures_leave_the_window(clock):
+    breaker = CircuitBreaker(failure_threshold=0.5, min_requests=4, window=10)
+    fail(breaker, 3)
+    clock.now += 11
+    fail(breaker, 1)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_failures"] == 1
+
+
+def test_half_open_probe_success_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=0.5, min_requests=2, window=10, open_seconds=5, half_open_probes=1)
+    fail(breaker, 2)
+    clock.now += 5
+    assert breaker.state == HALF_OPEN
+
+    probe = breaker.allow()
+    assert probe is True
+    # 探测名额已满
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    breaker.record(probe, False)
+    assert breaker.state == CLOSED
+    assert breaker.allow() is False
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=0.5, min_requests=2, window=10, open_seconds=5)
+    fail(breaker, 2)
+    clock.now += 5
+    breaker.record(breaker.allow(), True)
+    assert breaker.state == OPEN
+    assert breaker.stats()["opened"] == 2
+    clock.now += 4
+    assert breaker.state == OPEN
+    clock.now += 1
+    assert breaker.state == HALF_OPEN
+
+
+def test_probe_not_sent_frees_its_slot(clock):
+    breaker = CircuitBreaker(failure_threshold=0.5, min_requests=2, window=10, open_seconds=5)
+    fail(breaker, 2)
+    clock.now += 5
+    breaker.record(breaker.allow(), None)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is True
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+from wolfram_cache import LRUCache, SQLiteCache, TieredCache, make_cache_key
+
+
+def tiered(tmp_path, l1_ttl=3600, l2_ttl=86400):
+    return TieredCache(
+        LRUCache(max_entries=16, ttl=l1_ttl),
+        SQLiteCache(str(tmp_path / "cache.db"), ttl=l2_ttl)
+    )
+
+
+def test_promotion_keeps_remaining_ttl(tmp_path):
+    writer = tiered(tmp_path)
+    writer.set("negative", {"ok": False}, 10, ttl=0.3)
+
+    # 另一个worker：L1为空，从L2回填
+    reader = tiered(tmp_path)
+    assert reader.get("negative") == {"ok": False}
+    assert reader.l1.get("negative") == {"ok": False}
+
+    time.sleep(0.4)
+    assert reader.l1.get("negative") is None
+    assert reader.get("negative") is None
+
+
+def test_promotion_is_capped_by_l1_ttl(tmp_path):
+    writer = tiered(tmp_path, l1_ttl=0.3)
+    writer.set("key", "value", 5)
+
+    reader = tiered(tmp_path, l1_ttl=0.3)
+    assert reader.get("key") == "value"
+    time.sleep(0.4)
+    assert reader.l1.get("key") is None
+    # L2仍然有效，再次回填
+    assert reader.get("key") == "value"
+
+
+def test_sqlite_entry_and_stale(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), ttl=60, stale_ttl=60)
+    cache.set("raw", b'{"a": 1}')
+    value, expires_at = cache.get_entry("raw")
+    assert value == b'{"a": 1}'
+    assert 55 < expires_at - time.time() <= 60
+
+    cache.set("old", [1], ttl=-1)
+    assert cache.get("old") is None
+    assert cache.get_entry("old") is None
+    assert cache.get_stale("old") == [1]
+
+
+def test_lru_ttl_and_eviction():
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set("a", 1, 1)
+    cache.set("b", 2, 1)
+    cache.get("a")
+    cache.set("c", 3, 1)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+
+    cache.set("short", 4, 1, ttl=-1)
+    assert cache.get("short") is None
+
+
+def test_lru_byte_limit():
+    cache = LRUCache(max_entries=10, max_bytes=10)
+    cache.set("a", "x", 6)
+    cache.set("b", "y", 6)
+    assert cache.get("a") is None and cache.get("b") == "y"
+    cache.set("huge", "z", 11)
+    assert cache.get("huge") is None
+
+
+def test_stale_entries_survive_expiry():
+    cache = LRUCache(ttl=-1, stale_ttl=60)
+    cache.set("a", 1, 1)
+    assert cache.get("a") is None
+    assert cache.get_stale("a") == 1
+
+
+def test_cache_key_ignores_signature_and_order():
+    assert (make_cache_key({"input": "pi", "format": "plaintext", "sig": "A"})
+            == make_cache_key({"format": "plaintext", "input": "pi", "appid": "x"}))
+    assert make_cache_key({"input": "pi"}) != make_cache_key({"input": "pi"}, endpoint="query.raw")
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+from flask import Flask
+from starlette.testclient import TestClient
+
+import wolfram_async_api
+import wolfram_enhanced_api
+from wolfram_http import conditional_json, content_etag, etag_matches, splice_json
+
+PAYLOAD = {"success": True, "query": "2+2", "result": "4", "timestamp": "2024-01-01T00:00:00"}
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.payloads = {}
+
+    @app.route("/simple/<name>")
+    def simple(name):
+        return conditional_json(app.payloads[name], max_age=60, stale_while_revalidate=600)
+
+    return app
+
+
+def test_etag_ignores_volatile_fields(app):
+    client = app.test_client()
+    app.payloads["a"] = PAYLOAD
+    first = client.get("/simple/a")
+    app.payloads["a"] = dict(PAYLOAD, timestamp="2024-01-02T00:00:00")
+    second = client.get("/simple/a")
+
+    assert first.status_code == second.status_code == 200
+    assert first.headers["ETag"] == second.headers["ETag"]
+    assert first.headers["ETag"].startswith('W/"')
+    assert first.headers["Cache-Control"] == "public, max-age=60, stale-while-revalidate=600"
+    assert second.get_json() == app.payloads["a"]
+
+
+def test_etag_changes_with_content(app):
+    client = app.test_client()
+    app.payloads["a"] = PAYLOAD
+    app.payloads["b"] = dict(PAYLOAD, result="5")
+    assert client.get("/simple/a").headers["ETag"] != client.get("/simple/b").headers["ETag"]
+
+
+def test_if_none_match_returns_304(app):
+    client = app.test_client()
+    app.payloads["a"] = PAYLOAD
+    etag = client.get("/simple/a").headers["ETag"]
+
+    response = client.get("/simple/a", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+
+    # 强校验写法和列表中的任一值都匹配
+    response = client.get("/simple/a", headers={"If-None-Match": '"other", ' + etag[2:]})
+    assert response.status_code == 304
+    assert client.get("/simple/a", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_etag_matches():
+    etag = content_etag(b"{}")
+    assert etag_matches("*", etag)
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag[2:], etag)
+    assert not etag_matches("", etag)
+    assert not etag_matches('W/"other"', etag)
+
+
+def test_splice_json():
+    assert json.loads(splice_json('{"a": 1}', '{"b": 2}')) == {"a": 1, "b": 2}
+    assert json.loads(splice_json(b'{"a":1}\n', b'{"b":2}')) == {"a": 1, "b": 2}
+    assert splice_json('{"a": 1}', "{}") == '{"a": 1}'
+    assert splice_json("{}", '{"b": 2}') == '{"b": 2}'
+
+
+def test_async_server_etag_is_stable(monkeypatch):
+    async def get_simple_result(input_text):
+        return "4"
+
+    monkeypatch.setattr(wolfram_async_api.async_wolfram_api, "get_simple_result", get_simple_result)
+    client = TestClient(wolfram_async_api.app)
+
+    first = client.get("/api/simple/2+2")
+    second = client.get("/api/simple/2+2")
+    assert first.status_code == second.status_code == 200
+    assert first.headers["etag"] == second.headers["etag"]
+    assert first.json()["result"] == "4" and "timestamp" in first.json()
+
+    response = client.get("/api/simple/2+2", headers={"If-None-Match": first.headers["etag"]})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+FAILURES = [
+    ({"queryresult": {"success": False, "error": False}}, 404),
+    ({"queryresult": {"success": True, "error": False, "pods": []}}, 404),
+    ({"queryresult": {"success": False, "error": {"code": "1", "msg": "Invalid appid"}}}, 502),
+]
+
+
+@pytest.mark.parametrize("result, status", FAILURES)
+def test_simple_failures_are_not_cached(monkeypatch, result, status):
+    monkeypatch.setattr(wolfram_enhanced_api.wolfram_api, "query", lambda input_text, **kwargs: result)
+    response = wolfram_enhanced_api.app.test_client().get("/api/simple/q")
+    assert response.status_code == status
+    assert response.headers["Cache-Control"] == "no-store"
+    assert "ETag" not in response.headers
+
+
+@pytest.mark.parametrize("result, status", FAILURES)
+def test_async_simple_failures_are_not_cached(monkeypatch, result, status):
+    async def query(input_text, **kwargs):
+        return result
+
+    monkeypatch.setattr(wolfram_async_api.async_wolfram_api, "query", query)
+    response = TestClient(wolfram_async_api.app).get("/api/simple/q")
+    assert response.status_code == status
+    assert response.headers["cache-control"] == "no-store"
+    assert "etag" not in response.headers
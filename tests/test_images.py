@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from wolfram_images import ImageProxy, ImageStore
+
+GIF = b"GIF89a\x01\x00\x01\x00\x00\x00\x00;"
+URL = "https://www6b3.wolframalpha.com/Calculate/MSP/MSP1.gif"
+
+
+class Response:
+    def __init__(self, content, content_type):
+        self.content = content
+        self.headers = {"Content-Type": content_type}
+
+
+class Transport:
+    """按地址返回固定内容的传输，记录请求的地址"""
+
+    def __init__(self, content=GIF, content_type="image/gif", fail=False, release=None):
+        self.content = content
+        self.content_type = content_type
+        self.fail = fail
+        self.release = release
+        self.requested = []
+
+    def get(self, url):
+        self.requested.append(url)
+        if self.release is not None:
+            self.release.wait(5)
+        if self.fail:
+            raise ConnectionError(url)
+        return Response(self.content, self.content_type)
+
+
+def result(*urls):
+    return {"queryresult": {"pods": [{"subpods": [{"img": {"src": url}}]} for url in urls]}}
+
+
+def wait_idle(proxy):
+    deadline = time.monotonic() + 5
+    while proxy.stats()["pending"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_first_response_keeps_upstream_urls(tmp_path):
+    release = threading.Event()
+    proxy = ImageProxy(ImageStore(str(tmp_path)), Transport(release=release))
+
+    # 下载未完成时不等待，保留原地址
+    assert proxy.rewrite(result(URL), "/api/image/") == result(URL)
+    release.set()
+    wait_idle(proxy)
+
+    rewritten = proxy.rewrite(result(URL), "/api/image/")
+    src = rewritten["queryresult"]["pods"][0]["subpods"][0]["img"]["src"]
+    assert src.startswith("/api/image/") and src.endswith(".gif")
+    assert proxy.store.get(src.rsplit("/", 1)[-1]) is not None
+    assert proxy.stats()["fetched"] == 1
+
+
+def test_rewrite_raw(tmp_path):
+    proxy = ImageProxy(ImageStore(str(tmp_path)), Transport())
+    body = b'{"img": {"src": "https:\\/\\/www6b3.wolframalpha.com\\/Calculate\\/MSP\\/MSP1.gif"}}'
+    assert proxy.rewrite_raw(body, "/api/image/") == body
+    wait_idle(proxy)
+    assert b'"src": "/api/image/' in proxy.rewrite_raw(body, "/api/image/")
+
+
+def test_only_allowed_hosts_are_fetched(tmp_path):
+    transport = Transport()
+    proxy = ImageProxy(ImageStore(str(tmp_path)), transport)
+    urls = [
+        "http://169.254.169.254/latest/meta-data.gif",
+        "https://wolframalpha.com.example.org/a.gif",
+        "file:///etc/passwd",
+        "https://public6.wolframcdn.com/a.gif",
+    ]
+    proxy.rewrite(result(*urls), "/api/image/")
+    wait_idle(proxy)
+    assert transport.requested == ["https://public6.wolframcdn.com/a.gif"]
+
+
+def test_failures_are_not_shared_between_processes(tmp_path):
+    transport = Transport(fail=True)
+    proxy = ImageProxy(ImageStore(str(tmp_path)), transport)
+    proxy.rewrite(result(URL), "/api/image/")
+    wait_idle(proxy)
+    proxy.rewrite(result(URL), "/api/image/")
+    wait_idle(proxy)
+    assert transport.requested == [URL]
+    assert proxy.stats()["fetch_errors"] == 1
+
+    # 另一个worker共享urls.db，失败记录不写入其中，仍会下载
+    other = Transport()
+    ImageProxy(ImageStore(str(tmp_path)), other).rewrite(result(URL), "/api/image/")
+    deadline = time.monotonic() + 5
+    while not other.requested and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert other.requested == [URL]
+
+
+def test_non_image_content_is_not_stored(tmp_path):
+    proxy = ImageProxy(ImageStore(str(tmp_path)), Transport(b"<html>", "text/html"))
+    proxy.rewrite(result(URL), "/api/image/")
+    wait_idle(proxy)
+    assert proxy.rewrite(result(URL), "/api/image/") == result(URL)
+    assert proxy.stats()["store"]["entries"] == 0
+
+
+def test_store_evicts_least_recently_used(tmp_path):
+    store = ImageStore(str(tmp_path), max_bytes=25)
+    first = store.put(b"a" * 10, "image/png")
+    second = store.put(b"b" * 10, "image/png")
+    store.get(first)
+    third = store.put(b"c" * 10, "image/png")
+    assert store.get(second) is None
+    assert store.get(first) is not None and store.get(third) is not None
+    assert store.stats()["evictions"] == 1
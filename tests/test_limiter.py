@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import wolfram_limiter
+from wolfram_limiter import AdaptiveLimiter, LimiterTimeout
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def perf_counter(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(wolfram_limiter, "time", clock)
+    return clock
+
+
+def test_throttled_batch_decreases_once(clock):
+    limiter = AdaptiveLimiter(initial_limit=10, backoff=0.5)
+    starts = [limiter.acquire() for _ in range(4)]
+    clock.now += 1
+    for start in starts:
+        limiter.release(start, throttled=True)
+    # 同一批在减小之前发出的请求只减小一次
+    assert limiter.limit == 5
+    assert limiter.stats()["decreases"] == 1
+
+    clock.now += 1
+    limiter.release(limiter.acquire(), throttled=True)
+    assert limiter.limit == 2
+
+
+def test_decrease_stops_at_min_limit(clock):
+    limiter = AdaptiveLimiter(initial_limit=2, min_limit=2, backoff=0.5)
+    limiter.release(limiter.acquire(), throttled=True)
+    assert limiter.limit == 2
+    assert limiter.stats()["decreases"] == 0
+
+
+def test_increases_only_near_the_limit(clock):
+    limiter = AdaptiveLimiter(initial_limit=4, max_limit=5)
+    # 并发数远低于上限时不增加
+    for _ in range(20):
+        clock.now += 0.1
+        limiter.release(limiter.acquire() - 0.1)
+    assert limiter.limit == 4
+
+    for _ in range(3):
+        limiter.acquire()
+    for _ in range(8):
+        limiter.acquire()
+        clock.now += 0.1
+        limiter.release(clock.now - 0.1)
+    assert limiter.limit == 5
+    assert limiter.stats()["increases"] == 1
+
+
+def test_latency_spike_decreases(clock):
+    limiter = AdaptiveLimiter(initial_limit=8, backoff=0.5, latency_tolerance=2.0, short_window=2, long_window=100)
+    for _ in range(20):
+        start = limiter.acquire()
+        clock.now += 0.1
+        limiter.release(start)
+    assert limiter.limit == 8
+
+    start = limiter.acquire()
+    clock.now += 1.0
+    limiter.release(start)
+    assert limiter.limit == 4
+
+
+def test_acquire_times_out_when_full(clock):
+    limiter = AdaptiveLimiter(initial_limit=1)
+    limiter.acquire()
+    with pytest.raises(LimiterTimeout):
+        limiter.acquire(timeout=0)
+    stats = limiter.stats()
+    assert stats["rejected"] == 1
+    assert stats["queued"] == 0
+    assert stats["in_flight"] == 1
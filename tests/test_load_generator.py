@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+from types import SimpleNamespace
+
+from conftest import ROOT
+
+sys.path.append(os.path.join(ROOT, "mobile_api"))
+
+import load_generator  # noqa: E402
+from load_generator import LoadGenerator, WorkerStats  # noqa: E402
+
+
+def test_failed_requests_are_recorded_in_latency():
+    stats = WorkerStats()
+    stats.record("quick", 0.0, 0.0, 0.010, None)
+    stats.record("quick", 0.0, 0.0, 5.0, "ReadTimeout")
+    assert stats.latency.total == 2 and stats.service.total == 2
+    assert stats.endpoints["quick"].total == 2
+    assert stats.failed_latency.total == 1 and stats.failed_latency.max == 5_000_000
+    assert stats.ok == 1 and stats.errors == {"ReadTimeout": 1}
+
+
+def test_throughput_counts_completions_inside_the_window(monkeypatch):
+    generator = LoadGenerator("http://localhost:5000", [{"query": "2+2"}], rate=10, duration=2, warmup=1)
+    generator.measure_start = 100.0
+    generator.measure_end = 102.0
+    stats = WorkerStats()
+    item = {"endpoint": "quick"}
+
+    clock = iter([101.0, 103.5, 101.5, 95.0])
+    monkeypatch.setattr(load_generator, "time", SimpleNamespace(perf_counter=lambda: next(clock)))
+    generator._record(stats, item, 100.5, 100.5, None)  # 完成于101.0
+    # 测量结束后才完成：计入延迟，不计入吞吐量
+    generator._record(stats, item, 101.9, 101.9, None)  # 完成于103.5
+    # 预热期间计划、测量期间内完成：不计入延迟，计入吞吐量
+    generator._record(stats, item, 99.0, 99.0, None)  # 完成于101.5
+    generator._record(stats, item, 94.0, 94.0, "HTTPError")
+
+    report = generator._report([stats], 3.0)
+    assert report["ok"] == 2 and report["failed"] == 0
+    assert report["latency_ms"]["count"] == 2
+    assert report["throughput"] == 1.0  # 测量期间内完成的两个成功请求 / 2秒
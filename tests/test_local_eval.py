@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from wolfram_local_eval import MAX_RESULT_DIGITS, evaluate, local_result
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2+2", ("2 + 2", "4")),
+    ("1/3 + 1/6", ("1/3 + 1/6", "1/2")),
+    ("2^10", ("2^10", "1024")),
+    ("-2^2", ("-2^2", "-4")),
+    ("(-2)^2", ("(-2)^2", "4")),
+    ("2^-2", ("2^(-2)", "1/4")),
+    ("sqrt(16/9)", ("sqrt(16/9)", "4/3")),
+    ("sin(pi/6)", ("sin(π/6)", "1/2")),
+    ("cos(2*pi/3)", ("cos(2×π/3)", "-1/2")),
+    ("tan(-pi/4)", ("tan(-π/4)", "-1")),
+    ("sin(13*pi/6)", ("sin(13×π/6)", "1/2")),
+    ("abs(3-5)", ("abs(3 - 5)", "2")),
+    ("exp(0)", ("exp(0)", "1")),
+    ("ln(1)", ("ln(1)", "0")),
+])
+def test_exact_inputs_are_answered(text, expected):
+    assert evaluate(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    # 小数、无理数结果
+    "0.5+1",
+    "sqrt(2)",
+    "sin(1)",
+    "sin(pi/5)",
+    "pi",
+    "2^(1/2)",
+    "log(10)",
+    # 隐式乘法、Python写法、单词
+    "2pi",
+    "2(3)",
+    "2**3",
+    "7//2",
+    "x+1",
+    "population of France",
+    # 除以零、0的非正数次幂
+    "1/0",
+    "0^0",
+    "0^-1",
+    # 结果过长、指数过大
+    "9^63",
+    "2^2000",
+    "2^2^2^2^2",
+])
+def test_inexact_inputs_go_upstream(text):
+    assert evaluate(text) is None
+
+
+def test_result_digit_limit_boundary():
+    assert evaluate("10^59") == ("10^59", "1" + "0" * 59)
+    assert len(evaluate("10^59")[1]) == MAX_RESULT_DIGITS
+    assert evaluate("10^60") is None
+
+
+def test_local_result_shape():
+    result = local_result({"input": "2+2", "output": "json", "format": "plaintext,image"})["queryresult"]
+    assert result["success"] is True and result["local"] is True
+    assert [pod["id"] for pod in result["pods"]] == ["Input", "Result"]
+    assert result["pods"][1]["subpods"][0]["plaintext"] == "4"
+
+    result = local_result({"input": "2+2", "output": "json", "includepodid": "Result"})["queryresult"]
+    assert [pod["id"] for pod in result["pods"]] == ["Result"]
+
+
+@pytest.mark.parametrize("params", [
+    {"input": "2+2", "output": "xml"},
+    {"input": "2+2", "output": "json", "format": "image"},
+    {"input": "2+2", "output": "json", "includepodid": "Result,Property"},
+    {"input": "2+2", "output": "json", "podstate": "Step-by-step solution"},
+    {"input": "2+2", "output": "json", "assumption": "*C.2-_*Unit-"},
+])
+def test_params_the_local_answer_cannot_honour(params):
+    assert local_result(params) is None
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+# 移动端服务器以 PYTHONPATH=mobile_poc 运行；共享模块与 pages/ 中的相同
+sys.path.append(os.path.join(ROOT, "mobile_poc"))
+sys.path.append(os.path.join(ROOT, "mobile_api"))
+
+import wolfram_api_server as server  # noqa: E402
+
+PODS = [{"title": "Result", "id": "Result", "subpods": [{"plaintext": "4"}]}]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    results = {}
+
+    def query_json(input_text, **kwargs):
+        result = results[input_text]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(server.wolfram_api, "query_json", query_json)
+    client = server.app.test_client()
+    client.results = results
+    return client
+
+
+@pytest.mark.parametrize("path", ["/query/", "/result/", "/pods/", "/math/", "/science/"])
+def test_success_is_cacheable(client, path):
+    client.results["2+2"] = {"queryresult": {"success": True, "error": False, "pods": PODS}}
+    response = client.get(path + "2+2")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"].startswith("public")
+    assert client.get(path + "2+2", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+
+@pytest.mark.parametrize("path", ["/query/", "/result/", "/pods/", "/math/", "/science/"])
+@pytest.mark.parametrize("result, status", [
+    ({"queryresult": {"success": False, "error": False}}, 404),
+    ({"queryresult": {"success": False, "error": {"code": "1", "msg": "Invalid appid"}}}, 502),
+    (ConnectionError("upstream down"), 502),
+])
+def test_failures_are_not_cached(client, path, result, status):
+    assert_not_cached(client, path, result, status)
+
+
+@pytest.mark.parametrize("path", ["/result/", "/pods/"])
+def test_missing_pods_are_not_cached(client, path):
+    assert_not_cached(client, path, {"queryresult": {"success": True, "error": False, "pods": []}}, 404)
+
+
+def assert_not_cached(client, path, result, status):
+    client.results["q"] = result
+    response = client.get(path + "q")
+    assert response.status_code == status
+    assert response.headers["Cache-Control"] == "no-store"
+    assert "ETag" not in response.headers
+    assert response.get_json()["success"] is False
+
+
+def test_local_math_result_is_not_cached(client, monkeypatch):
+    local = {"queryresult": {"success": True, "error": False, "local": True, "engine": "sympy", "pods": PODS}}
+    monkeypatch.setattr(server.symbolic, "race", lambda input_text, upstream, breaker=None: local)
+    response = client.get("/math/derivative of x^2")
+    assert response.status_code == 200
+    assert response.get_json()["data"] == local
+    assert response.headers["Cache-Control"] == "no-store"
+    assert "ETag" not in response.headers
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from wolfram_normalize import QueryNormalizer, normalize_input, normalize_value
+
+
+@pytest.mark.parametrize("raw, expected", [
+    # 空白
+    ("  solve   x^2 = 4 ", "solve x^2=4"),
+    ("population\tof\nFrance", "population of France"),
+    # 全角字符和全角空格
+    ("ｓｏｌｖｅ　ｘ＋１＝２", "solve x+1=2"),
+    # Unicode运算符
+    ("3 × 4", "3*4"),
+    ("3∗4", "3*4"),
+    ("8 ÷ 2", "8/2"),
+    ("8∕2", "8/2"),
+    ("5 − 3", "5-3"),
+    ("5‐3", "5-3"),
+    ("x ≤ 3", "x<=3"),
+    ("x ≥ 3", "x>=3"),
+    ("x ≠ 3", "x!=3"),
+    # 上标数字
+    ("x² + 2x¹⁰", "x^2+2x^10"),
+    # 运算符和括号两侧的空格（只在数学表达式中）
+    ("sin( x + 1 )", "sin(x+1)"),
+    ("x + y", "x + y"),
+    ("limit x -> 0", "limit x -> 0"),
+    ("x++ 1", "x++ 1"),
+    ("f(x) = x^2 -1", "f(x)=x^2 -1"),
+    ("solve x^2 + 3x + 2 = 0", "solve x^2+3x+2=0"),
+    # 只对已知的命令词和函数名转为小写
+    ("Solve x^2=4", "solve x^2=4"),
+    ("Derivative of Sin(x)", "derivative of sin(x)"),
+    ("SEC filings", "SEC filings"),
+    ("Co", "Co"),
+    ("CO", "CO"),
+    ("10 mg of Mg", "10 mg of Mg"),
+])
+def test_normalize_input(raw, expected):
+    assert normalize_input(raw) == expected
+
+
+@pytest.mark.parametrize("text", [
+    # 结晶水
+    "CuSO4·5H2O",
+    "CuSO4⋅5H2O",
+    # 范围
+    "1–5",
+    "pages 10–20",
+    # 列表与千位分隔
+    "gcd(12, 18)",
+    "1, 000",
+    "{1, 2, 3}",
+    # 负号：只有一侧有空格的运算符和连接普通单词的运算符
+    "1 -1 1",
+    "matrix {{1 -2},{3 4}}",
+    "a = -3",
+    "{1, -2, 3}",
+    "x- 1",
+    "Windows 10 - release date",
+    "Mg + O",
+])
+def test_meaning_preserving_text_is_unchanged(text):
+    assert normalize_input(text) == text
+
+
+def test_normalize_value():
+    assert normalize_value("Solution, Result,Solution") == "Result,Solution"
+    assert normalize_value(["10", "2", "1"]) == "1,2,10"
+    assert normalize_value(("plaintext", "image")) == "image,plaintext"
+
+
+def test_query_normalizer_counts_merges():
+    normalizer = QueryNormalizer()
+    first = normalizer.params({"input": "2 × 3", "includepodid": "Result,Input"})
+    second = normalizer.params({"input": "2*3", "includepodid": ["Input", "Result"]})
+    assert first == second == {"input": "2*3", "includepodid": "Input,Result"}
+    normalizer.params({"input": "2*3"})
+    assert normalizer.stats() == {
+        "enabled": True, "normalized": 3, "rewritten": 1, "merged": 1, "tracked_inputs": 1,
+    }
+
+
+def test_disabled_normalizer_returns_params_unchanged():
+    params = {"input": "2 × 3", "format": "plaintext,image"}
+    assert QueryNormalizer(enabled=False).params(params) is params
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from wolfram_projection import MAX_FIELDS, parse_fields, project_result, upstream_params
+
+RESULT = {
+    "queryresult": {
+        "success": True,
+        "error": False,
+        "numpods": 2,
+        "timing": 1.2,
+        "pods": [
+            {"id": "Input", "title": "Input", "subpods": [{"plaintext": "2+2", "img": {"src": "a.gif"}}]},
+            {"id": "Result", "title": "Result", "subpods": [{"plaintext": "4", "img": {"src": "b.gif"}}]},
+        ],
+    }
+}
+
+
+def test_projects_list_elements_and_keeps_status():
+    projected = project_result(RESULT, parse_fields("pods.id,pods.subpods.plaintext"))
+    assert projected == {"queryresult": {
+        "pods": [
+            {"id": "Input", "subpods": [{"plaintext": "2+2"}]},
+            {"id": "Result", "subpods": [{"plaintext": "4"}]},
+        ],
+        "success": True,
+        "error": False,
+    }}
+
+
+def test_pod_id_filter():
+    projected = project_result(RESULT, parse_fields("queryresult.pods[Result].subpods.plaintext"))
+    assert projected["queryresult"]["pods"] == [{"subpods": [{"plaintext": "4"}]}]
+
+
+def test_unfiltered_path_wins_over_filter():
+    projection = parse_fields(["pods[Result].id", "pods.title"])
+    projected = project_result(RESULT, projection)
+    assert projected["queryresult"]["pods"] == [{"id": "Input", "title": "Input"}, {"id": "Result", "title": "Result"}]
+    assert "includepodid" not in upstream_params(projection)
+
+
+def test_leaf_returns_whole_value_and_missing_fields_are_skipped():
+    projected = project_result(RESULT, parse_fields("timing,pods[Input],datatypes"))
+    assert projected["queryresult"]["timing"] == 1.2
+    assert projected["queryresult"]["pods"] == [RESULT["queryresult"]["pods"][0]]
+    assert "datatypes" not in projected["queryresult"]
+
+
+@pytest.mark.parametrize("fields, params", [
+    ("pods.subpods.plaintext", {"format": "plaintext"}),
+    ("pods[Result,Input].subpods.img,pods[Result].subpods.plaintext",
+     {"includepodid": "Input,Result", "format": "image,plaintext"}),
+    ("pods[Result].subpods", {"includepodid": "Result"}),
+    ("pods", {}),
+    ("pods.id", {"format": "plaintext"}),
+    ("numpods", {"format": "plaintext"}),
+])
+def test_upstream_params(fields, params):
+    assert upstream_params(parse_fields(fields)) == params
+
+
+@pytest.mark.parametrize("fields", [
+    "",
+    " , ",
+    "pods..id",
+    "pods[].id",
+    "pods.1",
+    "pods[Result",
+    ",".join(f"field{index}" for index in range(MAX_FIELDS + 1)),
+])
+def test_invalid_fields(fields):
+    with pytest.raises(ValueError):
+        parse_fields(fields)
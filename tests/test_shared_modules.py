@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from shared_modules import ROOT, SHARED_MODULES, stale_copies
+
+# 副本目录中不是共享模块的自有模块
+OWN_MODULES = {
+    "mobile_poc": {"wolfram_mobile_api.py"},
+    "mobile_api": {"wolfram_api_server.py"},
+}
+
+
+def test_copies_match_pages():
+    assert stale_copies() == []
+
+
+def test_every_copy_is_listed():
+    for directory, modules in SHARED_MODULES.items():
+        present = {
+            name for name in os.listdir(os.path.join(ROOT, directory))
+            if name.startswith("wolfram_") and name.endswith(".py")
+        }
+        assert present - set(modules) - OWN_MODULES[directory] == set()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+
+import pytest
+
+from wolfram_symbolic import SymbolicEngine, available, parse_query
+
+pytestmark = pytest.mark.skipif(not available(), reason="需要sympy")
+
+# SymPy在这个积分上会计算很久
+SLOW_QUERY = "integrate exp(x^2)*sin(x)^3*log(x)"
+
+
+@pytest.mark.parametrize("text", [
+    "expand (x+1)^1000",
+    "factor x^101 - 1",
+    "simplify 9^9^9",
+    "simplify x^(2^10)",
+    "simplify 10^(+200)",
+    "derivative of 1234567890123456789*x",
+    "integrate " + "(" * 9 + "x" + ")" * 9,
+])
+def test_expensive_inputs_are_rejected_before_parsing(text):
+    assert parse_query(text) is None
+
+
+@pytest.mark.parametrize("text", [
+    "expand (x+1)^100",
+    "factor x^2 - 1",
+    "derivative of x^-2",
+    "integrate " + "(" * 8 + "x" + ")" * 8,
+    "solve 2^x = 8",
+])
+def test_inputs_within_limits_are_accepted(text):
+    assert parse_query(text) is not None
+
+
+@pytest.fixture
+def engine():
+    engine = SymbolicEngine(workers=1, timeout=2.0)
+    yield engine
+    if engine._pool is not None:
+        engine._pool.shutdown()
+
+
+def test_timed_out_query_does_not_block_the_next(engine):
+    with pytest.raises(Exception):
+        engine.evaluate(SLOW_QUERY, parse_query(SLOW_QUERY))
+    assert engine.pool_restarts == 1
+
+    result = engine.evaluate("derivative of x^2", parse_query("derivative of x^2"))
+    assert result["queryresult"]["pods"][1]["subpods"][0]["plaintext"] == "2 x"
+
+
+def test_async_timeout_does_not_block_the_next(engine):
+    async def main():
+        with pytest.raises(Exception):
+            await engine._aevaluate(SLOW_QUERY, parse_query(SLOW_QUERY))
+        return await engine._aevaluate("derivative of x^2", parse_query("derivative of x^2"))
+
+    result = asyncio.run(main())
+    assert result["queryresult"]["local"] is True
+    assert engine.pool_restarts == 1
+
+
+def test_overdue_computation_is_replaced_on_next_submit(engine):
+    # 上游先返回时没有人等待本地计算，超过timeout后由下一次提交替换进程池
+    engine.submit(parse_query(SLOW_QUERY))
+    time.sleep(engine.timeout + 0.2)
+    future = engine.submit(parse_query("factor x^2 - 1"))
+    assert future.result(timeout=engine.timeout)[1] == ["(x - 1) (x + 1)"]
+    assert engine.pool_restarts == 1
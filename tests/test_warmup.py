@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+from wolfram_warmup import CacheWarmer, WarmupItem
+
+SUCCESS = {"queryresult": {"success": True, "pods": [{"id": "Result"}]}}
+FAILURE = {"queryresult": {"success": False, "error": False}}
+
+
+class FakeAPI:
+    """按输入返回预设结果，成功的结果写入缓存"""
+
+    def __init__(self, results):
+        self.results = results
+        self.cache = set()
+
+    def is_cached(self, input_text, raw=False, **params):
+        return input_text in self.cache
+
+    def query(self, input_text, **params):
+        result = self.results[input_text]
+        if isinstance(result, Exception):
+            raise result
+        if result["queryresult"]["success"]:
+            self.cache.add(input_text)
+        return result
+
+
+def run(api, inputs, **kwargs):
+    warmer = CacheWarmer(api, [WarmupItem("query", text, {}, 1) for text in inputs], rate=0, **kwargs)
+    warmer.start()
+    for thread in warmer._threads:
+        thread.join()
+    return warmer
+
+
+def test_all_items_failing_is_not_ready_until_timeout():
+    api = FakeAPI({"a": ConnectionError("upstream down"), "b": ConnectionError("circuit open")})
+    warmer = run(api, ["a", "b"], timeout=0.3)
+    stats = warmer.stats()
+    assert stats["state"] == "done"
+    assert (stats["warmed"], stats["failed"]) == (0, 2)
+    assert not warmer.ready
+
+    time.sleep(0.35)
+    assert warmer.ready
+
+
+def test_uncached_results_do_not_count_as_warmed():
+    api = FakeAPI({"a": SUCCESS, "b": FAILURE, "c": FAILURE})
+    warmer = run(api, ["a", "b", "c"], ready_fraction=0.5)
+    assert (warmer.warmed, warmer.failed) == (1, 2)
+    assert not warmer.ready
+
+
+def test_ready_when_enough_items_are_cached():
+    api = FakeAPI({"a": SUCCESS, "b": SUCCESS, "c": FAILURE})
+    api.cache.add("b")
+    warmer = run(api, ["a", "b", "c"], ready_fraction=0.6)
+    assert (warmer.warmed, warmer.cached, warmer.failed) == (2, 1, 1)
+    assert warmer.ready
+
+
+def test_no_items_is_ready():
+    warmer = run(FakeAPI({}), [])
+    assert warmer.ready
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+共享模块的副本检查
+pages/ 是共享模块的唯一源文件，mobile_poc/（客户端）和 mobile_api/（服务器）中的同名文件是副本，
+三个目录都以脚本方式直接运行，因此各自保留一份。修改共享模块时只改 pages/ 中的文件，然后运行:
+
+    python tools/shared_modules.py          # 将 pages/ 中的文件复制到各副本目录
+    python tools/shared_modules.py --check  # 只检查，副本与源文件不一致时返回1（CI中运行）
+"""
+
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DIR = "pages"
+
+# 副本目录 -> 共享模块
+SHARED_MODULES = {
+    "mobile_poc": (
+        "wolfram_breaker.py",
+        "wolfram_cache.py",
+        "wolfram_cassette.py",
+        "wolfram_limiter.py",
+        "wolfram_local_eval.py",
+        "wolfram_normalize.py",
+        "wolfram_podstore.py",
+        "wolfram_signing.py",
+        "wolfram_transport.py",
+    ),
+    "mobile_api": (
+        "wolfram_http.py",
+        "wolfram_metrics.py",
+        "wolfram_symbolic.py",
+    ),
+}
+
+
+def copies():
+    """依次返回 (源文件路径, 副本路径)"""
+    for directory, modules in SHARED_MODULES.items():
+        for module in modules:
+            yield os.path.join(ROOT, SOURCE_DIR, module), os.path.join(ROOT, directory, module)
+
+
+def stale_copies():
+    """与源文件不一致（或缺失）的副本路径列表"""
+    return [
+        copy for source, copy in copies()
+        if not os.path.exists(copy) or not filecmp.cmp(source, copy, shallow=False)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同步或检查共享模块的副本")
+    parser.add_argument("--check", action="store_true", help="只检查，副本不一致时返回1")
+    args = parser.parse_args()
+
+    stale = stale_copies()
+    if args.check:
+        for copy in stale:
+            print(f"副本与 {SOURCE_DIR}/ 中的源文件不一致: {os.path.relpath(copy, ROOT)}")
+        if stale:
+            print("请只修改 pages/ 中的文件，然后运行 python tools/shared_modules.py")
+        return 1 if stale else 0
+
+    for source, copy in copies():
+        if copy in stale:
+            shutil.copyfile(source, copy)
+            print(f"已更新 {os.path.relpath(copy, ROOT)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())